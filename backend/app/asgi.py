@@ -3,6 +3,10 @@ ASGI config for app project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Views assíncronas (ex.: /api/payments/dashboard_summary/async/) só executam
+as consultas em paralelo sem bloquear o worker quando servidas por aqui, por
+exemplo com ``gunicorn app.asgi:application -k uvicorn.workers.UvicornWorker``.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -11,7 +11,9 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
+import ipaddress
 import os
+import tempfile
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -57,15 +59,22 @@ INSTALLED_APPS = [
     'modality',
     'schedule',
     'payment',
+    'core',
 ]
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',  # Must be at the top
+    'core.middleware.RequestTimingMiddleware',  # Ativo apenas com REQUEST_TIMING
+    'core.middleware.MetricsMiddleware',  # Ativo apenas com METRICS_ENABLED
+    'core.middleware.SlowQueryMiddleware',  # Ativo apenas com SLOW_QUERY_MS
+    'core.middleware.CompressionMiddleware',  # brotli/gzip (COMPRESSION_ENABLED)
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'core.middleware.SessionTouchMiddleware',  # Renova a sessão sem gravar a cada requisição
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.ProfilerMiddleware',  # ?_profile=1 para staff (REQUEST_PROFILER)
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -101,9 +110,85 @@ DATABASES = {
         'PASSWORD': os.environ.get('DB_PASSWORD', 'fisiopass'),
         'HOST': os.environ.get('DB_HOST', 'db'),
         'PORT': os.environ.get('DB_PORT', '5432'),
+        # Reaproveita a conexão entre requisições (segundos; 0 fecha ao fim de cada requisição)
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '60')),
+        # Verifica se a conexão persistente ainda é válida antes de reutilizá-la
+        'CONN_HEALTH_CHECKS': os.getenv('DB_CONN_HEALTH_CHECKS', 'True').lower() in ('true', '1', 'yes', 'on'),
     }
 }
 
+# Threads (e conexões com o banco) por processo para as consultas paralelas do
+# dashboard assíncrono; as conexões seguem DB_CONN_MAX_AGE como nas requisições
+DASHBOARD_QUERY_THREADS = int(os.getenv('DASHBOARD_QUERY_THREADS', '3'))
+
+# Pool de conexões do psycopg (requer o pacote psycopg[pool] no lugar do psycopg2).
+# Cada worker do gunicorn mantém o próprio pool, então o tamanho máximo segue as
+# threads que usam o banco em cada worker: as de requisição e as do dashboard
+# assíncrono (DASHBOARD_QUERY_THREADS). O total de conexões abertas fica em
+# GUNICORN_WORKERS x DB_POOL_MAX_SIZE.
+DB_POOL = os.getenv('DB_POOL', 'False').lower() in ('true', '1', 'yes', 'on')
+if DB_POOL:
+    DATABASES['default']['CONN_MAX_AGE'] = 0  # Incompatível com o pool
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': int(os.getenv('DB_POOL_MIN_SIZE', '1')),
+            'max_size': int(os.getenv(
+                'DB_POOL_MAX_SIZE', int(os.getenv('GUNICORN_THREADS', '4')) + DASHBOARD_QUERY_THREADS
+            )),
+            'timeout': int(os.getenv('DB_POOL_TIMEOUT', '10')),
+        }
+    }
+
+
+# Cache
+# CACHE_BACKEND escolhe o backend: locmem (desenvolvimento), file ou db (produção
+# em um único servidor) e redis (compartilhado entre servidores). Sem o pacote
+# redis instalado, o backend redis cai para locmem.
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'redis' if os.getenv('REDIS_URL') else 'locmem').lower()
+CACHE_TIMEOUT = int(os.getenv('CACHE_TIMEOUT', '300'))
+
+if CACHE_BACKEND == 'redis':
+    try:
+        import redis  # noqa: F401
+    except ImportError:
+        CACHE_BACKEND = 'locmem'
+
+if CACHE_BACKEND == 'redis':
+    _cache = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('REDIS_URL', 'redis://127.0.0.1:6379/1'),
+    }
+elif CACHE_BACKEND == 'file':
+    _cache = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('CACHE_LOCATION', str(BASE_DIR / '.cache')),
+    }
+elif CACHE_BACKEND == 'db':
+    # Requer "python manage.py createcachetable"
+    _cache = {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': os.getenv('CACHE_LOCATION', 'django_cache'),
+    }
+else:
+    _cache = {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'fisiopilates',
+    }
+
+CACHES = {
+    'default': {
+        **_cache,
+        'TIMEOUT': CACHE_TIMEOUT,
+        'KEY_PREFIX': os.getenv('CACHE_KEY_PREFIX', 'fisiopilates'),
+    }
+}
+
+# O primeiro backend carrega o fisioterapeuta junto com o usuário da sessão;
+# o ModelBackend continua aceitando sessões criadas antes da troca
+AUTHENTICATION_BACKENDS = [
+    'core.backends.PhysiotherapistModelBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -191,11 +276,13 @@ CORS_ALLOW_HEADERS = [
     'cache-control',
     'pragma',
     'expires',
+    'idempotency-key',
 ]
 
 CORS_EXPOSE_HEADERS = [
     'content-type',
     'x-csrftoken',
+    'idempotent-replayed',
 ]
 
 # PWA Support - Service Worker
@@ -241,12 +328,46 @@ STATIC_URL = '/static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
 # Session settings
-SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+# SESSION_BACKEND: db, cached_db (leitura pelo cache, gravação no banco), cache
+# ou signed_cookies (sessão no próprio cookie assinado, sem acesso ao banco).
+# cached_db só é o padrão com cache compartilhado entre os workers (redis ou
+# file): com locmem, um logout em um worker não invalidaria a sessão nos outros,
+# e com db a leitura pelo cache também iria ao banco.
+SESSION_BACKEND = os.getenv('SESSION_BACKEND', 'cached_db' if CACHE_BACKEND in ('redis', 'file') else 'db').lower()
+SESSION_ENGINE = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'cache': 'django.contrib.sessions.backends.cache',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}[SESSION_BACKEND]
 SESSION_COOKIE_AGE = 1209600  # 2 weeks in seconds
+# A sessão não é gravada a cada requisição; o SessionTouchMiddleware renova a
+# expiração no máximo uma vez a cada SESSION_TOUCH_INTERVAL segundos (0 desativa)
+SESSION_SAVE_EVERY_REQUEST = False
+SESSION_TOUCH_INTERVAL = int(os.getenv('SESSION_TOUCH_INTERVAL', '86400'))
+# Intervalo da limpeza de sessões expiradas feita pelos workers (0 desativa)
+SESSION_PURGE_INTERVAL = int(os.getenv('SESSION_PURGE_INTERVAL', '86400'))
 SESSION_COOKIE_HTTPONLY = True
 SESSION_COOKIE_SECURE = not DEBUG  # True in production
 SESSION_COOKIE_DOMAIN = None  # This will use the current domain
 
+# Renderer JSON com orjson (core.renderers)
+FAST_JSON = os.getenv('FAST_JSON', 'True').lower() in ('true', '1', 'yes', 'on')
+
+# Compressão das respostas JSON e de texto acima de COMPRESSION_MIN_SIZE bytes:
+# brotli quando instalado e aceito pelo cliente, senão gzip
+COMPRESSION_ENABLED = os.getenv('COMPRESSION_ENABLED', 'True').lower() in ('true', '1', 'yes', 'on')
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', '1024'))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv('COMPRESSION_BROTLI_QUALITY', '5'))
+
+# Proxies reversos cujo X-Forwarded-For é aceito (ver core.proxies). Conexões
+# de outros endereços usam REMOTE_ADDR, mesmo que enviem o cabeçalho
+TRUSTED_PROXY_NETWORKS = [
+    ipaddress.ip_network(network.strip())
+    for network in os.getenv('TRUSTED_PROXIES', '127.0.0.1/32,::1/128').split(',')
+    if network.strip()
+]
+
 # Rest Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
@@ -255,26 +376,106 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        # FAST_JSON usa o orjson quando instalado; sem ele, o JSONRenderer padrão
+        'core.renderers.FastJSONRenderer' if FAST_JSON else 'rest_framework.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'DEFAULT_PARSER_CLASSES': [
         'rest_framework.parsers.JSONParser',
         'rest_framework.parsers.FormParser',
         'rest_framework.parsers.MultiPartParser'
     ],
+    # Limites dos endpoints de autenticação (ver authentication.throttles)
+    'DEFAULT_THROTTLE_RATES': {
+        'login_ip': os.getenv('LOGIN_THROTTLE_IP_RATE', '30/min'),
+        'login_username': os.getenv('LOGIN_THROTTLE_USERNAME_RATE', '10/min'),
+    },
 }
 
+# Sincronização incremental (/api/sync/): exclusões ficam registradas por
+# SYNC_TOMBSTONE_DAYS dias; tokens mais antigos recebem a carga completa.
+# A limpeza roda nos workers a cada SYNC_PURGE_INTERVAL segundos
+SYNC_TOMBSTONE_DAYS = int(os.getenv('SYNC_TOMBSTONE_DAYS', '30'))
+SYNC_PURGE_INTERVAL = int(os.getenv('SYNC_PURGE_INTERVAL', '86400'))
+
+# Idempotency-Key nas criações: respostas guardadas por IDEMPOTENCY_KEY_TTL
+# horas, com limpeza nos workers a cada IDEMPOTENCY_PURGE_INTERVAL segundos
+IDEMPOTENCY_KEY_TTL = int(os.getenv('IDEMPOTENCY_KEY_TTL', '24'))
+IDEMPOTENCY_PURGE_INTERVAL = int(os.getenv('IDEMPOTENCY_PURGE_INTERVAL', '3600'))
+
+# Limite de sub-requisições GET por chamada a /api/batch/
+BATCH_MAX_REQUESTS = int(os.getenv('BATCH_MAX_REQUESTS', '10'))
+
+# Bloqueio exponencial do login: após LOGIN_BACKOFF_AFTER falhas seguidas do
+# mesmo IP ou usuário, espera LOGIN_BACKOFF_BASE segundos, dobrando a cada nova
+# falha, até LOGIN_BACKOFF_MAX segundos
+LOGIN_BACKOFF_AFTER = int(os.getenv('LOGIN_BACKOFF_AFTER', '5'))
+LOGIN_BACKOFF_BASE = int(os.getenv('LOGIN_BACKOFF_BASE', '2'))
+LOGIN_BACKOFF_MAX = int(os.getenv('LOGIN_BACKOFF_MAX', '900'))
+
+# Instrumentação por requisição: cabeçalho Server-Timing e log em core.timing
+REQUEST_TIMING = os.getenv('REQUEST_TIMING', 'False').lower() in ('true', '1', 'yes', 'on')
+
+# Profiler sob demanda para staff (?_profile=1 ou cabeçalho X-Profile: 1).
+# PROFILER_HISTORY relatórios mais recentes ficam no admin (0 para não gravar)
+REQUEST_PROFILER = os.getenv('REQUEST_PROFILER', 'True').lower() in ('true', '1', 'yes', 'on')
+PROFILER_HISTORY = int(os.getenv('PROFILER_HISTORY', '50'))
+PROFILER_TOP = int(os.getenv('PROFILER_TOP', '40'))
+
+# Endpoint /metrics (formato Prometheus), somado entre os workers pelos arquivos
+# em METRICS_DIR. Acessível a staff e aos endereços de METRICS_ALLOWED_IPS
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'False').lower() in ('true', '1', 'yes', 'on')
+METRICS_DIR = os.getenv('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'fisiopilates-metrics'))
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', '5'))
+METRICS_ALLOWED_NETWORKS = [
+    ipaddress.ip_network(network.strip())
+    for network in os.getenv(
+        'METRICS_ALLOWED_IPS', '127.0.0.1/32,::1/128,10.0.0.0/8,172.16.0.0/12,192.168.0.0/16'
+    ).split(',')
+    if network.strip()
+]
+
+# Log de consultas lentas: consultas acima de SLOW_QUERY_MS (0 registra todas)
+# vão para SLOW_QUERY_LOG. Agregue com manage.py query_report
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS')) if os.getenv('SLOW_QUERY_MS') else None
+SLOW_QUERY_LOG = os.getenv('SLOW_QUERY_LOG', str(BASE_DIR / 'slow_queries.log'))
+
 # Logging configuration
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
+    'formatters': {
+        'message': {
+            'format': '%(message)s',
+        },
+    },
     'handlers': {
         'console': {
             'class': 'logging.StreamHandler',
         },
+        'slow_queries': {
+            # WatchedFileHandler reabre o arquivo após rotação pelo logrotate
+            'class': 'logging.handlers.WatchedFileHandler',
+            'filename': SLOW_QUERY_LOG,
+            'formatter': 'message',
+            'delay': True,
+        },
     },
     'loggers': {
         'django': {
             'handlers': ['console'],
             'level': 'DEBUG',
         },
+        'core.timing': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'core.slow_queries': {
+            'handlers': ['slow_queries'],
+            'level': 'INFO',
+            'propagate': False,
+        },
     },
 }
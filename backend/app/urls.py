@@ -16,6 +16,7 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
+from core.views import batch, metrics, sync
 
 urlpatterns = [
     path('admin/', admin.site.urls),    path('api/', include('student.urls')),
@@ -23,4 +24,7 @@ urlpatterns = [
     path('api/physiotherapists/', include('physiotherapist.urls')),    path('api/modalities/', include('modality.urls')),
     path('api/schedules/', include('schedule.urls')),
     path('api/payments/', include('payment.urls')),
+    path('api/sync/', sync, name='sync'),
+    path('api/batch/', batch, name='batch'),
+    path('metrics', metrics, name='metrics'),
 ]
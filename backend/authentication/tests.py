@@ -1,3 +1,107 @@
-from django.test import TestCase
+import time
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from .throttles import LoginIPThrottle
+
+FAST_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+
+@override_settings(LOGIN_BACKOFF_AFTER=3, LOGIN_BACKOFF_BASE=60, LOGIN_BACKOFF_MAX=900)
+class LoginThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        with self.settings(PASSWORD_HASHERS=FAST_HASHERS):
+            User.objects.create_user(username='physio', password='physiopass123')
+
+    def login(self, password='wrong', username='physio', **extra):
+        return self.client.post('/api/auth/login/', {'username': username, 'password': password}, format='json', **extra)
+
+    @override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+    def test_backoff_after_consecutive_failures(self):
+        for _ in range(3):
+            self.assertEqual(self.login().status_code, 401)
+
+        with mock.patch('authentication.views.authenticate') as authenticate:
+            response = self.login(password='physiopass123')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '60')
+        authenticate.assert_not_called()
+
+    @override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+    def test_backoff_doubles_with_each_failure(self):
+        for _ in range(3):
+            self.login()
+        with mock.patch('authentication.throttles.time.time', return_value=time.time() + 61):
+            self.assertEqual(self.login().status_code, 401)
+            self.assertEqual(self.login()['Retry-After'], '120')
+
+    @override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+    def test_backoff_by_username_across_ips(self):
+        for index in range(3):
+            self.login(HTTP_X_FORWARDED_FOR=f'203.0.113.{index}')
+        self.assertEqual(self.login(HTTP_X_FORWARDED_FOR='198.51.100.1').status_code, 429)
+        # Outro usuário, de outro IP, não é afetado
+        self.assertEqual(self.login(username='other', HTTP_X_FORWARDED_FOR='198.51.100.2').status_code, 401)
+
+    @override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+    def test_success_resets_username_failures(self):
+        for _ in range(2):
+            self.login()
+        self.assertEqual(self.login(password='physiopass123').status_code, 200)
+        for index in range(2):
+            self.assertEqual(self.login(HTTP_X_FORWARDED_FOR=f'203.0.113.{index}').status_code, 401)
+
+    @override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+    def test_forwarded_for_from_direct_connection_is_ignored(self):
+        client = APIClient(REMOTE_ADDR='203.0.113.50')
+        with mock.patch.dict(LoginIPThrottle.THROTTLE_RATES, {'login_ip': '2/min'}):
+            for index in range(2):
+                client.post('/api/auth/login/', {'username': f'user{index}', 'password': 'x'}, format='json',
+                            HTTP_X_FORWARDED_FOR=f'198.51.100.{index}')
+            # Trocar o X-Forwarded-For não zera o limite do IP da conexão
+            response = client.post('/api/auth/login/', {'username': 'user9', 'password': 'x'}, format='json',
+                                   HTTP_X_FORWARDED_FOR='198.51.100.9')
+        self.assertEqual(response.status_code, 429)
+
+    @override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+    def test_rate_limit_by_ip(self):
+        with mock.patch.dict(LoginIPThrottle.THROTTLE_RATES, {'login_ip': '2/min'}):
+            self.assertEqual(self.login(password='physiopass123').status_code, 200)
+            self.assertEqual(self.login(password='physiopass123').status_code, 200)
+            self.assertEqual(self.login(password='physiopass123').status_code, 429)
+            # O GET que define o cookie CSRF não conta
+            self.assertEqual(self.client.get('/api/auth/login/').status_code, 200)
+
+    def test_rejected_attempt_does_not_hash(self):
+        """
+        Uma tentativa rejeitada custa uma fração do hash de uma tentativa real,
+        e cada tentativa real calcula o hash uma única vez
+        """
+        verify = PBKDF2PasswordHasher.verify
+        calls = []
+
+        def counting_verify(hasher, password, encoded):
+            calls.append(password)
+            return verify(hasher, password, encoded)
+
+        with mock.patch.object(PBKDF2PasswordHasher, 'verify', counting_verify):
+            User.objects.filter(username='physio').update(password=PBKDF2PasswordHasher().encode('physiopass123', 'salt'))
+            start = time.process_time()
+            for _ in range(3):
+                self.assertEqual(self.login().status_code, 401)
+            hashed = (time.process_time() - start) / 3
+            self.assertEqual(len(calls), 3)
+
+            start = time.process_time()
+            for _ in range(10):
+                self.assertEqual(self.login().status_code, 429)
+            rejected = (time.process_time() - start) / 10
+        self.assertEqual(len(calls), 3)
+        self.assertLess(rejected, hashed / 10)
@@ -0,0 +1,110 @@
+"""
+Limites de tentativas nos endpoints de autenticação.
+
+Cada tentativa de login custa um cálculo completo do hash da senha (PBKDF2),
+então sem limite um script consegue ocupar todos os workers. Os throttles rodam
+no ``initial()`` do DRF, antes da view, e rejeitam a requisição com 429 sem
+chegar ao ``authenticate()``. Os contadores ficam no cache ``default``, que
+precisa ser compartilhado entre os workers (o gunicorn recusa locmem com mais
+de um worker); senão cada worker teria o próprio limite. O IP do cliente vem
+de ``core.proxies.client_ip``: X-Forwarded-For só é aceito do nginx.
+
+- LoginIPThrottle: tentativas por IP (escopo ``login_ip``)
+- LoginUsernameThrottle: tentativas por nome de usuário (escopo ``login_username``)
+- LoginBackoffThrottle: após LOGIN_BACKOFF_AFTER falhas seguidas do mesmo IP ou
+  usuário, bloqueia por LOGIN_BACKOFF_BASE segundos, dobrando a cada nova falha
+  até LOGIN_BACKOFF_MAX
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.throttling import BaseThrottle, SimpleRateThrottle
+
+from core.proxies import client_ip
+
+
+def _hashed(value):
+    # Nomes de usuário arbitrários não podem virar chaves de cache diretamente
+    return hashlib.sha256(value.strip().lower().encode()).hexdigest()[:32]
+
+
+def _username(request):
+    username = request.data.get('username') if hasattr(request, 'data') else None
+    return username if isinstance(username, str) and username.strip() else None
+
+
+class ClientIPMixin:
+    def get_ident(self, request):
+        # O get_ident do DRF confia no X-Forwarded-For de qualquer conexão
+        address = client_ip(request)
+        return str(address) if address else request.META.get('REMOTE_ADDR', '')
+
+
+class LoginIPThrottle(ClientIPMixin, SimpleRateThrottle):
+    scope = 'login_ip'
+
+    def get_cache_key(self, request, view):
+        # O GET do login só define o cookie CSRF
+        if request.method != 'POST':
+            return None
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
+
+
+class LoginUsernameThrottle(SimpleRateThrottle):
+    scope = 'login_username'
+
+    def get_cache_key(self, request, view):
+        username = _username(request) if request.method == 'POST' else None
+        if username is None:
+            return None
+        return self.cache_format % {'scope': self.scope, 'ident': _hashed(username)}
+
+
+class LoginBackoffThrottle(ClientIPMixin, BaseThrottle):
+    """
+    Bloqueio exponencial por falhas consecutivas. A view informa o resultado
+    de cada tentativa com ``failed`` e ``succeeded``.
+    """
+    cache = cache
+
+    def __init__(self):
+        self.wait_seconds = None
+
+    def keys(self, request):
+        keys = [f'login_backoff_ip_{self.get_ident(request)}']
+        username = _username(request)
+        if username is not None:
+            keys.append(f'login_backoff_user_{_hashed(username)}')
+        return keys
+
+    def allow_request(self, request, view):
+        if request.method != 'POST':
+            return True
+        states = self.cache.get_many(self.keys(request)).values()
+        blocked_until = max((state['until'] for state in states), default=0)
+        self.wait_seconds = blocked_until - time.time()
+        return self.wait_seconds <= 0
+
+    def wait(self):
+        return self.wait_seconds
+
+    def failed(self, request):
+        now = time.time()
+        for key in self.keys(request):
+            state = self.cache.get(key) or {'failures': 0, 'until': 0}
+            state['failures'] += 1
+            excess = state['failures'] - settings.LOGIN_BACKOFF_AFTER
+            if excess >= 0:
+                delay = min(settings.LOGIN_BACKOFF_BASE * 2 ** excess, settings.LOGIN_BACKOFF_MAX)
+                state['until'] = now + delay
+            # As falhas são esquecidas depois de LOGIN_BACKOFF_MAX sem novas tentativas
+            self.cache.set(key, state, timeout=max(settings.LOGIN_BACKOFF_MAX, state['until'] - now))
+
+    def succeeded(self, request):
+        # Só o contador do usuário é zerado: um login válido não libera o IP
+        # para continuar testando senhas de outras contas
+        username = _username(request)
+        if username is not None:
+            self.cache.delete(f'login_backoff_user_{_hashed(username)}')
@@ -1,6 +1,6 @@
 from django.shortcuts import render
 from rest_framework import status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from django.contrib.auth import login, logout, authenticate
@@ -8,9 +8,11 @@ from django.views.decorators.csrf import ensure_csrf_cookie
 from django.middleware.csrf import get_token
 from django.http import HttpResponse
 from .serializers import UserSerializer, RegisterSerializer
+from .throttles import LoginBackoffThrottle, LoginIPThrottle, LoginUsernameThrottle
 
 @api_view(['GET', 'POST', 'OPTIONS'])
 @permission_classes([AllowAny])
+@throttle_classes([LoginIPThrottle, LoginUsernameThrottle, LoginBackoffThrottle])
 @ensure_csrf_cookie
 def login_view(request):
     if request.method == 'OPTIONS':
@@ -39,9 +41,11 @@ def login_view(request):
     user = authenticate(username=username, password=password)
     
     if user is not None and user.is_active:
+        LoginBackoffThrottle().succeeded(request)
         login(request, user)
         return Response(UserSerializer(user).data)
     else:
+        LoginBackoffThrottle().failed(request)
         return Response(
             {'error': 'Credenciais inválidas'},
             status=status.HTTP_401_UNAUTHORIZED
@@ -61,6 +65,7 @@ def get_user_data(request):
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([LoginIPThrottle])
 @ensure_csrf_cookie
 def register_view(request):
     serializer = RegisterSerializer(data=request.data)
@@ -90,6 +95,7 @@ def update_profile(request):
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@throttle_classes([LoginIPThrottle])
 def change_password(request):
     user = request.user
     old_password = request.data.get('old_password')
@@ -0,0 +1,25 @@
+from django.contrib import admin
+from django.utils.html import format_html
+
+from .models import ProfileReport
+
+
+@admin.register(ProfileReport)
+class ProfileReportAdmin(admin.ModelAdmin):
+    list_display = ['created_at', 'method', 'path', 'status_code', 'duration_ms', 'query_count', 'user']
+    list_filter = ['method', 'status_code']
+    search_fields = ['path', 'user__username']
+    date_hierarchy = 'created_at'
+    fields = ['created_at', 'user', 'method', 'path', 'status_code', 'duration_ms', 'query_count', 'formatted_report']
+    readonly_fields = fields
+
+    @admin.display(description='Relatório')
+    def formatted_report(self, obj):
+        return format_html('<pre style="white-space: pre; overflow-x: auto">{}</pre>', obj.report)
+
+    def has_add_permission(self, request):
+        """Relatórios são gravados pelo ProfilerMiddleware"""
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,14 @@
+from django.apps import AppConfig
+
+
+class CoreConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'core'
+
+    def ready(self):
+        from django.core.signals import request_finished
+
+        from . import idempotency, signals, sync  # noqa: F401
+        from .jobs import run_due_jobs
+
+        request_finished.connect(run_due_jobs, dispatch_uid='core.run_due_jobs')
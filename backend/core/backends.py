@@ -0,0 +1,28 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.exceptions import PermissionDenied
+
+
+class PhysiotherapistModelBackend(ModelBackend):
+    """
+    ModelBackend que carrega o fisioterapeuta junto com o usuário da sessão
+    (select_related no OneToOne reverso). ``user.physiotherapist`` não faz outra
+    consulta, nem quando o usuário não é fisioterapeuta.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        user = super().authenticate(request, username=username, password=password, **kwargs)
+        if user is None and username is not None and password is not None:
+            # Credenciais já verificadas: PermissionDenied interrompe o
+            # authenticate() antes que o ModelBackend seguinte (mantido só para
+            # as sessões antigas) calcule o hash da senha outra vez
+            raise PermissionDenied
+        return user
+
+    def get_user(self, user_id):
+        UserModel = get_user_model()
+        try:
+            user = UserModel._default_manager.select_related('physiotherapist').get(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
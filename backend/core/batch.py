@@ -0,0 +1,84 @@
+"""
+Várias leituras numa requisição só (/api/batch/), para a abertura do PWA.
+
+O corpo traz a lista de caminhos: ``{"requests": ["/api/modalities/", ...]}``.
+Cada caminho vira um GET resolvido e executado no próprio processo, com o
+usuário, a sessão e a conexão da requisição externa e sem passar de novo pelos
+middlewares. A resposta traz um item ``{"path", "status", "data"}`` por
+caminho, na mesma ordem; erros (403, 404, validação) ficam no item, com o
+corpo de erro da própria view, e não interrompem os demais.
+"""
+import json
+import logging
+from urllib.parse import urlsplit
+
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.http import HttpRequest, QueryDict
+from django.urls import Resolver404, resolve
+
+from .roles import get_role
+
+logger = logging.getLogger(__name__)
+
+PREFIX = '/api/'
+BATCH_PATH = '/api/batch/'
+
+# Cabeçalhos que não se aplicam às sub-requisições: condicionais devolveriam
+# 304 sem corpo e os de conteúdo descrevem o corpo do POST externo
+DROPPED_META = ('CONTENT_LENGTH', 'CONTENT_TYPE', 'HTTP_IF_NONE_MATCH', 'HTTP_IF_MODIFIED_SINCE', 'HTTP_IDEMPOTENCY_KEY')
+
+
+def sub_request(request, url):
+    """HttpRequest GET para ``url`` com o usuário e a sessão de ``request`` (Request do DRF)"""
+    http_request = request._request
+    sub = HttpRequest()
+    sub.method = 'GET'
+    sub.path = sub.path_info = url.path
+    sub.META = {key: value for key, value in http_request.META.items() if key not in DROPPED_META}
+    sub.META.update(REQUEST_METHOD='GET', PATH_INFO=url.path, QUERY_STRING=url.query)
+    sub.GET = QueryDict(url.query)
+    sub.COOKIES = http_request.COOKIES
+    sub.session = getattr(http_request, 'session', None)
+    sub.user = request.user
+
+    async def auser():
+        return request.user
+
+    # Views assíncronas leem o usuário com ``await request.auser()``
+    sub.auser = auser
+    # O papel já resolvido vale para todas as sub-requisições
+    sub.role = get_role(request)
+    return sub
+
+
+def response_data(response):
+    if getattr(response, 'streaming', False):
+        return 400, {'detail': 'Respostas em streaming não são suportadas no batch.'}
+    if hasattr(response, 'data'):
+        # Response do DRF: usa os dados antes da renderização, que acontece uma vez só no batch
+        return response.status_code, response.data
+    content = response.content.decode(response.charset or 'utf-8', 'replace')
+    if response.get('Content-Type', '').startswith('application/json'):
+        return response.status_code, json.loads(content) if content else None
+    return response.status_code, content
+
+
+def run(request, path):
+    """Executa o GET de ``path`` e retorna o item da resposta do batch"""
+    url = urlsplit(path)
+    if url.scheme or url.netloc or not url.path.startswith(PREFIX) or url.path.startswith(BATCH_PATH):
+        return {'path': path, 'status': 400, 'data': {'detail': f'Caminho inválido: use uma rota GET de {PREFIX}.'}}
+    try:
+        match = resolve(url.path)
+    except Resolver404:
+        return {'path': path, 'status': 404, 'data': {'detail': 'Não encontrado.'}}
+
+    sub = sub_request(request, url)
+    sub.resolver_match = match
+    view = async_to_sync(match.func) if iscoroutinefunction(match.func) else match.func
+    try:
+        status_code, data = response_data(view(sub, *match.args, **match.kwargs))
+    except Exception:
+        logger.exception('Erro na sub-requisição %s do batch', path)
+        status_code, data = 500, {'detail': 'Erro interno.'}
+    return {'path': path, 'status': status_code, 'data': data}
@@ -0,0 +1,103 @@
+"""
+Chaves de cache versionadas para os relatórios.
+
+Cada chave inclui a versão do escopo (um fisioterapeuta ou a clínica toda) e a
+versão global da clínica. Invalidar é só incrementar a versão: as chaves antigas
+deixam de ser lidas e expiram sozinhas, sem varredura. Com um backend
+compartilhado (redis, db ou file) as versões valem para todos os workers.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+from . import metrics
+
+VERSION_PREFIX = 'version'
+CLINIC_SCOPE = 'clinic'
+ALL_SCOPE = 'all'
+
+
+def _scope(physiotherapist_id):
+    return ALL_SCOPE if physiotherapist_id is None else f'physio:{physiotherapist_id}'
+
+
+def _version_key(scope):
+    return f'{VERSION_PREFIX}:{scope}'
+
+
+def get_versions(*scopes):
+    """Retorna as versões atuais dos escopos (1 para escopos nunca invalidados)"""
+    keys = [_version_key(scope) for scope in scopes]
+    values = cache.get_many(keys)
+    return [values.get(key, 1) for key in keys]
+
+
+def bump_version(scope):
+    key = _version_key(scope)
+    # add() só grava se a chave não existe; a versão nunca expira
+    cache.add(key, 1, timeout=None)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # A chave foi removida entre o add() e o incr()
+        cache.set(key, 2, timeout=None)
+        return 2
+
+
+def invalidate(physiotherapist_id=None):
+    """
+    Invalida os relatórios de um fisioterapeuta e os relatórios consolidados.
+    Sem fisioterapeuta (ex.: mudança de preço de modalidade), invalida tudo.
+    """
+    if physiotherapist_id is None:
+        bump_version(CLINIC_SCOPE)
+    else:
+        bump_version(_scope(physiotherapist_id))
+        bump_version(ALL_SCOPE)
+
+
+def data_version(physiotherapist_id=None):
+    """
+    Versão dos dados do fisioterapeuta (ou da clínica toda com None): muda a
+    cada gravação que invalida os relatórios do escopo.
+    """
+    clinic_version, scope_version = get_versions(CLINIC_SCOPE, _scope(physiotherapist_id))
+    return f'{clinic_version}.{scope_version}'
+
+
+def report_key(name, physiotherapist_id=None, year=None, month=None, **params):
+    """
+    Monta a chave do relatório ``name`` para o fisioterapeuta (ou None para a
+    visão consolidada do administrador) e o mês informado.
+    """
+    period = f'{year:04d}-{month:02d}' if year and month else '-'
+    extra = ':'.join(f'{key}={params[key]}' for key in sorted(params))
+    return f'report:{name}:{_scope(physiotherapist_id)}:{period}:{data_version(physiotherapist_id)}:{extra}'
+
+
+def get_or_set_report(name, compute, physiotherapist_id=None, year=None, month=None, timeout=None, **params):
+    """
+    Retorna o relatório em cache ou calcula com ``compute()`` e guarda o
+    resultado na chave versionada.
+    """
+    key = report_key(name, physiotherapist_id, year, month, **params)
+    value = cache.get(key)
+    metrics.record_cache(name, value is not None)
+    if value is None:
+        value = compute()
+        cache.set(key, value, timeout if timeout is not None else settings.CACHE_TIMEOUT)
+    return value
+
+
+async def aget_or_set_report(name, compute, physiotherapist_id=None, year=None, month=None, timeout=None, **params):
+    """
+    Versão assíncrona de ``get_or_set_report``: ``compute`` é uma corrotina.
+    Usa as mesmas chaves, então as views síncrona e assíncrona compartilham o cache.
+    """
+    key = await sync_to_async(report_key)(name, physiotherapist_id, year, month, **params)
+    value = await cache.aget(key)
+    metrics.record_cache(name, value is not None)
+    if value is None:
+        value = await compute()
+        await cache.aset(key, value, timeout if timeout is not None else settings.CACHE_TIMEOUT)
+    return value
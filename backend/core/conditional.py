@@ -0,0 +1,92 @@
+"""
+GET condicional (ETag) para listas e relatórios.
+
+A ETag é calculada a partir de uma impressão digital barata dos dados, sem
+serializar a resposta. Nas listas ela vem do banco (quantidade de registros e
+maior ``updated_at`` do queryset e das relações que entram no payload). Nos
+relatórios ela vem da chave do cache de relatórios, que só é consistente entre
+os workers com um cache compartilhado (CACHE_BACKEND db, file ou redis; o
+gunicorn recusa locmem com mais de um worker). Se o If-None-Match do cliente
+traz a mesma ETag, a resposta é 304 sem corpo.
+
+As respostas levam ``Cache-Control: private, no-cache``: o navegador guarda a
+resposta, mas sempre revalida antes de usá-la.
+"""
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import patch_cache_control
+from django.utils.http import http_date, parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+
+def make_etag(*parts):
+    """ETag fraca: o conteúdo é equivalente, não idêntico byte a byte"""
+    return 'W/"%s"' % hashlib.md5(repr(parts).encode()).hexdigest()
+
+
+def queryset_fingerprint(queryset, field='updated_at', related=()):
+    """
+    (quantidade, maior ``field``) do queryset em uma única consulta. A
+    quantidade detecta exclusões, que não alteram o maior ``updated_at``.
+    ``related`` acrescenta campos de relações (ex.: 'modality__updated_at'),
+    e o maior valor entre todos é o retornado.
+    """
+    fields = [field, *related]
+    values = queryset.order_by().aggregate(
+        count=Count('pk'), **{f'last_modified_{index}': Max(name) for index, name in enumerate(fields)}
+    )
+    moments = [values[f'last_modified_{index}'] for index in range(len(fields))]
+    return values['count'], max((moment for moment in moments if moment is not None), default=None)
+
+
+def not_modified(request, etag):
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    etags = parse_etags(request.headers.get('If-None-Match', ''))
+    # Comparação fraca (RFC 9110): ignora o prefixo W/
+    return '*' in etags or etag.removeprefix('W/') in {tag.removeprefix('W/') for tag in etags}
+
+
+def conditional_response(request, etag, build, last_modified=None):
+    """
+    Retorna 304 se o cliente já tem a versão ``etag``; senão, a resposta de
+    ``build()``. ``last_modified`` é só informativo: a decisão usa a ETag, que
+    também muda em exclusões e alterações de dados relacionados.
+    """
+    if not_modified(request, etag):
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = build()
+        if response.status_code != status.HTTP_200_OK:
+            return response
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+class ConditionalListMixin:
+    """
+    ``list()`` com ETag. A viewset informa em ``etag_related_fields`` as
+    datas de alteração das relações que aparecem no payload e em
+    ``list_etag_parts`` o que mais, além do queryset filtrado, altera a
+    resposta (ex.: data atual).
+    """
+    etag_related_fields = ()
+
+    def list_etag_parts(self, request):
+        return ()
+
+    def list(self, request, *args, **kwargs):
+        count, last_modified = queryset_fingerprint(
+            self.filter_queryset(self.get_queryset()), related=self.etag_related_fields
+        )
+        etag = make_etag(
+            request.get_full_path(), request.user.pk, count, last_modified, *self.list_etag_parts(request)
+        )
+        return conditional_response(
+            request, etag, lambda: super(ConditionalListMixin, self).list(request, *args, **kwargs), last_modified
+        )
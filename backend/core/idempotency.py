@@ -0,0 +1,85 @@
+"""
+Cabeçalho Idempotency-Key nas criações (pagamentos, repasses e horários).
+
+Com o cabeçalho, a requisição reserva a chave (índice único por usuário e
+chave) na mesma transação da criação e guarda a resposta. Repetições com a
+mesma chave recebem a resposta guardada, com ``Idempotent-Replayed: true``,
+sem criar outro registro. Uma repetição concorrente espera a transação da
+primeira terminar (o INSERT na chave única bloqueia) e recebe a mesma resposta.
+
+Só respostas 2xx são guardadas: depois de um erro o cliente pode corrigir os
+dados e reenviar com a mesma chave. As chaves expiram em IDEMPOTENCY_KEY_TTL
+horas.
+"""
+import functools
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from .jobs import periodic
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+
+
+def request_fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(f'{request.method} {request.path}\n{body}'.encode()).hexdigest()
+
+
+def replay(request, key, fingerprint):
+    record = IdempotencyKey.objects.get(user=request.user, key=key)
+    if record.fingerprint != fingerprint:
+        return Response(
+            {'detail': f'{HEADER} já utilizada em outra requisição.'},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY
+        )
+    response = Response(record.response, status=record.status_code)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(create):
+    """Decorator para o ``create`` de uma viewset"""
+
+    @functools.wraps(create)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return create(self, request, *args, **kwargs)
+        if len(key) > IdempotencyKey._meta.get_field('key').max_length:
+            raise ValidationError({HEADER: 'A chave deve ter no máximo 255 caracteres.'})
+
+        fingerprint = request_fingerprint(request)
+        with transaction.atomic():
+            try:
+                with transaction.atomic():
+                    record = IdempotencyKey.objects.create(user=request.user, key=key, fingerprint=fingerprint)
+            except IntegrityError:
+                return replay(request, key, fingerprint)
+
+            response = create(self, request, *args, **kwargs)
+            if status.is_success(response.status_code):
+                record.status_code = response.status_code
+                record.response = response.data
+                record.save(update_fields=['status_code', 'response'])
+            else:
+                record.delete()
+        return response
+
+    return wrapper
+
+
+@periodic('purge_idempotency_keys', 'IDEMPOTENCY_PURGE_INTERVAL')
+def purge_expired_keys():
+    # Um único DELETE: o modelo não tem receivers nem relações dependentes
+    IdempotencyKey.objects.filter(
+        created_at__lt=timezone.now() - timedelta(hours=settings.IDEMPOTENCY_KEY_TTL)
+    ).delete()
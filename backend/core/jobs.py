@@ -0,0 +1,53 @@
+"""
+Tarefas periódicas leves executadas pelos próprios workers, sem agendador externo.
+
+Ao final de cada requisição (sinal request_finished, depois que a resposta foi
+enviada) as tarefas vencidas são executadas. ``cache.add`` funciona como trava:
+com um cache compartilhado apenas um worker executa cada tarefa por intervalo.
+Cada processo só consulta o cache quando o intervalo local já passou.
+"""
+import logging
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+# nome -> (setting com o intervalo em segundos, função)
+JOBS = {}
+_next_run = {}
+
+
+def periodic(name, interval_setting):
+    def register(func):
+        JOBS[name] = (interval_setting, func)
+        return func
+    return register
+
+
+def run_due_jobs(**kwargs):
+    now = time.monotonic()
+    for name, (interval_setting, func) in JOBS.items():
+        interval = getattr(settings, interval_setting)
+        if not interval or now < _next_run.get(name, 0):
+            continue
+        _next_run[name] = now + interval
+        if not cache.add(f'job:{name}', int(time.time()), timeout=interval):
+            continue
+        try:
+            func()
+        except Exception:
+            logger.exception('Falha na tarefa periódica %s', name)
+
+
+@periodic('clear_expired_sessions', 'SESSION_PURGE_INTERVAL')
+def clear_expired_sessions():
+    """Equivalente ao manage.py clearsessions"""
+    engine = import_module(settings.SESSION_ENGINE)
+    try:
+        engine.SessionStore.clear_expired()
+    except NotImplementedError:
+        # Sessões em cookie ou em cache expiram sozinhas
+        pass
@@ -0,0 +1,169 @@
+import json
+import statistics
+import time
+from datetime import date
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+
+from core.middleware import QueryRecorder
+from payment.models import Payment
+from physiotherapist.models import Physiotherapist
+from student.models import Student
+
+DEFAULT_BASELINE = Path(settings.BASE_DIR) / 'benchmarks' / 'api_baseline.json'
+
+# Cache desativado: os relatórios seriam servidos do cache a partir da segunda
+# requisição e esconderiam regressões nas consultas
+NO_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+
+def endpoints(physiotherapist, student):
+    """(nome, url, parâmetros) dos endpoints medidos"""
+    return [
+        ('students', '/api/students/', {}),
+        ('payments', '/api/payments/', {}),
+        ('payments/summary', '/api/payments/summary/', {'month_year': date.today().strftime('%Y-%m')}),
+        ('payments/dashboard_summary', '/api/payments/dashboard_summary/', {}),
+        ('payments/student_payment_status', '/api/payments/student_payment_status/', {'student': student.pk}),
+        ('commission/total_commission_due', '/api/payments/commission/total_commission_due/',
+         {'physiotherapist': physiotherapist.pk}),
+        ('commission/due', f'/api/payments/commission/due/{physiotherapist.pk}/', {}),
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede latência (p50/p95), quantidade de consultas e tamanho das respostas dos '
+        'principais endpoints e compara com o baseline em JSON. Falha quando um '
+        'orçamento é excedido; a latência só é orçada se o baseline foi gravado com '
+        '--record-latency. Use sobre uma base populada (ex.: manage.py seed_load).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20, help='Requisições medidas por endpoint')
+        parser.add_argument('--warmup', type=int, default=2, help='Requisições de aquecimento por endpoint')
+        parser.add_argument('--baseline', default=str(DEFAULT_BASELINE), help='Arquivo JSON do baseline')
+        parser.add_argument('--update-baseline', action='store_true', help='Grava os resultados como novo baseline')
+        parser.add_argument('--record-latency', action='store_true',
+                            help='Inclui o p95 no baseline gravado (só faz sentido medido no banco de destino)')
+        parser.add_argument('--latency-tolerance', type=float, default=0.5,
+                            help='Aumento relativo permitido no p95 (0.5 = 50%%)')
+        parser.add_argument('--size-tolerance', type=float, default=0.2,
+                            help='Aumento relativo permitido no tamanho da resposta')
+        parser.add_argument('--with-cache', action='store_true', help='Mantém o cache configurado durante as medições')
+        parser.add_argument('--allow-missing-baseline', action='store_true',
+                            help='Só avisa, sem falhar, quando o arquivo de baseline não existe')
+
+    def handle(self, *args, **options):
+        admin = User.objects.filter(is_superuser=True).first()
+        # O fisioterapeuta com mais alunos concentra o maior volume de dados
+        physiotherapist = Physiotherapist.objects.select_related('user').annotate(
+            total=Count('students')
+        ).order_by('-total').first()
+        if admin is None or physiotherapist is None:
+            raise CommandError('É necessário um superusuário e ao menos um fisioterapeuta (veja seed_load)')
+        student = Student.objects.filter(physiotherapist=physiotherapist, active=True, modality__isnull=False).first()
+        if student is None:
+            raise CommandError(f'{physiotherapist} não tem alunos ativos com modalidade')
+
+        dataset = {
+            'students': Student.objects.count(),
+            'payments': Payment.objects.count(),
+        }
+        roles = [('admin', admin), ('physiotherapist', physiotherapist.user)]
+
+        if options['with_cache']:
+            results = self.run(roles, endpoints(physiotherapist, student), options)
+        else:
+            with override_settings(CACHES=NO_CACHE):
+                results = self.run(roles, endpoints(physiotherapist, student), options)
+
+        baseline_path = Path(options['baseline'])
+        if options['update_baseline']:
+            baseline_path.parent.mkdir(parents=True, exist_ok=True)
+            if not options['record_latency']:
+                # Sem latência, o baseline só orça consultas e tamanho
+                results = {
+                    key: {name: value for name, value in result.items() if name in ('queries', 'bytes')}
+                    for key, result in results.items()
+                }
+            baseline_path.write_text(json.dumps({'dataset': dataset, 'endpoints': results}, indent=2) + '\n')
+            self.stdout.write(self.style.SUCCESS(f'Baseline gravado em {baseline_path}'))
+            return
+
+        if not baseline_path.exists():
+            message = f'Baseline {baseline_path} não encontrado; rode com --update-baseline para criá-lo'
+            if not options['allow_missing_baseline']:
+                raise CommandError(message)
+            self.stdout.write(self.style.WARNING(message))
+            return
+        self.compare(json.loads(baseline_path.read_text()), dataset, results, options)
+
+    def run(self, roles, targets, options):
+        results = {}
+        self.stdout.write(f'{"Endpoint":<50} {"p50":>9} {"p95":>9} {"consultas":>9} {"bytes":>9}')
+        for role, user in roles:
+            client = APIClient()
+            client.force_authenticate(user=user)
+            for name, url, params in targets:
+                key = f'{name}[{role}]'
+                for _ in range(options['warmup']):
+                    client.get(url, params)
+
+                timings = []
+                queries = 0
+                for _ in range(options['iterations']):
+                    with QueryRecorder() as recorder:
+                        start = time.perf_counter()
+                        response = client.get(url, params)
+                        timings.append((time.perf_counter() - start) * 1000)
+                    queries = max(queries, recorder.count)
+                    if response.status_code != 200:
+                        raise CommandError(f'{key}: {url} respondeu {response.status_code}')
+
+                results[key] = {
+                    'p50_ms': round(statistics.median(timings), 2),
+                    'p95_ms': round(statistics.quantiles(timings, n=20)[-1] if len(timings) > 1 else timings[0], 2),
+                    'queries': queries,
+                    'bytes': len(response.content),
+                }
+                result = results[key]
+                self.stdout.write(
+                    f'{key:<50} {result["p50_ms"]:>7.2f}ms {result["p95_ms"]:>7.2f}ms '
+                    f'{result["queries"]:>9} {result["bytes"]:>9}'
+                )
+        return results
+
+    def compare(self, baseline, dataset, results, options):
+        if baseline.get('dataset') != dataset:
+            self.stdout.write(self.style.WARNING(
+                f'A base atual {dataset} difere da usada no baseline {baseline.get("dataset")}; '
+                'consultas e tamanhos podem variar'
+            ))
+
+        failures = []
+        for key, result in results.items():
+            expected = baseline['endpoints'].get(key)
+            if expected is None:
+                self.stdout.write(self.style.WARNING(f'{key}: sem baseline'))
+                continue
+            # Qualquer consulta a mais é regressão (N+1); latência e tamanho têm tolerância
+            if result['queries'] > expected['queries']:
+                failures.append(f'{key}: {result["queries"]} consultas (orçamento {expected["queries"]})')
+            if 'p95_ms' in expected:
+                latency_budget = expected['p95_ms'] * (1 + options['latency_tolerance'])
+                if result['p95_ms'] > latency_budget:
+                    failures.append(f'{key}: p95 {result["p95_ms"]:.2f}ms (orçamento {latency_budget:.2f}ms)')
+            size_budget = expected['bytes'] * (1 + options['size_tolerance'])
+            if result['bytes'] > size_budget:
+                failures.append(f'{key}: {result["bytes"]} bytes (orçamento {size_budget:.0f})')
+
+        if failures:
+            raise CommandError('Orçamentos excedidos:\n' + '\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS('Todos os endpoints dentro do orçamento'))
@@ -0,0 +1,100 @@
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connections
+from django.db.backends.signals import connection_created
+from django.test import Client
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara a latência por requisição com conexões novas (CONN_MAX_AGE=0) '
+        'e com a configuração atual de reutilização de conexões, e quantas conexões '
+        'cada cenário abriu.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='/api/modalities/', help='Endpoint a ser chamado')
+        parser.add_argument('--requests', type=int, default=200, help='Requisições por cenário')
+        parser.add_argument('--username', help='Usuário autenticado nas requisições (padrão: primeiro superusuário)')
+
+    def handle(self, *args, **options):
+        if options['username']:
+            user = User.objects.filter(username=options['username']).first()
+        else:
+            user = User.objects.filter(is_superuser=True).first()
+        if user is None:
+            raise CommandError('Nenhum usuário encontrado para autenticar as requisições')
+
+        connection = connections['default']
+        configured_max_age = connection.settings_dict['CONN_MAX_AGE']
+        if connection.settings_dict.get('OPTIONS', {}).get('pool'):
+            # Com o pool ativo toda conexão vem do pool; compare com uma execução usando DB_POOL=False
+            self.stdout.write(self.style.WARNING('DB_POOL ativo: medindo apenas o cenário com pool'))
+            scenarios = [('Pool do psycopg', 0)]
+        else:
+            scenarios = [
+                ('Sem reutilização (CONN_MAX_AGE=0)', 0),
+                (f'Persistente (CONN_MAX_AGE={configured_max_age})', configured_max_age),
+            ]
+
+        client = Client()
+        client.force_login(user)
+
+        opened = []
+
+        def count_connection(sender, connection, **kwargs):
+            opened.append(connection.alias)
+
+        results = []
+        connection_created.connect(count_connection)
+        try:
+            for label, max_age in scenarios:
+                # A nova idade máxima só vale a partir da próxima conexão aberta
+                connection.close()
+                connection.settings_dict['CONN_MAX_AGE'] = max_age
+
+                self.request(client, options['url'])  # Aquecimento
+                opened.clear()
+                timings = []
+                for _ in range(options['requests']):
+                    start = time.perf_counter()
+                    response = self.request(client, options['url'])
+                    timings.append((time.perf_counter() - start) * 1000)
+                    if response.status_code >= 400:
+                        raise CommandError(f'{options["url"]} respondeu {response.status_code}')
+                results.append((label, timings, len(opened)))
+        finally:
+            connection_created.disconnect(count_connection)
+            connection.close()
+            connection.settings_dict['CONN_MAX_AGE'] = configured_max_age
+
+        self.stdout.write(f'{options["url"]} - {options["requests"]} requisições por cenário')
+        self.stdout.write(f'{"Cenário":<40} {"média":>9} {"p50":>9} {"p95":>9} {"conexões":>9}')
+        for label, timings, connection_count in results:
+            p95 = statistics.quantiles(timings, n=20)[-1]
+            self.stdout.write(
+                f'{label:<40} {statistics.mean(timings):>7.2f}ms '
+                f'{statistics.median(timings):>7.2f}ms {p95:>7.2f}ms {connection_count:>9}'
+            )
+
+        if len(results) < 2:
+            return
+        baseline = statistics.mean(results[0][1])
+        reused = statistics.mean(results[-1][1])
+        self.stdout.write(self.style.SUCCESS(
+            f'Diferença média por requisição: {baseline - reused:.2f}ms ({(1 - reused / baseline) * 100:.1f}%)'
+        ))
+
+    def request(self, client, url):
+        """
+        GET com o ciclo de conexões do handler do Django: o test Client desliga
+        ``close_old_connections`` dos sinais request_started/request_finished
+        """
+        close_old_connections()
+        try:
+            return client.get(url)
+        finally:
+            close_old_connections()
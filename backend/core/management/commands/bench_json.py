@@ -0,0 +1,70 @@
+import json
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.utils.text import compress_string
+from rest_framework.renderers import JSONRenderer
+
+from core.middleware import CompressionMiddleware, brotli, compress_brotli
+from core.renderers import FastJSONRenderer, orjson
+from payment.reports import build_dashboard_summary
+from physiotherapist.models import Physiotherapist
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara o tempo de serialização do dashboard_summary com o JSONRenderer '
+        'padrão e com o FastJSONRenderer, e o tamanho da resposta sem compressão, '
+        'com gzip e com brotli. Use sobre uma base populada (ex.: manage.py seed_load).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200, help='Serializações medidas por renderer')
+        parser.add_argument('--brotli-quality', type=int, default=5, help='Qualidade do brotli (0 a 11)')
+
+    def handle(self, *args, **options):
+        physiotherapist = Physiotherapist.objects.annotate(total=Count('students')).order_by('-total').first()
+        if physiotherapist is None:
+            raise CommandError('É necessário ao menos um fisioterapeuta (veja seed_load)')
+        if orjson is None:
+            self.stdout.write(self.style.WARNING('orjson não instalado: o FastJSONRenderer usa o renderer padrão'))
+
+        payloads = [
+            ('admin', build_dashboard_summary(True)),
+            ('physiotherapist', build_dashboard_summary(False, physiotherapist)),
+        ]
+        for role, data in payloads:
+            self.stdout.write(f'dashboard_summary[{role}]')
+            standard = self.measure(JSONRenderer(), data, options['iterations'])
+            fast = self.measure(FastJSONRenderer(), data, options['iterations'])
+            if json.loads(standard['content']) != json.loads(fast['content']):
+                raise CommandError(f'{role}: os renderers geraram JSON diferente')
+            self.stdout.write(
+                f'  JSONRenderer      {standard["median_ms"]:8.3f}ms\n'
+                f'  FastJSONRenderer  {fast["median_ms"]:8.3f}ms '
+                f'({standard["median_ms"] / fast["median_ms"]:.1f}x)'
+            )
+            self.sizes(fast['content'], options['brotli_quality'])
+
+    def measure(self, renderer, data, iterations):
+        timings = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            content = renderer.render(data, 'application/json', {})
+            timings.append((time.perf_counter() - start) * 1000)
+        return {'median_ms': statistics.median(timings), 'content': content}
+
+    def sizes(self, content, brotli_quality):
+        sizes = [('sem compressão', content)]
+        # Mesma compressão do CompressionMiddleware
+        sizes.append(('gzip', compress_string(content, max_random_bytes=CompressionMiddleware.max_random_bytes)))
+        if brotli is not None:
+            sizes.append((f'brotli (q={brotli_quality})', compress_brotli(
+                content, brotli_quality, max_random_bytes=CompressionMiddleware.max_random_bytes
+            )))
+        else:
+            self.stdout.write('  brotli não instalado')
+        for name, compressed in sizes:
+            self.stdout.write(f'  {name:<18}{len(compressed):>10} bytes ({len(compressed) / len(content):.0%})')
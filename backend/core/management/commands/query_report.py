@@ -0,0 +1,78 @@
+import json
+import re
+import statistics
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Na exibição, a lista de colunas do SELECT é resumida para mostrar o FROM/WHERE
+SELECT_COLUMNS = re.compile(r'^SELECT (DISTINCT )?.*? FROM ')
+
+SORT_KEYS = {
+    'total': lambda row: row['total_ms'],
+    'count': lambda row: row['count'],
+    'p95': lambda row: row['p95_ms'],
+}
+
+
+class Command(BaseCommand):
+    help = 'Agrega o log de consultas lentas (SLOW_QUERY_LOG) por impressão digital da consulta.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--log', default=settings.SLOW_QUERY_LOG, help='Arquivo do log (padrão: SLOW_QUERY_LOG)')
+        parser.add_argument('--view', help='Considera apenas as consultas desta view (ex.: payments-summary)')
+        parser.add_argument('--sort', choices=sorted(SORT_KEYS), default='total', help='Ordenação do relatório')
+        parser.add_argument('--limit', type=int, default=20, help='Quantidade de padrões exibidos')
+        parser.add_argument('--width', type=int, default=160, help='Largura máxima da consulta exibida')
+
+    def handle(self, *args, **options):
+        durations = defaultdict(list)
+        queries = {}
+        views = defaultdict(Counter)
+        try:
+            with open(options['log'], encoding='utf-8') as log:
+                for line in log:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if options['view'] and entry.get('view') != options['view']:
+                        continue
+                    key = entry['fingerprint']
+                    durations[key].append(entry['duration_ms'])
+                    queries[key] = entry['query']
+                    views[key][entry.get('view') or '-'] += 1
+        except FileNotFoundError:
+            raise CommandError(f'Log {options["log"]} não encontrado. Defina SLOW_QUERY_MS para ativá-lo')
+
+        if not durations:
+            self.stdout.write('Nenhuma consulta registrada.')
+            return
+
+        rows = []
+        for key, values in durations.items():
+            rows.append({
+                'fingerprint': key,
+                'count': len(values),
+                'total_ms': sum(values),
+                'p95_ms': statistics.quantiles(values, n=20, method='inclusive')[-1] if len(values) > 1 else values[0],
+                'views': ', '.join(f'{view} ({count})' for view, count in views[key].most_common(3)),
+                'query': queries[key],
+            })
+        rows.sort(key=SORT_KEYS[options['sort']], reverse=True)
+
+        total = sum(row['total_ms'] for row in rows)
+        self.stdout.write(
+            f'{sum(row["count"] for row in rows)} consultas, {len(rows)} padrões, {total:.1f}ms no total'
+        )
+        self.stdout.write(f'{"padrão":<12} {"qtd":>7} {"total":>11} {"%":>6} {"p95":>10}  views')
+        for row in rows[:options['limit']]:
+            query = SELECT_COLUMNS.sub(r'SELECT \1... FROM ', row['query'], count=1)
+            if len(query) > options['width']:
+                query = query[:options['width'] - 3] + '...'
+            self.stdout.write(
+                f'{row["fingerprint"]:<12} {row["count"]:>7} {row["total_ms"]:>9.1f}ms '
+                f'{row["total_ms"] / total * 100 if total else 0:>5.1f}% {row["p95_ms"]:>8.2f}ms  {row["views"]}'
+            )
+            self.stdout.write(f'    {query}')
@@ -0,0 +1,285 @@
+import random
+import time
+from collections import defaultdict
+from datetime import date, datetime, time as datetime_time
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from core.cache import invalidate
+from modality.models import Modality
+from payment.models import ClinicCommissionPayment, MonthlySnapshot, Payment
+from payment.periods import in_month, shift_month
+from physiotherapist.models import Physiotherapist
+from schedule.models import StudentSchedule
+from student.balance import recompute
+from student.models import Student
+
+MODALITIES = [
+    # (nome, preço, tipo de pagamento)
+    ('Pilates 1x', Decimal('180.00'), 'MONTHLY'),
+    ('Pilates 2x', Decimal('290.00'), 'MONTHLY'),
+    ('Pilates 3x', Decimal('380.00'), 'MONTHLY'),
+    ('Fisioterapia', Decimal('120.00'), 'SESSION'),
+    ('RPG', Decimal('150.00'), 'SESSION'),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Gera uma clínica sintética para testes de carga: fisioterapeutas, alunos, '
+        'horários, pagamentos e repasses de comissão. Insere com bulk_create em lotes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--physiotherapists', type=int, default=10, help='Quantidade de fisioterapeutas')
+        parser.add_argument('--students', type=int, default=1000, help='Quantidade de alunos')
+        parser.add_argument('--years', type=int, default=2, help='Anos de histórico de pagamentos')
+        parser.add_argument('--session-share', type=float, default=0.2,
+                            help='Fração dos alunos em modalidades por sessão')
+        parser.add_argument('--pos-share', type=float, default=0.3, help='Fração dos alunos pós-pagos')
+        parser.add_argument('--overdue-rate', type=float, default=0.08,
+                            help='Probabilidade de uma mensalidade não ser paga')
+        parser.add_argument('--inactive-rate', type=float, default=0.1, help='Fração dos alunos inativos')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Registros por INSERT')
+        parser.add_argument('--prefix', default='load', help='Prefixo dos usuários e modalidades gerados')
+        parser.add_argument('--password', default='load12345', help='Senha dos fisioterapeutas gerados')
+        parser.add_argument('--seed', type=int, default=42, help='Semente do gerador aleatório')
+        parser.add_argument('--clear', action='store_true', help='Remove os dados gerados anteriormente com o mesmo prefixo')
+
+    def handle(self, *args, **options):
+        if options['physiotherapists'] < 1 or options['students'] < 0 or options['years'] < 1:
+            raise CommandError('Informe ao menos 1 fisioterapeuta e 1 ano de histórico')
+
+        self.options = options
+        self.batch_size = options['batch_size']
+        self.random = random.Random(options['seed'])
+        self.today = date.today()
+        self.start = date(*shift_month(self.today.year, self.today.month, -12 * options['years']), 1)
+        started = time.perf_counter()
+
+        with transaction.atomic():
+            if options['clear']:
+                self.clear()
+            modalities = self.create_modalities()
+            physiotherapists = self.create_physiotherapists()
+            students = self.create_students(physiotherapists, modalities)
+            self.create_schedules(students)
+            commissions_due = self.create_payments(students)
+            self.create_commissions(physiotherapists, commissions_due)
+            # bulk_create não dispara sinais: grava o saldo dos alunos de uma vez
+            recompute(Student.objects.filter(physiotherapist__in=physiotherapists))
+
+        # bulk_create não dispara sinais: invalida os relatórios em cache e os snapshots
+        MonthlySnapshot.objects.all().delete()
+        invalidate()
+
+        self.stdout.write(self.style.SUCCESS(f'Concluído em {time.perf_counter() - started:.1f}s'))
+
+    def bulk_create(self, model, objects):
+        created = []
+        for start in range(0, len(objects), self.batch_size):
+            created += model.objects.bulk_create(objects[start:start + self.batch_size])
+        return created
+
+    def clear(self):
+        prefix = self.options['prefix']
+        physiotherapists = Physiotherapist.objects.filter(user__username__startswith=f'{prefix}-')
+        students = Student.objects.filter(physiotherapist__in=physiotherapists)
+        payments = Payment.objects.filter(student__in=students)
+        commissions = ClinicCommissionPayment.objects.filter(physiotherapist__in=physiotherapists)
+        through = ClinicCommissionPayment.payments.through
+
+        # DELETE direto, sem carregar os objetos: os receivers de post_delete
+        # impediriam o delete rápido do Django e seriam chamados linha a linha
+        for queryset in [
+            through.objects.filter(cliniccommissionpayment__in=commissions),
+            through.objects.filter(payment__in=payments),
+            commissions,
+            payments,
+            StudentSchedule.objects.filter(student__in=students),
+            students,
+        ]:
+            queryset._raw_delete(queryset.db)
+        User.objects.filter(physiotherapist__in=physiotherapists).delete()
+        Modality.objects.filter(name__startswith=f'{prefix} ', students__isnull=True, payments__isnull=True).delete()
+        self.stdout.write('Dados gerados anteriormente removidos')
+
+    def create_modalities(self):
+        prefix = self.options['prefix']
+        modalities = []
+        for name, price, payment_type in MODALITIES:
+            modality, _ = Modality.objects.get_or_create(
+                name=f'{prefix} {name}', defaults={'price': price, 'payment_type': payment_type}
+            )
+            modalities.append(modality)
+        return modalities
+
+    def create_physiotherapists(self):
+        prefix = self.options['prefix']
+        count = self.options['physiotherapists']
+        if User.objects.filter(username__startswith=f'{prefix}-').exists():
+            raise CommandError(f'Já existem usuários com o prefixo "{prefix}". Use --clear ou outro --prefix')
+
+        # O hash é calculado uma única vez; todos os usuários gerados usam a mesma senha
+        password = make_password(self.options['password'])
+        users = self.bulk_create(User, [
+            User(
+                username=f'{prefix}-physio-{index}', password=password,
+                first_name='Fisioterapeuta', last_name=str(index),
+                email=f'{prefix}-physio-{index}@example.com'
+            )
+            for index in range(1, count + 1)
+        ])
+        physiotherapists = self.bulk_create(Physiotherapist, [
+            Physiotherapist(
+                user=user, crefito=f'{prefix}-{index}', phone='11999999999', specialization='Pilates'
+            )
+            for index, user in enumerate(users, start=1)
+        ])
+        self.stdout.write(f'{len(physiotherapists)} fisioterapeutas')
+        return physiotherapists
+
+    def create_students(self, physiotherapists, modalities):
+        monthly = [modality for modality in modalities if modality.payment_type == 'MONTHLY']
+        session = [modality for modality in modalities if modality.payment_type == 'SESSION']
+        months = 12 * self.options['years']
+
+        students = []
+        for index in range(1, self.options['students'] + 1):
+            is_session = self.random.random() < self.options['session_share']
+            # Cadastro distribuído ao longo do período, com mais alunos antigos
+            months_ago = int(months * (1 - self.random.random() ** 2))
+            registered = date(*shift_month(self.today.year, self.today.month, -months_ago), self.random.randint(1, 28))
+            student = Student(
+                name=f'Aluno {index}',
+                email=f'aluno{index}@example.com',
+                physiotherapist=self.random.choice(physiotherapists),
+                modality=self.random.choice(session if is_session else monthly),
+                payment_type='POS' if self.random.random() < self.options['pos_share'] else 'PRE',
+                payment_day=self.random.choice([5, 10, 15, 20, 25]),
+                session_quantity=self.random.randint(2, 8) if is_session else None,
+                commission=Decimal(self.random.choice([30, 40, 50, 60])),
+                active=self.random.random() >= self.options['inactive_rate'],
+            )
+            student._registered = registered
+            students.append(student)
+
+        students = self.bulk_create(Student, students)
+        # registration_date é auto_now_add e é sobrescrito no INSERT
+        for student in students:
+            student.registration_date = timezone.make_aware(datetime.combine(student._registered, datetime_time(9)))
+        Student.objects.bulk_update(students, ['registration_date'], batch_size=self.batch_size)
+        self.stdout.write(f'{len(students)} alunos')
+        return students
+
+    def create_schedules(self, students):
+        schedules = []
+        for student in students:
+            slots = set()
+            for _ in range(self.random.randint(1, 3)):
+                slots.add((self.random.randint(0, 5), self.random.randint(6, 21)))
+            schedules += [StudentSchedule(student=student, weekday=weekday, hour=hour) for weekday, hour in slots]
+        self.bulk_create(StudentSchedule, schedules)
+        self.stdout.write(f'{len(schedules)} horários')
+
+    def create_payments(self, students):
+        """
+        Gera os pagamentos mês a mês de cada aluno e retorna as comissões devidas
+        por (fisioterapeuta, ano, mês) da data do pagamento.
+        """
+        overdue_rate = self.options['overdue_rate']
+        commissions_due = defaultdict(Decimal)
+        pending = []
+        total = 0
+
+        for student in students:
+            registered = max(student._registered, self.start)
+            year, month = registered.year, registered.month
+            # Alunos inativos param de pagar em algum momento do período
+            last = (self.today.year, self.today.month)
+            if not student.active:
+                last = min(last, shift_month(year, month, self.random.randint(0, 12)))
+
+            while (year, month) <= last:
+                if self.random.random() >= overdue_rate:
+                    payment = self.build_payment(student, year, month)
+                    if payment.payment_date <= self.today:
+                        pending.append(payment)
+                        commissions_due[student.physiotherapist_id, payment.payment_date.year, payment.payment_date.month] += (
+                            payment.amount * student.commission / 100
+                        )
+                year, month = shift_month(year, month, 1)
+
+            if len(pending) >= self.batch_size:
+                total += len(Payment.objects.bulk_create(pending, batch_size=self.batch_size))
+                pending = []
+                self.stdout.write(f'  {total} pagamentos...', ending='\r')
+
+        total += len(Payment.objects.bulk_create(pending, batch_size=self.batch_size))
+        self.stdout.write(f'{total} pagamentos')
+        return commissions_due
+
+    def build_payment(self, student, year, month):
+        modality = student.modality
+        if modality.payment_type == 'SESSION':
+            amount = modality.price * student.session_quantity
+        else:
+            amount = modality.price
+
+        # Pós-pagos pagam no mês seguinte ao mês de referência
+        pay_year, pay_month = (year, month) if student.payment_type == 'PRE' else shift_month(year, month, 1)
+        # A maioria paga até o vencimento; alguns atrasam alguns dias
+        day = student.payment_day + (self.random.randint(1, 10) if self.random.random() < 0.15 else -self.random.randint(0, 4))
+        day = min(max(day, 1), 28)
+        return Payment(
+            student=student,
+            modality=modality,
+            amount=amount,
+            payment_date=date(pay_year, pay_month, day),
+            reference_month=date(year, month, 1),
+        )
+
+    def create_commissions(self, physiotherapists, commissions_due):
+        """Um repasse por fisioterapeuta e mês fechado, vinculado aos pagamentos do mês"""
+        commissions = []
+        for (physiotherapist_id, year, month), due in sorted(commissions_due.items()):
+            if (year, month) >= (self.today.year, self.today.month):
+                continue
+            transfer_year, transfer_month = shift_month(year, month, 1)
+            recent = (transfer_year, transfer_month) == (self.today.year, self.today.month)
+            # Alguns repasses são parciais; o do último mês ainda aguarda aprovação
+            paid = due if self.random.random() < 0.9 else due * Decimal('0.5')
+            commission = ClinicCommissionPayment(
+                physiotherapist_id=physiotherapist_id,
+                transfer_date=date(transfer_year, transfer_month, min(5, self.today.day) if recent else 5),
+                total_commission_due=due.quantize(Decimal('0.01')),
+                amount_paid=paid.quantize(Decimal('0.01')),
+                description=f'Repasse de {month:02d}/{year}',
+                status='awaiting_approval' if recent else 'approved',
+            )
+            commission._period = (year, month)
+            commissions.append(commission)
+        commissions = self.bulk_create(ClinicCommissionPayment, commissions)
+
+        through = ClinicCommissionPayment.payments.through
+        links = []
+        linked = 0
+        for commission in commissions:
+            payment_ids = Payment.objects.filter(
+                in_month('payment_date', *commission._period),
+                student__physiotherapist_id=commission.physiotherapist_id,
+            ).values_list('id', flat=True)
+            links += [
+                through(cliniccommissionpayment_id=commission.id, payment_id=payment_id)
+                for payment_id in payment_ids
+            ]
+            if len(links) >= self.batch_size:
+                linked += len(through.objects.bulk_create(links, batch_size=self.batch_size))
+                links = []
+        linked += len(through.objects.bulk_create(links, batch_size=self.batch_size))
+        self.stdout.write(f'{len(commissions)} repasses de comissão ({linked} pagamentos vinculados)')
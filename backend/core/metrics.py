@@ -0,0 +1,235 @@
+"""
+Métricas da aplicação no formato de exposição de texto do Prometheus.
+
+Cada processo acumula contadores e histogramas em memória e uma thread os grava
+a cada METRICS_FLUSH_INTERVAL segundos em ``METRICS_DIR/worker-<pid>.json``. O endpoint /metrics soma
+os arquivos de todos os processos, então qualquer worker do gunicorn responde
+com o total. Quando um worker termina, o gunicorn (child_exit) soma o arquivo
+dele em ``archived.json`` e o remove: os contadores nunca diminuem e o número de
+arquivos fica no número de workers. O diretório é limpo quando o gunicorn inicia.
+"""
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from django.conf import settings
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+# Soma dos workers encerrados (ver archive_worker)
+ARCHIVE_NAME = 'archived.json'
+
+HELP = {
+    'http_requests_total': ('counter', 'Requisições atendidas por view, método e status'),
+    'http_request_duration_seconds': ('histogram', 'Duração das requisições por view'),
+    'http_request_db_queries': ('histogram', 'Consultas SQL por requisição, por view'),
+    'report_cache_requests_total': ('counter', 'Leituras do cache de relatórios (hit/miss)'),
+}
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._flusher_pid = None
+        self._process = (None, None)
+        # chave: (nome, ((label, valor), ...))
+        self.counters = defaultdict(float)
+        # chave -> {'buckets': limites, 'counts': contagem por bucket + estouro, 'sum': soma}
+        self.histograms = {}
+
+    def increment(self, name, labels, value=1):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] += value
+            self._dirty = True
+
+    def observe(self, name, labels, value, buckets):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {'buckets': list(buckets), 'counts': [0] * (len(buckets) + 1), 'sum': 0.0}
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram['counts'][index] += 1
+                    break
+            else:
+                histogram['counts'][-1] += 1
+            histogram['sum'] += value
+            self._dirty = True
+
+    def process(self):
+        """Identifica o processo atual: o pid pode ser reutilizado por um worker novo"""
+        if self._process[0] != os.getpid():
+            self._process = (os.getpid(), f'{os.getpid()}-{time.time_ns()}')
+        return self._process[1]
+
+    def snapshot(self):
+        with self._lock:
+            self._dirty = False
+            return {
+                'process': self.process(),
+                'counters': [[name, labels, value] for (name, labels), value in self.counters.items()],
+                'histograms': [[name, labels, dict(histogram, counts=list(histogram['counts']))]
+                               for (name, labels), histogram in self.histograms.items()],
+            }
+
+    def start_flusher(self):
+        """
+        Inicia a thread que grava o arquivo deste processo. Verifica o pid porque
+        threads não sobrevivem ao fork dos workers (preload_app).
+        """
+        if self._flusher_pid == os.getpid():
+            return
+        self._flusher_pid = os.getpid()
+        threading.Thread(target=self._flush_periodically, daemon=True).start()
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(settings.METRICS_FLUSH_INTERVAL)
+            if self._dirty:
+                self.flush()
+
+    def flush(self):
+        """Grava o estado deste processo no seu arquivo"""
+        directory = Path(settings.METRICS_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f'worker-{os.getpid()}.json'
+        temporary = directory / f'.worker-{os.getpid()}-{threading.get_ident()}.tmp'
+        temporary.write_text(json.dumps(self.snapshot()))
+        # Troca atômica: o leitor nunca vê um arquivo pela metade
+        os.replace(temporary, path)
+
+
+registry = Registry()
+
+
+def record_request(view, method, status_code, duration, query_count):
+    registry.increment('http_requests_total', {'view': view, 'method': method, 'status': str(status_code)})
+    registry.observe('http_request_duration_seconds', {'view': view}, duration, LATENCY_BUCKETS)
+    registry.observe('http_request_db_queries', {'view': view}, query_count, QUERY_BUCKETS)
+    registry.start_flusher()
+
+
+def record_cache(name, hit):
+    if not settings.METRICS_ENABLED:
+        return
+    registry.increment('report_cache_requests_total', {'report': name, 'result': 'hit' if hit else 'miss'})
+
+
+def _read(path):
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def _merge(counters, histograms, data):
+    for name, labels, value in data['counters']:
+        counters[name, tuple(map(tuple, labels))] += value
+    for name, labels, histogram in data['histograms']:
+        key = (name, tuple(map(tuple, labels)))
+        total = histograms.setdefault(key, {
+            'buckets': histogram['buckets'], 'counts': [0] * len(histogram['counts']), 'sum': 0.0
+        })
+        total['counts'] = [a + b for a, b in zip(total['counts'], histogram['counts'])]
+        total['sum'] += histogram['sum']
+
+
+EMPTY_ARCHIVE = {'processes': [], 'counters': [], 'histograms': []}
+
+
+def collect():
+    """Soma os arquivos de todos os processos e dos workers encerrados"""
+    registry.flush()
+    directory = Path(settings.METRICS_DIR)
+    # Workers antes do arquivo consolidado: um worker arquivado no meio da leitura
+    # aparece em ``processes`` e não é contado duas vezes
+    workers = [_read(path) for path in directory.glob('worker-*.json')]
+    archived = _read(directory / ARCHIVE_NAME) or EMPTY_ARCHIVE
+
+    counters = defaultdict(float)
+    histograms = {}
+    _merge(counters, histograms, archived)
+    for data in workers:
+        if data is not None and data.get('process') not in archived['processes']:
+            _merge(counters, histograms, data)
+    return counters, histograms
+
+
+def archive_worker(pid):
+    """
+    Soma o arquivo do worker ``pid`` (encerrado) em ``archived.json`` e o remove.
+    Chamado pelo processo principal do gunicorn, único que grava o consolidado.
+    """
+    directory = Path(settings.METRICS_DIR)
+    path = directory / f'worker-{pid}.json'
+    data = _read(path)
+    if data is None:
+        return
+    archived = _read(directory / ARCHIVE_NAME) or EMPTY_ARCHIVE
+    counters = defaultdict(float)
+    histograms = {}
+    _merge(counters, histograms, archived)
+    _merge(counters, histograms, data)
+    # Basta lembrar dos processos cujo arquivo ainda pode existir
+    processes = [
+        process for process in archived['processes']
+        if (directory / f'worker-{process.split("-")[0]}.json').exists()
+    ]
+    temporary = directory / f'.{ARCHIVE_NAME}.tmp'
+    temporary.write_text(json.dumps({
+        'processes': processes + [data['process']],
+        'counters': [[name, labels, value] for (name, labels), value in counters.items()],
+        'histograms': [[name, labels, histogram] for (name, labels), histogram in histograms.items()],
+    }))
+    # O consolidado é trocado antes de remover o arquivo do worker: quem ler no
+    # meio do caminho ignora o worker pelo ``process``
+    os.replace(temporary, directory / ARCHIVE_NAME)
+    path.unlink()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels, **extra):
+    items = list(labels) + list(extra.items())
+    if not items:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in items) + '}'
+
+
+def _format_number(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def render():
+    counters, histograms = collect()
+    lines = []
+    for name, (kind, description) in HELP.items():
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind == 'counter':
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f'{name}{_format_labels(labels)} {_format_number(value)}')
+            continue
+
+        for (metric, labels), histogram in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(histogram['buckets'], histogram['counts']):
+                cumulative += count
+                lines.append(f'{name}_bucket{_format_labels(labels, le=_format_number(bound))} {cumulative}')
+            cumulative += histogram['counts'][-1]
+            lines.append(f'{name}_bucket{_format_labels(labels, le="+Inf")} {cumulative}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {_format_number(histogram["sum"])}')
+            lines.append(f'{name}_count{_format_labels(labels)} {cumulative}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,347 @@
+"""
+Instrumentação por requisição.
+
+Com REQUEST_TIMING ativo, cada resposta recebe um cabeçalho ``Server-Timing``
+(visível na aba Network das ferramentas de desenvolvedor) com o tempo gasto no
+banco, na renderização do JSON e o total, e uma linha de log estruturada no
+logger ``core.timing``. Desativado, o Django remove o middleware na
+inicialização (MiddlewareNotUsed) e não há custo por requisição.
+
+Com REQUEST_PROFILER ativo, usuários staff podem adicionar ``?_profile=1`` (ou
+o cabeçalho ``X-Profile: 1``) a qualquer requisição e recebem, no lugar da
+resposta, o relatório do cProfile com as consultas SQL executadas.
+
+Com METRICS_ENABLED ativo, cada requisição alimenta os contadores e histogramas
+expostos em /metrics (ver core.metrics).
+
+Com SLOW_QUERY_MS definido, as consultas acima do limite são registradas com a
+view de origem (ver core.slow_queries).
+
+O SessionTouchMiddleware renova a expiração da sessão no máximo uma vez a cada
+SESSION_TOUCH_INTERVAL segundos, em vez de gravá-la em toda requisição.
+
+Com COMPRESSION_ENABLED ativo, respostas JSON e de texto acima de
+COMPRESSION_MIN_SIZE bytes são comprimidas com brotli (se instalado e aceito
+pelo cliente) ou gzip. As duas saídas levam bytes aleatórios contra o ataque
+BREACH: no gzip, o nome de arquivo do cabeçalho (como no GZipMiddleware do
+Django); no brotli, um meta-bloco de metadados, que o decodificador ignora.
+"""
+import cProfile
+import io
+from contextlib import ExitStack
+import json
+import logging
+import pstats
+import secrets
+import time
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_string
+
+from . import metrics
+from .models import ProfileReport
+from .slow_queries import SlowQueryLogger
+
+logger = logging.getLogger('core.timing')
+
+
+class QueryRecorder:
+    """
+    Conta as consultas e soma o tempo gasto no banco em todas as conexões da
+    thread atual enquanto estiver ativo (usar como context manager).
+    """
+
+    def __init__(self, capture=False):
+        self.count = 0
+        self.duration = 0.0
+        # Com capture, guarda (sql, duração em segundos) de cada consulta
+        self.queries = [] if capture else None
+        self._wrappers = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.count += 1
+            self.duration += duration
+            if self.queries is not None:
+                self.queries.append((sql, duration))
+
+    def __enter__(self):
+        for connection in connections.all():
+            wrapper = connection.execute_wrapper(self)
+            wrapper.__enter__()
+            self._wrappers.append(wrapper)
+        return self
+
+    def __exit__(self, *exc_info):
+        while self._wrappers:
+            self._wrappers.pop().__exit__(*exc_info)
+
+
+class SessionTouchMiddleware:
+    def __init__(self, get_response):
+        if not settings.SESSION_TOUCH_INTERVAL:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        session = getattr(request, 'session', None)
+        # Sem cookie de sessão não há o que renovar (e nem carrega a sessão)
+        if session is None or settings.SESSION_COOKIE_NAME not in request.COOKIES or not session.session_key:
+            return response
+
+        now = int(time.time())
+        if now - session.get('_touched', 0) >= settings.SESSION_TOUCH_INTERVAL:
+            # Marca a sessão como modificada: o SessionMiddleware grava e renova o cookie
+            session['_touched'] = now
+        return response
+
+
+class CompressionMiddleware:
+    # Planilhas e imagens já são comprimidas
+    COMPRESSIBLE_TYPES = ('application/json', 'text/')
+    # Bytes aleatórios na resposta comprimida: o tamanho deixa de revelar
+    # segredos do corpo (ataque BREACH)
+    max_random_bytes = 100
+
+    def __init__(self, get_response):
+        if not settings.COMPRESSION_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (
+            response.streaming
+            or response.has_header('Content-Encoding')
+            or not response.get('Content-Type', '').startswith(self.COMPRESSIBLE_TYPES)
+            or len(response.content) < settings.COMPRESSION_MIN_SIZE
+        ):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        accepted = accepted_encodings(request.headers.get('Accept-Encoding', ''))
+        if brotli is not None and 'br' in accepted:
+            compressed = compress_brotli(
+                response.content, settings.COMPRESSION_BROTLI_QUALITY, max_random_bytes=self.max_random_bytes
+            )
+            encoding = 'br'
+        elif 'gzip' in accepted:
+            compressed = compress_string(response.content, max_random_bytes=self.max_random_bytes)
+            encoding = 'gzip'
+        else:
+            return response
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoding
+        # O corpo muda com a codificação: uma ETag forte passa a ser fraca
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
+
+
+def compress_brotli(content, quality, max_random_bytes=None):
+    """
+    ``brotli.compress`` com um meta-bloco de metadados de 1 a
+    ``max_random_bytes`` bytes logo após o cabeçalho do stream (RFC 7932, 9.2)
+    """
+    if not max_random_bytes:
+        return brotli.compress(content, quality=quality)
+
+    compressor = brotli.Compressor(quality=quality)
+    # O flush sem dados grava só o cabeçalho e alinha o stream no próximo byte
+    header = compressor.process(b'') + compressor.flush()
+    padding = secrets.randbelow(max_random_bytes) + 1
+    # ISLAST=0, MNIBBLES=11 (metadados), reservado=0, MSKIPBYTES=01, MSKIPLEN-1 em 8 bits
+    metadata = (0b0110 | 0b01 << 4 | (padding - 1) << 6).to_bytes(2, 'little')
+    return header + metadata + b'a' * padding + compressor.process(content) + compressor.finish()
+
+
+def accepted_encodings(header):
+    """Codificações do Accept-Encoding, sem as recusadas com q=0"""
+    encodings = set()
+    for item in header.split(','):
+        name, _, params = item.partition(';')
+        quality = params.strip().removeprefix('q=')
+        try:
+            if params and float(quality) <= 0:
+                continue
+        except ValueError:
+            continue
+        encodings.add(name.strip().lower())
+    return encodings
+
+
+class RequestTimingMiddleware:
+    def __init__(self, get_response):
+        if not settings.REQUEST_TIMING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        request._render_duration = 0.0
+        with QueryRecorder() as queries:
+            response = self.get_response(request)
+        total = time.perf_counter() - start
+
+        timings = {
+            'db': queries.duration,
+            'render': request._render_duration,
+            'app': max(total - queries.duration - request._render_duration, 0),
+            'total': total,
+        }
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={timings["db"] * 1000:.1f};desc="{queries.count} queries"',
+            f'render;dur={timings["render"] * 1000:.1f}',
+            f'app;dur={timings["app"] * 1000:.1f}',
+            f'total;dur={timings["total"] * 1000:.1f}',
+        ])
+
+        match = getattr(request, 'resolver_match', None)
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'queries': queries.count,
+            **{f'{name}_ms': round(value * 1000, 1) for name, value in timings.items()},
+        }))
+        return response
+
+    def process_template_response(self, request, response):
+        # As respostas do DRF são renderizadas depois da view; mede do início da
+        # renderização até o callback executado ao final dela
+        render_start = time.perf_counter()
+
+        def rendered(response):
+            request._render_duration = time.perf_counter() - render_start
+
+        response.add_post_render_callback(rendered)
+        return response
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        with QueryRecorder() as queries:
+            response = self.get_response(request)
+        match = getattr(request, 'resolver_match', None)
+        if match is None or match.view_name == 'metrics':
+            # Rotas inexistentes criariam um rótulo por URL; /metrics não mede a si mesmo
+            return response
+        metrics.record_request(
+            match.view_name, request.method, response.status_code, time.perf_counter() - start, queries.count
+        )
+        return response
+
+
+class SlowQueryMiddleware:
+    def __init__(self, get_response):
+        if settings.SLOW_QUERY_MS is None:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        slow_query_logger = SlowQueryLogger(request, settings.SLOW_QUERY_MS)
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(slow_query_logger))
+            return self.get_response(request)
+
+
+class ProfilerMiddleware:
+    """
+    Profiler sob demanda para staff. Deve vir depois do AuthenticationMiddleware.
+    Os relatórios também são gravados em ProfileReport (visível no admin),
+    mantendo apenas os PROFILER_HISTORY mais recentes.
+    """
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_PROFILER:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not self.requested(request):
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        with QueryRecorder(capture=True) as queries:
+            try:
+                profiler.enable()
+            except ValueError:
+                # Outro profiler já está ativo neste processo (ex.: requisição concorrente)
+                profiler = None
+            try:
+                response = self.get_response(request)
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+        duration = time.perf_counter() - start
+
+        report = self.build_report(request, response, duration, profiler, queries)
+        profile_response = HttpResponse(report, content_type='text/plain; charset=utf-8')
+        if settings.PROFILER_HISTORY:
+            stored = ProfileReport.objects.create(
+                user=request.user,
+                method=request.method,
+                path=request.get_full_path()[:500],
+                status_code=response.status_code,
+                duration_ms=duration * 1000,
+                query_count=queries.count,
+                report=report,
+            )
+            ProfileReport.trim(settings.PROFILER_HISTORY)
+            profile_response['X-Profile-Id'] = str(stored.pk)
+        return profile_response
+
+    def requested(self, request):
+        flag = request.GET.get('_profile') or request.headers.get('X-Profile')
+        if flag not in ('1', 'true'):
+            return False
+        user = getattr(request, 'user', None)
+        return user is not None and user.is_authenticated and user.is_staff
+
+    def build_report(self, request, response, duration, profiler, queries):
+        output = io.StringIO()
+        output.write(
+            f'{request.method} {request.get_full_path()} -> {response.status_code}\n'
+            f'Tempo total: {duration * 1000:.1f}ms | SQL: {queries.count} consultas, '
+            f'{queries.duration * 1000:.1f}ms\n\n'
+        )
+
+        output.write(f'=== Funções por tempo acumulado (top {settings.PROFILER_TOP}) ===\n')
+        if profiler is None:
+            output.write('Profiler indisponível: outro profiler estava ativo.\n')
+        else:
+            stats = pstats.Stats(profiler, stream=output)
+            stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(settings.PROFILER_TOP)
+
+        output.write(f'\n=== SQL ({queries.count} consultas, na ordem de execução) ===\n')
+        for index, (sql, query_duration) in enumerate(queries.queries, start=1):
+            output.write(f'{index:>4}. {query_duration * 1000:8.2f}ms  {sql}\n')
+        return output.getvalue()
@@ -0,0 +1,36 @@
+# Generated by Django 5.2 on 2026-10-19 12:21
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfileReport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('method', models.CharField(max_length=10, verbose_name='Método')),
+                ('path', models.CharField(max_length=500, verbose_name='Caminho')),
+                ('status_code', models.PositiveSmallIntegerField(verbose_name='Status')),
+                ('duration_ms', models.FloatField(verbose_name='Duração (ms)')),
+                ('query_count', models.PositiveIntegerField(verbose_name='Consultas')),
+                ('report', models.TextField(verbose_name='Relatório')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Usuário')),
+            ],
+            options={
+                'verbose_name': 'Relatório de Profiling',
+                'verbose_name_plural': 'Relatórios de Profiling',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2 on 2026-10-19 12:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('collection', models.CharField(max_length=30, verbose_name='Coleção')),
+                ('object_id', models.PositiveBigIntegerField(verbose_name='ID do registro')),
+                ('physiotherapist_id', models.PositiveBigIntegerField(blank=True, null=True, verbose_name='Fisioterapeuta')),
+                ('deleted_at', models.DateTimeField(auto_now_add=True, verbose_name='Excluído em')),
+            ],
+            options={
+                'verbose_name': 'Exclusão sincronizada',
+                'verbose_name_plural': 'Exclusões sincronizadas',
+                'indexes': [models.Index(fields=['deleted_at'], name='core_tombst_deleted_51085d_idx')],
+            },
+        ),
+    ]
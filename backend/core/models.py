@@ -0,0 +1,95 @@
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+
+
+class ProfileReport(models.Model):
+    """
+    Relatório do profiler sob demanda (?_profile=1). Apenas os
+    PROFILER_HISTORY mais recentes são mantidos.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='Usuário'
+    )
+    method = models.CharField(max_length=10, verbose_name='Método')
+    path = models.CharField(max_length=500, verbose_name='Caminho')
+    status_code = models.PositiveSmallIntegerField(verbose_name='Status')
+    duration_ms = models.FloatField(verbose_name='Duração (ms)')
+    query_count = models.PositiveIntegerField(verbose_name='Consultas')
+    report = models.TextField(verbose_name='Relatório')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.method} {self.path} ({self.duration_ms:.0f}ms)'
+
+    @classmethod
+    def trim(cls, keep):
+        """Remove os relatórios mais antigos, mantendo os ``keep`` mais recentes"""
+        stale = list(cls.objects.order_by('-created_at', '-id').values_list('id', flat=True)[keep:])
+        if stale:
+            cls.objects.filter(id__in=stale).delete()
+
+    class Meta:
+        verbose_name = 'Relatório de Profiling'
+        verbose_name_plural = 'Relatórios de Profiling'
+        ordering = ['-created_at']
+
+
+class Tombstone(models.Model):
+    """
+    Exclusão registrada para a sincronização incremental (/api/sync/). Também
+    marca registros que passaram para outro fisioterapeuta, que deixam de
+    existir para o anterior. Mantidos por SYNC_TOMBSTONE_DAYS dias.
+    """
+    collection = models.CharField(max_length=30, verbose_name='Coleção')
+    object_id = models.PositiveBigIntegerField(verbose_name='ID do registro')
+    # Sem chave estrangeira: o fisioterapeuta pode ter sido excluído
+    physiotherapist_id = models.PositiveBigIntegerField(null=True, blank=True, verbose_name='Fisioterapeuta')
+    deleted_at = models.DateTimeField(auto_now_add=True, verbose_name='Excluído em')
+
+    def __str__(self):
+        return f'{self.collection} #{self.object_id}'
+
+    class Meta:
+        verbose_name = 'Exclusão sincronizada'
+        verbose_name_plural = 'Exclusões sincronizadas'
+        indexes = [
+            models.Index(fields=['deleted_at']),
+        ]
+
+
+class IdempotencyKey(models.Model):
+    """
+    Resposta de uma criação feita com o cabeçalho Idempotency-Key (ver
+    core.idempotency). Expira depois de IDEMPOTENCY_KEY_TTL horas.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Usuário'
+    )
+    key = models.CharField(max_length=255, verbose_name='Chave')
+    # Hash do método, caminho e corpo: a mesma chave com outra requisição é recusada
+    fingerprint = models.CharField(max_length=64, verbose_name='Impressão digital')
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True, verbose_name='Status')
+    response = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder, verbose_name='Resposta')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.key
+
+    class Meta:
+        verbose_name = 'Chave de idempotência'
+        verbose_name_plural = 'Chaves de idempotência'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='unique_idempotency_key_per_user'),
+        ]
+        indexes = [
+            models.Index(fields=['created_at']),
+        ]
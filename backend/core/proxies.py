@@ -0,0 +1,35 @@
+"""
+Endereço do cliente atrás do nginx.
+
+O X-Forwarded-For só é considerado quando a conexão vem de um proxy confiável
+(TRUSTED_PROXIES): a porta do gunicorn também pode ser acessada diretamente, e
+qualquer cliente consegue enviar o cabeçalho. O cliente é a entrada mais à
+direita que não é um proxy confiável (as anteriores podem ter sido forjadas).
+"""
+import ipaddress
+
+from django.conf import settings
+
+
+def _parse(address):
+    try:
+        return ipaddress.ip_address(address.strip())
+    except ValueError:
+        return None
+
+
+def is_trusted_proxy(address):
+    return address is not None and any(address in network for network in settings.TRUSTED_PROXY_NETWORKS)
+
+
+def client_ip(request):
+    """IP do cliente (ipaddress) ou None se não for possível determiná-lo"""
+    address = _parse(request.META.get('REMOTE_ADDR', ''))
+    forwarded = request.META.get('HTTP_X_FORWARDED_FOR')
+    if not forwarded or not is_trusted_proxy(address):
+        return address
+    for entry in reversed(forwarded.split(',')):
+        address = _parse(entry)
+        if not is_trusted_proxy(address):
+            return address
+    return address
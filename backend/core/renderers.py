@@ -0,0 +1,36 @@
+"""
+Renderer JSON com orjson (opcional).
+
+Gera o mesmo JSON do JSONRenderer do DRF: Decimal vira número, datas em ISO
+8601 e datetimes em UTC terminam em Z, mas a codificação é feita em C, sem
+passar pelo ``JSONEncoder.default`` a cada valor. Sem o orjson instalado, com
+indentação (ex.: API navegável) ou com valores que o orjson não representa,
+usa o JSONRenderer padrão.
+"""
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Tipos que o orjson não conhece (Decimal, textos traduzíveis...) seguem as
+# regras do encoder do DRF
+_default = JSONEncoder().default
+_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS if orjson else 0
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=_default, option=_OPTIONS)
+        except TypeError:
+            # Inteiros acima de 64 bits, tipos desconhecidos, referências circulares
+            return super().render(data, accepted_media_type, renderer_context)
+        # Como no JSONRenderer: JSON que também é JavaScript válido
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
@@ -0,0 +1,62 @@
+"""
+Papel do usuário na requisição: administrador (staff) ou fisioterapeuta.
+
+O papel é resolvido uma vez por requisição e guardado no HttpRequest, então
+``get_queryset``, ``perform_create`` e as actions compartilham o mesmo
+resultado em vez de repetir ``request.user.physiotherapist`` em blocos try.
+"""
+from django.utils.functional import cached_property
+
+from physiotherapist.models import Physiotherapist
+
+
+class Role:
+    def __init__(self, user):
+        self.user = user
+        self.is_staff = bool(user and user.is_staff)
+
+    @cached_property
+    def physiotherapist(self):
+        if self.user is None or not self.user.is_authenticated:
+            return None
+        try:
+            return self.user.physiotherapist
+        except Physiotherapist.DoesNotExist:
+            return None
+
+    @property
+    def physiotherapist_id(self):
+        return self.physiotherapist.id if self.physiotherapist else None
+
+
+def get_role(request):
+    """Retorna o papel do usuário da requisição (HttpRequest ou Request do DRF)"""
+    http_request = getattr(request, '_request', request)
+    user = request.user
+    role = getattr(http_request, 'role', None)
+    # force_authenticate e a autenticação do DRF podem trocar o usuário da requisição
+    if role is None or role.user is not user:
+        role = http_request.role = Role(user)
+    return role
+
+
+class PhysiotherapistScopedMixin:
+    """
+    Restringe o queryset da viewset aos registros do fisioterapeuta logado.
+    Administradores veem tudo; usuários sem fisioterapeuta não veem nada.
+    """
+    # Caminho do modelo até o fisioterapeuta (ex.: 'student__physiotherapist')
+    physiotherapist_lookup = 'physiotherapist'
+
+    @property
+    def role(self):
+        return get_role(self.request)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        role = self.role
+        if role.is_staff:
+            return queryset
+        if role.physiotherapist is None:
+            return queryset.none()
+        return queryset.filter(**{self.physiotherapist_lookup: role.physiotherapist})
@@ -0,0 +1,74 @@
+"""
+Invalidação do cache dos relatórios.
+
+Toda gravação em um modelo que entra nos relatórios incrementa a versão do
+fisioterapeuta afetado (e da visão consolidada). Quando um registro muda de
+fisioterapeuta, o antigo também é invalidado.
+
+A versão só muda depois do commit: um relatório lido entre a gravação e o
+commit ainda vê os dados antigos e seria guardado sob a versão nova.
+
+Os receivers são conectados modelo a modelo: um receiver de post_delete sem
+sender impediria o delete em lote do Django em todos os outros modelos.
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+
+from modality.models import Modality
+from payment.models import ClinicCommissionPayment, Payment
+from physiotherapist.models import Physiotherapist
+from schedule.models import StudentSchedule
+from student.models import Student
+
+from .cache import ALL_SCOPE, bump_version, invalidate
+
+
+def _student_physiotherapist(student_id):
+    return Student.objects.filter(pk=student_id).values_list('physiotherapist_id', flat=True).first()
+
+
+# Como encontrar o fisioterapeuta de cada modelo a partir da instância
+PHYSIOTHERAPIST_OF = {
+    Student: lambda instance: instance.physiotherapist_id,
+    Payment: lambda instance: _student_physiotherapist(instance.student_id),
+    StudentSchedule: lambda instance: _student_physiotherapist(instance.student_id),
+    ClinicCommissionPayment: lambda instance: instance.physiotherapist_id,
+    # Nome e dados do fisioterapeuta aparecem nos alunos e relatórios
+    Physiotherapist: lambda instance: instance.pk,
+}
+
+
+def invalidate_physiotherapists(physiotherapist_ids):
+    for physiotherapist_id in set(physiotherapist_ids):
+        if physiotherapist_id is None:
+            # Alunos sem fisioterapeuta só aparecem na visão consolidada
+            bump_version(ALL_SCOPE)
+        else:
+            invalidate(physiotherapist_id)
+
+
+def remember_previous_physiotherapist(sender, instance, raw=False, **kwargs):
+    if raw or instance.pk is None:
+        return
+    previous = sender.objects.filter(pk=instance.pk).first()
+    instance._previous_physiotherapist_id = PHYSIOTHERAPIST_OF[sender](previous) if previous else None
+
+
+def invalidate_reports(sender, instance, **kwargs):
+    if sender is Modality:
+        transaction.on_commit(invalidate)
+        return
+
+    # O fisioterapeuta é lido agora; no commit o registro pode já ter sido removido
+    physiotherapist_ids = [PHYSIOTHERAPIST_OF[sender](instance)]
+    previous = getattr(instance, '_previous_physiotherapist_id', None)
+    if previous is not None:
+        physiotherapist_ids.append(previous)
+    transaction.on_commit(lambda: invalidate_physiotherapists(physiotherapist_ids))
+
+
+for model in PHYSIOTHERAPIST_OF:
+    pre_save.connect(remember_previous_physiotherapist, sender=model)
+for model in [Modality, *PHYSIOTHERAPIST_OF]:
+    post_save.connect(invalidate_reports, sender=model)
+    post_delete.connect(invalidate_reports, sender=model)
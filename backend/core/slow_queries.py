@@ -0,0 +1,69 @@
+"""
+Log de consultas lentas.
+
+Com SLOW_QUERY_MS definido, toda consulta executada durante uma requisição que
+demorar mais que o limite é registrada no logger ``core.slow_queries`` (uma
+linha JSON por consulta, no arquivo SLOW_QUERY_LOG) com a view que a executou
+e a impressão digital normalizada. ``manage.py query_report`` agrega o arquivo
+por impressão digital. Com SLOW_QUERY_MS=0 todas as consultas são registradas,
+o que mostra padrões de muitas consultas rápidas (N+1).
+"""
+import hashlib
+import json
+import logging
+import re
+import time
+
+logger = logging.getLogger('core.slow_queries')
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER = re.compile(r'%s|\?')
+_IN_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_SPACES = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """
+    Normaliza a consulta removendo os literais: ``WHERE student_id = 10`` e
+    ``WHERE student_id = %s`` viram ``WHERE student_id = ?`` e listas
+    ``IN (%s, %s, ...)`` de qualquer tamanho viram ``IN (...)``.
+    """
+    normalized = _STRING.sub('?', sql)
+    normalized = _PLACEHOLDER.sub('?', normalized)
+    normalized = _NUMBER.sub('?', normalized)
+    normalized = _IN_LIST.sub('(...)', normalized)
+    return _SPACES.sub(' ', normalized).strip()
+
+
+def fingerprint_id(normalized):
+    return hashlib.md5(normalized.encode()).hexdigest()[:12]
+
+
+class SlowQueryLogger:
+    """execute_wrapper que registra as consultas acima de ``threshold_ms``"""
+
+    def __init__(self, request, threshold_ms):
+        self.request = request
+        self.threshold = threshold_ms / 1000
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            if duration >= self.threshold:
+                self.log(sql, duration)
+
+    def log(self, sql, duration):
+        normalized = fingerprint(sql)
+        match = getattr(self.request, 'resolver_match', None)
+        logger.info(json.dumps({
+            'fingerprint': fingerprint_id(normalized),
+            'duration_ms': round(duration * 1000, 3),
+            'view': match.view_name if match else None,
+            'method': self.request.method,
+            'path': self.request.path,
+            'query': normalized,
+        }))
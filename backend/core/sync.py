@@ -0,0 +1,177 @@
+"""
+Sincronização incremental para o PWA (/api/sync/?since=<token>).
+
+A resposta traz os registros criados ou alterados depois do token, por coleção,
+e os IDs excluídos (tombstones), junto com o token da próxima chamada. Sem
+token, ou com um token mais antigo que a retenção dos tombstones
+(SYNC_TOMBSTONE_DAYS), a resposta é completa (``full: true``) e o cliente deve
+substituir o que tem guardado.
+
+Os registros vêm normalizados: pagamentos e horários trazem só o ID do aluno,
+que o cliente relaciona com a coleção de alunos. Cada exclusão vem no seu
+próprio tombstone, inclusive a dos horários removidos junto com o aluno.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from modality.models import Modality
+from modality.serializers import ModalitySerializer
+from payment.models import ClinicCommissionPayment, Payment
+from payment.serializers import ClinicCommissionPaymentSerializer, PaymentSerializer
+from schedule.models import StudentSchedule
+from schedule.serializers import StudentScheduleSerializer
+from student.models import Student
+from student.serializers import StudentSerializer
+
+from .jobs import periodic
+from .models import Tombstone
+from .signals import PHYSIOTHERAPIST_OF
+
+# Transações que gravaram antes do token podem ser confirmadas depois dele: o
+# token volta OVERLAP no tempo e o cliente recebe de novo as alterações
+# recentes (a aplicação é idempotente)
+OVERLAP = timedelta(seconds=30)
+
+
+class SyncPaymentSerializer(PaymentSerializer):
+    student_details = None
+    modality_details = None
+
+    class Meta(PaymentSerializer.Meta):
+        fields = ['id', 'student', 'modality', 'amount', 'payment_date', 'reference_month', 'created_at']
+
+
+# coleção -> (modelo, serializer, caminho até o fisioterapeuta ou None se for global)
+COLLECTIONS = {
+    'students': (Student, StudentSerializer, 'physiotherapist'),
+    'payments': (Payment, SyncPaymentSerializer, 'student__physiotherapist'),
+    'schedules': (StudentSchedule, StudentScheduleSerializer, 'student__physiotherapist'),
+    'modalities': (Modality, ModalitySerializer, None),
+    'commissions': (ClinicCommissionPayment, ClinicCommissionPaymentSerializer, 'physiotherapist'),
+}
+COLLECTION_OF = {model: name for name, (model, _, _) in COLLECTIONS.items()}
+
+# Dados relacionados que aparecem no payload da coleção
+RELATED_CHANGES = {
+    'students': ['modality__updated_at', 'physiotherapist__updated_at'],
+    'commissions': ['physiotherapist__updated_at'],
+}
+
+
+def make_token(moment):
+    return str(int(moment.timestamp() * 1_000_000))
+
+
+def parse_token(token):
+    """Instante representado pelo token, ou None se for inválido"""
+    try:
+        return datetime.fromtimestamp(int(token) / 1_000_000, tz=dt_timezone.utc)
+    except (TypeError, ValueError, OverflowError, OSError):
+        return None
+
+
+def changes(role, since):
+    """
+    Alterações visíveis para ``role`` depois de ``since`` (None para a carga
+    completa). Retorna o payload da resposta, sem o token.
+    """
+    now = timezone.now()
+    full = since is None or since < now - timedelta(days=settings.SYNC_TOMBSTONE_DAYS)
+    physiotherapist = None if role.is_staff else role.physiotherapist
+
+    changed = {}
+    for name, (model, serializer_class, lookup) in COLLECTIONS.items():
+        queryset = model.objects.all()
+        if lookup is not None and not role.is_staff:
+            queryset = queryset.filter(**{lookup: physiotherapist}) if physiotherapist else queryset.none()
+        # O status de pagamento dos alunos depende da data: em outro dia, todos mudam
+        if not full and not (name == 'students' and timezone.localdate(since) != timezone.localdate(now)):
+            condition = Q(updated_at__gt=since)
+            for related in RELATED_CHANGES.get(name, []):
+                condition |= Q(**{f'{related}__gt': since})
+            queryset = queryset.filter(condition)
+        changed[name] = serializer_class(queryset, many=True).data
+
+    deleted = {name: [] for name in COLLECTIONS}
+    if not full:
+        tombstones = Tombstone.objects.filter(deleted_at__gt=since)
+        if not role.is_staff:
+            shared = [name for name, (_, _, lookup) in COLLECTIONS.items() if lookup is None]
+            visible = Q(collection__in=shared)
+            # Sem fisioterapeuta, physiotherapist_id=None pegaria exclusões de registros sem dono
+            if physiotherapist is not None:
+                visible |= Q(physiotherapist_id=physiotherapist.pk)
+            tombstones = tombstones.filter(visible)
+        for collection, object_id in tombstones.values_list('collection', 'object_id').distinct():
+            deleted[collection].append(object_id)
+        # Registro que mudou de fisioterapeuta: para quem ainda o vê, é uma alteração
+        for name, records in changed.items():
+            present = {record['id'] for record in records}
+            deleted[name] = sorted(set(deleted[name]) - present)
+
+    return {'full': full, 'changes': changed, 'deleted': deleted}
+
+
+def sync_payload(role, token=None):
+    since = parse_token(token) if token else None
+    # O próximo token é calculado antes das consultas
+    next_token = make_token(timezone.now() - OVERLAP)
+    return {'token': next_token, **changes(role, since)}
+
+
+def record_reassignment(sender, instance, created, raw=False, **kwargs):
+    if raw or created:
+        return
+    previous = getattr(instance, '_previous_physiotherapist_id', None)
+    if previous is None or previous == PHYSIOTHERAPIST_OF[sender](instance):
+        return
+    # Para o fisioterapeuta anterior o registro deixou de existir
+    Tombstone.objects.create(collection=COLLECTION_OF[sender], object_id=instance.pk, physiotherapist_id=previous)
+    if sender is Student:
+        # Pagamentos e horários acompanham o aluno: saem da cópia do fisioterapeuta
+        # anterior e o novo precisa recebê-los
+        now = timezone.now()
+        for model in (Payment, StudentSchedule):
+            related = model.objects.filter(student=instance)
+            Tombstone.objects.bulk_create([
+                Tombstone(collection=COLLECTION_OF[model], object_id=object_id, physiotherapist_id=previous)
+                for object_id in related.values_list('pk', flat=True)
+            ])
+            related.update(updated_at=now)
+
+
+@receiver(post_save, sender=Payment)
+@receiver(post_delete, sender=Payment)
+@receiver(post_save, sender=StudentSchedule)
+@receiver(post_delete, sender=StudentSchedule)
+def touch_student(sender, instance, raw=False, **kwargs):
+    # Horários e status de pagamento fazem parte do payload do aluno
+    if not raw:
+        Student.objects.filter(pk=instance.student_id).update(updated_at=timezone.now())
+
+
+def record_deletion(sender, instance, **kwargs):
+    physiotherapist_of = PHYSIOTHERAPIST_OF.get(sender)
+    Tombstone.objects.create(
+        collection=COLLECTION_OF[sender],
+        object_id=instance.pk,
+        physiotherapist_id=physiotherapist_of(instance) if physiotherapist_of else None,
+    )
+
+
+# Conectados modelo a modelo para não desativar o delete em lote dos demais (ver core.signals)
+for model in COLLECTION_OF:
+    if model in PHYSIOTHERAPIST_OF:
+        post_save.connect(record_reassignment, sender=model)
+    post_delete.connect(record_deletion, sender=model)
+
+
+@periodic('purge_tombstones', 'SYNC_PURGE_INTERVAL')
+def purge_tombstones():
+    """Tombstones além da retenção não servem mais: tokens antigos recebem a carga completa"""
+    Tombstone.objects.filter(deleted_at__lt=timezone.now() - timedelta(days=settings.SYNC_TOMBSTONE_DAYS)).delete()
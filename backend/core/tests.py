@@ -0,0 +1,818 @@
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+import gzip
+import json
+import unittest
+import os
+import tempfile
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.contrib.sessions.models import Session
+from django.test import Client, TestCase, override_settings
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from modality.models import Modality
+from payment.models import ClinicCommissionPayment, Payment
+from schedule.models import StudentSchedule
+from physiotherapist.models import Physiotherapist
+from student.models import Student
+
+from . import jobs, metrics
+from .cache import data_version, get_or_set_report, invalidate, report_key
+from .middleware import brotli
+from .models import ProfileReport, Tombstone
+from .renderers import FastJSONRenderer, orjson
+from .slow_queries import fingerprint
+
+
+class ReportCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return {'calls': self.calls}
+
+    def test_cached_until_scope_is_invalidated(self):
+        self.assertEqual(get_or_set_report('summary', self.compute, 1, 2024, 3), {'calls': 1})
+        self.assertEqual(get_or_set_report('summary', self.compute, 1, 2024, 3), {'calls': 1})
+
+        invalidate(1)
+        self.assertEqual(get_or_set_report('summary', self.compute, 1, 2024, 3), {'calls': 2})
+
+    def test_physiotherapist_change_invalidates_consolidated_view_only(self):
+        other = report_key('summary', 2, 2024, 3)
+        consolidated = report_key('summary', None, 2024, 3)
+
+        invalidate(1)
+        self.assertEqual(report_key('summary', 2, 2024, 3), other)
+        self.assertNotEqual(report_key('summary', None, 2024, 3), consolidated)
+
+    def test_clinic_change_invalidates_every_scope(self):
+        keys = [report_key('summary', physio, 2024, 3) for physio in (None, 1, 2)]
+        invalidate()
+        self.assertEqual(
+            [key != report_key('summary', physio, 2024, 3) for key, physio in zip(keys, (None, 1, 2))],
+            [True, True, True]
+        )
+
+
+class ReportInvalidationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='physio', password='physiopass123')
+        self.physiotherapist = Physiotherapist.objects.create(
+            user=self.user, crefito='12345', phone='11999999999', specialization='General'
+        )
+        self.modality = Modality.objects.create(name='Pilates', price=Decimal('200.00'))
+        self.student = Student.objects.create(
+            name='Aluno', physiotherapist=self.physiotherapist, modality=self.modality, payment_type='PRE'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.month = date.today().strftime('%Y-%m')
+
+    def get_summary(self):
+        return self.client.get('/api/payments/summary/', {'month_year': self.month}).data
+
+    def create_payment(self):
+        return Payment.objects.create(
+            student=self.student, modality=self.modality, amount=Decimal('200.00'),
+            payment_date=date.today(), reference_month=date.today().replace(day=1)
+        )
+
+    def test_summary_is_served_from_cache(self):
+        self.get_summary()
+        with self.assertNumQueries(0):
+            self.get_summary()
+
+    def test_payment_invalidates_summary(self):
+        self.assertEqual(self.get_summary()['paidStudents'], 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_payment()
+        self.assertEqual(self.get_summary()['paidStudents'], 1)
+
+    def test_version_changes_only_after_commit(self):
+        before = data_version(self.physiotherapist.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_payment()
+            # Uma leitura antes do commit ainda guardaria o relatório na versão antiga
+            self.assertEqual(data_version(self.physiotherapist.id), before)
+        self.assertNotEqual(data_version(self.physiotherapist.id), before)
+
+    def test_modality_change_invalidates_summary(self):
+        self.assertEqual(self.get_summary()['totalExpectedValue'], Decimal('200.00'))
+
+        self.modality.price = Decimal('250.00')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.modality.save()
+        self.assertEqual(self.get_summary()['totalExpectedValue'], Decimal('250.00'))
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='physio', password='physiopass123')
+        self.physiotherapist = Physiotherapist.objects.create(
+            user=self.user, crefito='12345', phone='11999999999', specialization='General'
+        )
+        self.modality = Modality.objects.create(name='Pilates', price=Decimal('200.00'))
+        self.student = Student.objects.create(
+            name='Aluno', physiotherapist=self.physiotherapist, modality=self.modality, payment_type='PRE'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def revalidate(self, url):
+        """Primeira requisição e revalidação com a ETag recebida"""
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        self.assertIn('no-cache', first['Cache-Control'])
+        return first['ETag'], self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+
+    def test_unchanged_list_is_not_modified(self):
+        for url in ['/api/modalities/', '/api/students/', '/api/payments/dashboard_summary/']:
+            etag, response = self.revalidate(url)
+            self.assertTrue(etag.startswith('W/"'))
+            self.assertEqual(response.status_code, 304, url)
+            self.assertEqual(response.content, b'')
+            self.assertEqual(response['ETag'], etag)
+
+    def test_not_modified_skips_serialization(self):
+        etag, _ = self.revalidate('/api/students/')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get('/api/students/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # Só a impressão digital; nada de alunos, horários ou pagamentos
+        self.assertEqual(len(queries), 1)
+
+    def test_changes_produce_new_etag(self):
+        students_etag, _ = self.revalidate('/api/students/')
+        dashboard_etag, _ = self.revalidate('/api/payments/dashboard_summary/')
+        with self.captureOnCommitCallbacks(execute=True):
+            Payment.objects.create(
+                student=self.student, modality=self.modality, amount=Decimal('200.00'),
+                payment_date=date.today(), reference_month=date.today().replace(day=1)
+            )
+        for url, etag in [('/api/students/', students_etag), ('/api/payments/dashboard_summary/', dashboard_etag)]:
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200, url)
+
+        modalities_etag, _ = self.revalidate('/api/modalities/')
+        Modality.objects.create(name='RPG', price=Decimal('150.00'))
+        self.assertEqual(self.client.get('/api/modalities/', HTTP_IF_NONE_MATCH=modalities_etag).status_code, 200)
+
+    def test_list_etag_comes_from_database(self):
+        # Outro worker com cache próprio: a versão do cache não muda, o banco sim
+        etag, _ = self.revalidate('/api/students/')
+        Modality.objects.filter(pk=self.modality.pk).update(updated_at=timezone.now() + timedelta(seconds=1))
+        self.assertEqual(self.client.get('/api/students/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_etag_depends_on_user(self):
+        etag, _ = self.revalidate('/api/students/')
+        admin = User.objects.create_superuser(username='admin', password='adminpass123')
+        self.client.force_authenticate(user=admin)
+        self.assertEqual(self.client.get('/api/students/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_physiotherapist_list(self):
+        admin = User.objects.create_superuser(username='admin', password='adminpass123')
+        self.client.force_authenticate(user=admin)
+        etag, response = self.revalidate('/api/physiotherapists/')
+        self.assertEqual(response.status_code, 304)
+        self.assertIn('Last-Modified', response)
+
+        self.physiotherapist.phone = '11888888888'
+        self.physiotherapist.save()
+        self.assertEqual(self.client.get('/api/physiotherapists/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+@mock.patch('core.sync.OVERLAP', timedelta(0))
+class SyncTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='physio', password='physiopass123')
+        self.physiotherapist = Physiotherapist.objects.create(
+            user=self.user, crefito='12345', phone='11999999999', specialization='General'
+        )
+        other_user = User.objects.create_user(username='other', password='otherpass123')
+        self.other = Physiotherapist.objects.create(
+            user=other_user, crefito='54321', phone='11999999999', specialization='General'
+        )
+        self.modality = Modality.objects.create(name='Pilates', price=Decimal('200.00'))
+        self.student = Student.objects.create(
+            name='Aluno', physiotherapist=self.physiotherapist, modality=self.modality, payment_type='PRE'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def sync(self, token=None, user=None):
+        if user is not None:
+            self.client.force_authenticate(user=user)
+        response = self.client.get('/api/sync/', {'since': token} if token else {})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def create_payment(self):
+        return Payment.objects.create(
+            student=self.student, modality=self.modality, amount=Decimal('200.00'),
+            payment_date=date.today(), reference_month=date.today().replace(day=1)
+        )
+
+    def test_full_sync_without_token(self):
+        data = self.sync()
+        self.assertTrue(data['full'])
+        self.assertEqual([student['id'] for student in data['changes']['students']], [self.student.id])
+        self.assertEqual(len(data['changes']['modalities']), 1)
+
+    def test_delta_contains_only_changes(self):
+        token = self.sync()['token']
+        payment = self.create_payment()
+
+        data = self.sync(token)
+        self.assertFalse(data['full'])
+        self.assertEqual([item['id'] for item in data['changes']['payments']], [payment.id])
+        # O status de pagamento do aluno mudou
+        self.assertEqual([item['id'] for item in data['changes']['students']], [self.student.id])
+        self.assertEqual(data['changes']['modalities'], [])
+        self.assertEqual(data['changes']['schedules'], [])
+
+        data = self.sync(data['token'])
+        self.assertEqual(data['changes']['payments'], [])
+
+    def test_deletions_are_tombstones(self):
+        payment = self.create_payment()
+        schedule = StudentSchedule.objects.create(student=self.student, weekday=0, hour=8)
+        token = self.sync()['token']
+
+        ids = payment.id, self.student.id, schedule.id
+        payment.delete()
+        self.student.delete()
+        data = self.sync(token)
+        self.assertEqual((data['deleted']['payments'], data['deleted']['students'], data['deleted']['schedules']),
+                         tuple([object_id] for object_id in ids))
+        # Exclusões de outro fisioterapeuta não aparecem
+        self.assertEqual(self.sync(token, user=self.other.user)['deleted']['students'], [])
+
+    def test_user_without_physiotherapist_gets_no_deletions(self):
+        orphan = Student.objects.create(name='Sem fisioterapeuta', modality=self.modality)
+        user = User.objects.create_user(username='receptionist', password='receptionpass123')
+        token = self.sync(user=user)['token']
+
+        orphan.delete()
+        data = self.sync(token, user=user)
+        self.assertEqual(data['deleted'], {name: [] for name in data['deleted']})
+
+    def test_reassigned_student(self):
+        payment = self.create_payment()
+        schedule = StudentSchedule.objects.create(student=self.student, weekday=0, hour=8)
+        physio_token = self.sync()['token']
+        other_token = self.sync(user=self.other.user)['token']
+        admin = User.objects.create_superuser(username='admin', password='adminpass123')
+        admin_token = self.sync(user=admin)['token']
+
+        self.student.physiotherapist = self.other
+        self.student.save()
+
+        data = self.sync(physio_token, user=self.user)
+        self.assertEqual(data['deleted']['students'], [self.student.id])
+        # Pagamentos e horários do aluno também saem da cópia do fisioterapeuta anterior
+        self.assertEqual(data['deleted']['payments'], [payment.id])
+        self.assertEqual(data['deleted']['schedules'], [schedule.id])
+        data = self.sync(other_token, user=self.other.user)
+        self.assertEqual([item['id'] for item in data['changes']['students']], [self.student.id])
+        self.assertEqual([item['id'] for item in data['changes']['payments']], [payment.id])
+        self.assertEqual([item['id'] for item in data['changes']['schedules']], [schedule.id])
+        self.assertEqual(data['deleted'], {name: [] for name in data['deleted']})
+        # Para o administrador é só uma alteração
+        data = self.sync(admin_token, user=admin)
+        self.assertEqual(data['deleted'], {name: [] for name in data['deleted']})
+        self.assertEqual([item['id'] for item in data['changes']['students']], [self.student.id])
+
+    def test_invalid_and_expired_tokens(self):
+        self.assertEqual(self.client.get('/api/sync/', {'since': 'abc'}).status_code, 400)
+        expired = str(int((timezone.now() - timedelta(days=60)).timestamp() * 1_000_000))
+        self.assertTrue(self.sync(expired)['full'])
+
+    def test_purge_old_tombstones(self):
+        Tombstone.objects.create(collection='students', object_id=1, physiotherapist_id=None)
+        Tombstone.objects.update(deleted_at=timezone.now() - timedelta(days=60))
+        recent = Tombstone.objects.create(collection='students', object_id=2, physiotherapist_id=None)
+        jobs.JOBS['purge_tombstones'][1]()
+        self.assertEqual(list(Tombstone.objects.all()), [recent])
+
+
+class BatchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='physio', password='physiopass123')
+        self.physiotherapist = Physiotherapist.objects.create(
+            user=self.user, crefito='12345', phone='11999999999', specialization='General'
+        )
+        other_user = User.objects.create_user(username='other', password='otherpass123')
+        other = Physiotherapist.objects.create(
+            user=other_user, crefito='54321', phone='11999999999', specialization='General'
+        )
+        self.modality = Modality.objects.create(name='Pilates', price=Decimal('200.00'))
+        self.student = Student.objects.create(
+            name='Aluno', physiotherapist=self.physiotherapist, modality=self.modality, payment_type='PRE'
+        )
+        self.other_student = Student.objects.create(
+            name='Outro', physiotherapist=other, modality=self.modality, payment_type='PRE'
+        )
+        self.client = APIClient()
+        self.client.force_login(self.user)
+
+    def batch(self, paths):
+        return self.client.post('/api/batch/', {'requests': paths}, format='json')
+
+    def test_matches_individual_requests(self):
+        paths = ['/api/payments/dashboard_summary/', '/api/students/?active=true', '/api/modalities/']
+        response = self.batch(paths)
+
+        self.assertEqual(response.status_code, 200)
+        items = json.loads(response.content)['responses']
+        self.assertEqual([item['path'] for item in items], paths)
+        for path, item in zip(paths, items):
+            direct = self.client.get(path)
+            self.assertEqual(item['status'], 200)
+            self.assertEqual(item['data'], json.loads(direct.content))
+        # Escopo do fisioterapeuta preservado
+        self.assertEqual([student['id'] for student in items[1]['data']], [self.student.id])
+
+    def test_errors_are_reported_per_item(self):
+        response = self.batch([
+            f'/api/students/{self.other_student.id}/',
+            '/api/nao-existe/',
+            'https://example.com/api/modalities/',
+            '/api/batch/',
+            '/api/modalities/',
+        ])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['status'] for item in response.data['responses']], [404, 404, 400, 400, 200])
+        self.assertIn('detail', response.data['responses'][0]['data'])
+
+    def test_requires_authentication(self):
+        self.assertEqual(
+            APIClient().post('/api/batch/', {'requests': ['/api/modalities/']}, format='json').status_code, 403
+        )
+
+    @override_settings(BATCH_MAX_REQUESTS=2)
+    def test_validates_request_list(self):
+        self.assertEqual(self.batch(['/api/modalities/'] * 3).status_code, 400)
+        self.assertEqual(self.batch([]).status_code, 400)
+        self.assertEqual(self.client.post('/api/batch/', {'requests': '/api/modalities/'}, format='json').status_code, 400)
+
+    def test_fewer_queries_than_separate_requests(self):
+        paths = ['/api/payments/dashboard_summary/', '/api/students/', '/api/modalities/']
+        with CaptureQueriesContext(connection) as separate:
+            for path in paths:
+                self.client.get(path)
+        cache.clear()
+        with CaptureQueriesContext(connection) as batched:
+            self.batch(paths)
+        self.assertLess(len(batched), len(separate))
+
+
+class RequestTimingTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='admin', password='adminpass123', is_staff=True)
+        Modality.objects.create(name='Pilates', price=Decimal('200.00'))
+
+    def get(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        return client.get('/api/modalities/')
+
+    @override_settings(REQUEST_TIMING=True)
+    def test_server_timing_header_and_log(self):
+        with self.assertLogs('core.timing', level='INFO') as logs:
+            response = self.get()
+
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries", render;dur=[\d.]+, app;dur=[\d.]+, total;dur=[\d.]+$')
+        self.assertIn('"path": "/api/modalities/"', logs.output[0])
+        self.assertIn('"status": 200', logs.output[0])
+
+    @override_settings(REQUEST_TIMING=False)
+    def test_disabled(self):
+        self.assertNotIn('Server-Timing', self.get())
+
+
+class RoleTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='physiotherapist', password='physiopass123')
+        self.physiotherapist = Physiotherapist.objects.create(
+            user=self.user, crefito='12345', phone='11999999999', specialization='General'
+        )
+        modality = Modality.objects.create(name='Pilates', price=Decimal('200.00'))
+        Student.objects.create(name='Aluno', physiotherapist=self.physiotherapist, modality=modality)
+        Student.objects.create(name='Outro', modality=modality)
+
+    def test_physiotherapist_loaded_with_session_user(self):
+        client = APIClient()
+        client.login(username='physiotherapist', password='physiopass123')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get('/api/students/')
+
+        self.assertEqual([student['name'] for student in response.json()], ['Aluno'])
+        # O fisioterapeuta vem no JOIN da consulta do usuário, sem consulta própria
+        self.assertFalse([
+            query for query in queries.captured_queries
+            if query['sql'].startswith('SELECT') and 'FROM "physiotherapist_physiotherapist"' in query['sql']
+            and '"user_id" =' in query['sql']
+        ])
+
+    def test_user_without_physiotherapist_sees_nothing(self):
+        User.objects.create_user(username='secretaria', password='secretaria123')
+        client = APIClient()
+        client.login(username='secretaria', password='secretaria123')
+
+        self.assertEqual(client.get('/api/students/').json(), [])
+        self.assertEqual(client.get('/api/payments/commission/').json(), [])
+
+
+class SessionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        User.objects.create_user(username='physiotherapist', password='physiopass123')
+
+    def session_queries(self):
+        """Consultas à tabela de sessões em uma requisição autenticada já renovada"""
+        client = Client()
+        client.login(username='physiotherapist', password='physiopass123')
+        client.get('/api/modalities/')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(client.get('/api/modalities/').status_code, 200)
+        return [query['sql'].split()[0] for query in queries.captured_queries if 'django_session' in query['sql']]
+
+    def test_db_hits_per_request(self):
+        with override_settings(SESSION_ENGINE='django.contrib.sessions.backends.db'):
+            # Leitura a cada requisição, mas sem gravação
+            self.assertEqual(self.session_queries(), ['SELECT'])
+        with override_settings(SESSION_ENGINE='django.contrib.sessions.backends.cached_db'):
+            self.assertEqual(self.session_queries(), [])
+        with override_settings(SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies'):
+            self.assertEqual(self.session_queries(), [])
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.db', SESSION_TOUCH_INTERVAL=3600)
+    def test_touch_renews_session_once_per_interval(self):
+        client = Client()
+        client.login(username='physiotherapist', password='physiopass123')
+        client.get('/api/modalities/')
+        session = Session.objects.get()
+        first_expiry = session.expire_date
+
+        client.get('/api/modalities/')
+        self.assertEqual(Session.objects.get().expire_date, first_expiry)
+
+        # Depois do intervalo, a próxima requisição grava a sessão com nova expiração
+        store = client.session
+        store['_touched'] -= 3600
+        store.save()
+        client.get('/api/modalities/')
+        self.assertGreater(Session.objects.get().expire_date, first_expiry)
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.db', SESSION_PURGE_INTERVAL=3600)
+    def test_periodic_purge_of_expired_sessions(self):
+        Session.objects.create(session_key='expired', session_data='', expire_date=timezone.now() - timezone.timedelta(days=1))
+        jobs._next_run.clear()
+
+        jobs.run_due_jobs()
+        self.assertFalse(Session.objects.exists())
+
+        Session.objects.create(session_key='expired', session_data='', expire_date=timezone.now() - timezone.timedelta(days=1))
+        jobs.run_due_jobs()
+        self.assertTrue(Session.objects.exists())
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.metrics_dir = Path(directory.name)
+        overrides = override_settings(METRICS_ENABLED=True, METRICS_DIR=directory.name)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.addCleanup(setattr, metrics, 'registry', metrics.registry)
+        metrics.registry = metrics.Registry()
+        # Sem a thread de gravação periódica: /metrics grava o processo atual ao responder
+        metrics.registry._flusher_pid = os.getpid()
+
+        self.user = User.objects.create_user(username='physiotherapist', password='physiopass123')
+        Modality.objects.create(name='Pilates', price=Decimal('200.00'))
+
+    def test_exposes_request_histograms(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        client.get('/api/modalities/')
+        client.get('/api/modalities/')
+
+        body = APIClient().get('/metrics').content.decode()
+        self.assertIn('http_requests_total{method="GET",status="200",view="modality-list"} 2', body)
+        self.assertIn('http_request_duration_seconds_count{view="modality-list"} 2', body)
+        self.assertIn('http_request_db_queries_bucket{view="modality-list",le="+Inf"} 2', body)
+        self.assertNotIn('view="metrics"', body)
+
+    def test_sums_other_workers(self):
+        metrics.record_request('modality-list', 'GET', 200, 0.2, 3)
+        metrics.registry.flush()
+        # Outro worker: mesmo diretório, outro arquivo
+        (self.metrics_dir / 'worker-0.json').write_text(json.dumps(metrics.registry.snapshot()))
+
+        body = APIClient().get('/metrics').content.decode()
+        self.assertIn('http_requests_total{method="GET",status="200",view="modality-list"} 2', body)
+        self.assertIn('http_request_duration_seconds_bucket{view="modality-list",le="0.25"} 2', body)
+
+    def test_exited_workers_are_archived(self):
+        metrics.record_request('modality-list', 'GET', 200, 0.2, 3)
+        snapshot = metrics.registry.snapshot()
+        for pid in range(101, 106):
+            worker = dict(snapshot, process=f'{pid}-1')
+            (self.metrics_dir / f'worker-{pid}.json').write_text(json.dumps(worker))
+        for pid in range(101, 105):
+            metrics.archive_worker(pid)
+        # Pid reutilizado por um worker novo: conta à parte do arquivado
+        (self.metrics_dir / 'worker-101.json').write_text(json.dumps(dict(snapshot, process='101-2')))
+
+        self.assertEqual(
+            sorted(path.name for path in self.metrics_dir.glob('*.json')),
+            ['archived.json', 'worker-101.json', 'worker-105.json'],
+        )
+        body = APIClient().get('/metrics').content.decode()
+        # 4 arquivados, 2 workers vivos e o processo atual
+        self.assertIn('http_requests_total{method="GET",status="200",view="modality-list"} 7', body)
+        self.assertIn('http_request_db_queries_bucket{view="modality-list",le="5"} 7', body)
+
+    def test_report_cache_hit_ratio(self):
+        cache.clear()
+        get_or_set_report('summary', dict, 1, 2024, 3)
+        get_or_set_report('summary', dict, 1, 2024, 3)
+        body = metrics.render()
+        self.assertIn('report_cache_requests_total{report="summary",result="hit"} 1', body)
+        self.assertIn('report_cache_requests_total{report="summary",result="miss"} 1', body)
+
+    def test_restricted_to_staff_or_internal_networks(self):
+        client = APIClient(REMOTE_ADDR='203.0.113.10')
+        self.assertEqual(client.get('/metrics').status_code, 403)
+
+        client.force_login(User.objects.create_user(username='admin', password='adminpass123', is_staff=True))
+        self.assertEqual(client.get('/metrics').status_code, 200)
+
+    def test_forwarded_for_only_from_trusted_proxy(self):
+        # Conexão direta forjando o cabeçalho com um endereço interno
+        client = APIClient(REMOTE_ADDR='203.0.113.10', HTTP_X_FORWARDED_FOR='172.16.0.1')
+        self.assertEqual(client.get('/metrics').status_code, 403)
+
+        # Via nginx: o cliente é a entrada mais à direita que não é proxy
+        client = APIClient(REMOTE_ADDR='127.0.0.1', HTTP_X_FORWARDED_FOR='10.0.0.5, 203.0.113.10')
+        self.assertEqual(client.get('/metrics').status_code, 403)
+        client = APIClient(REMOTE_ADDR='127.0.0.1', HTTP_X_FORWARDED_FOR='203.0.113.10, 10.0.0.5')
+        self.assertEqual(client.get('/metrics').status_code, 200)
+
+
+class SlowQueryTests(TestCase):
+    def test_fingerprint_strips_literals(self):
+        self.assertEqual(
+            fingerprint('SELECT * FROM "payment_payment" WHERE "student_id" = %s AND "amount" > 10.5 LIMIT 1'),
+            'SELECT * FROM "payment_payment" WHERE "student_id" = ? AND "amount" > ? LIMIT ?'
+        )
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE name = 'Ana' AND id IN (%s, %s,\n %s)"),
+            fingerprint("SELECT * FROM t WHERE name = 'Bia' AND id IN (%s)"),
+        )
+
+    @override_settings(SLOW_QUERY_MS=0)
+    def test_logs_queries_with_view(self):
+        user = User.objects.create_user(username='admin', password='adminpass123', is_staff=True)
+        client = APIClient()
+        client.force_authenticate(user=user)
+        with self.assertLogs('core.slow_queries', level='INFO') as logs:
+            client.get('/api/modalities/')
+
+        entries = [json.loads(line.split(':', 2)[2]) for line in logs.output]
+        self.assertIn('modality-list', {entry['view'] for entry in entries})
+        self.assertTrue(all('%s' not in entry['query'] for entry in entries))
+
+    def test_query_report_aggregates_by_fingerprint(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        log = Path(directory.name) / 'slow.log'
+        entries = [
+            ('a1', 1.0, 'payments-summary', 'SELECT ... WHERE student_id = ?'),
+            ('a1', 3.0, 'payments-summary', 'SELECT ... WHERE student_id = ?'),
+            ('b2', 2.5, 'students-list', 'SELECT ... FROM student'),
+        ]
+        log.write_text(''.join(
+            json.dumps({'fingerprint': key, 'duration_ms': duration, 'view': view, 'query': query}) + '\n'
+            for key, duration, view, query in entries
+        ))
+
+        output = StringIO()
+        call_command('query_report', log=str(log), stdout=output)
+        lines = output.getvalue().splitlines()
+        self.assertEqual(lines[0], '3 consultas, 2 padrões, 6.5ms no total')
+        self.assertTrue(lines[2].startswith('a1'))
+        self.assertIn('payments-summary (2)', lines[2])
+
+
+class ProfilerTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='adminpass123', is_staff=True)
+        self.user = User.objects.create_user(username='physiotherapist', password='physiopass123')
+        Modality.objects.create(name='Pilates', price=Decimal('200.00'))
+        self.client = APIClient()
+
+    def test_staff_receives_profile_report(self):
+        self.client.force_login(self.admin)
+        response = self.client.get('/api/modalities/', {'_profile': '1'})
+
+        self.assertEqual(response['Content-Type'], 'text/plain; charset=utf-8')
+        report = response.content.decode()
+        self.assertIn('GET /api/modalities/?_profile=1 -> 200', report)
+        self.assertIn('tempo acumulado', report)
+        self.assertIn('modality_modality', report)
+
+        stored = ProfileReport.objects.get()
+        self.assertEqual(response['X-Profile-Id'], str(stored.pk))
+        self.assertEqual(stored.user, self.admin)
+
+    def test_header_activates_profiler(self):
+        self.client.force_login(self.admin)
+        response = self.client.get('/api/modalities/', HTTP_X_PROFILE='1')
+        self.assertIn('=== SQL', response.content.decode())
+
+    def test_ignored_for_non_staff(self):
+        self.client.force_login(self.user)
+        response = self.client.get('/api/modalities/', {'_profile': '1'})
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertFalse(ProfileReport.objects.exists())
+
+    @override_settings(PROFILER_HISTORY=2)
+    def test_history_is_bounded(self):
+        self.client.force_login(self.admin)
+        for _ in range(3):
+            self.client.get('/api/modalities/', {'_profile': '1'})
+        self.assertEqual(ProfileReport.objects.count(), 2)
+
+
+class SeedLoadTests(TestCase):
+    def seed(self, **options):
+        call_command('seed_load', physiotherapists=2, students=20, years=1, batch_size=50, stdout=StringIO(), **options)
+
+    def test_generates_clinic(self):
+        self.seed()
+
+        self.assertEqual(Physiotherapist.objects.count(), 2)
+        self.assertEqual(Student.objects.count(), 20)
+        self.assertTrue(Payment.objects.exists())
+        self.assertFalse(Payment.objects.filter(payment_date__gt=date.today()).exists())
+        self.assertLess(Student.objects.filter(registration_date__date=date.today()).count(), 20)
+        commission = ClinicCommissionPayment.objects.filter(status='approved').first()
+        self.assertTrue(commission.payments.exists())
+
+    def test_clear_replaces_previous_data(self):
+        self.seed()
+        with self.assertRaises(CommandError):
+            self.seed()
+
+        payments = Payment.objects.count()
+        self.seed(clear=True)
+        self.assertEqual(Student.objects.count(), 20)
+        self.assertEqual(Payment.objects.count(), payments)
+
+
+class FastJSONRendererTests(TestCase):
+    data = {
+        'total': Decimal('1234.50'),
+        'month': date(2024, 3, 1),
+        'updated': datetime(2024, 3, 1, 12, 30, 15, 123456, tzinfo=dt_timezone.utc),
+        'label': gettext_lazy('Pagamento'),
+        'students': [{'id': 1, 'name': 'Aluno \u2028 José'}],
+        1: (None, True, 0.1),
+    }
+
+    @unittest.skipIf(orjson is None, 'orjson não instalado')
+    def test_same_output_as_json_renderer(self):
+        self.assertEqual(FastJSONRenderer().render(self.data), JSONRenderer().render(self.data))
+
+    def test_fallback_to_json_renderer(self):
+        renderer = FastJSONRenderer()
+        # Indentação (API navegável) e inteiros acima de 64 bits
+        self.assertEqual(renderer.render(self.data, 'application/json; indent=4'),
+                         JSONRenderer().render(self.data, 'application/json; indent=4'))
+        self.assertEqual(renderer.render({'big': 2 ** 70}), b'{"big":1180591620717411303424}')
+        with mock.patch('core.renderers.orjson', None):
+            self.assertEqual(renderer.render(self.data), JSONRenderer().render(self.data))
+
+
+@override_settings(COMPRESSION_ENABLED=True, COMPRESSION_MIN_SIZE=1024)
+class CompressionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_superuser(username='admin', password='adminpass123')
+        modality = Modality.objects.create(name='Pilates', price=Decimal('200.00'))
+        Student.objects.bulk_create([Student(name=f'Aluno {index}', modality=modality) for index in range(30)])
+        self.client = APIClient()
+        self.client.force_authenticate(user=user)
+
+    def test_gzip_above_threshold(self):
+        plain = self.client.get('/api/students/')
+        self.assertNotIn('Content-Encoding', plain)
+
+        response = self.client.get('/api/students/', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+        self.assertLess(len(response.content), len(plain.content))
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+
+    def test_gzip_length_is_randomized(self):
+        lengths = {
+            len(self.client.get('/api/students/', HTTP_ACCEPT_ENCODING='gzip').content) for _ in range(10)
+        }
+        self.assertGreater(len(lengths), 1)
+
+    def test_small_responses_and_refused_encodings(self):
+        response = self.client.get('/api/modalities/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertNotIn('Content-Encoding', response)
+        response = self.client.get('/api/students/', HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertNotIn('Content-Encoding', response)
+
+    @unittest.skipIf(brotli is None, 'brotli não instalado')
+    def test_brotli_preferred(self):
+        plain = self.client.get('/api/students/')
+        response = self.client.get('/api/students/', HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(brotli.decompress(response.content), plain.content)
+
+    @unittest.skipIf(brotli is None, 'brotli não instalado')
+    def test_brotli_length_is_randomized(self):
+        responses = [self.client.get('/api/students/', HTTP_ACCEPT_ENCODING='br') for _ in range(10)]
+        self.assertGreater(len({len(response.content) for response in responses}), 1)
+        self.assertEqual({brotli.decompress(response.content) for response in responses},
+                         {self.client.get('/api/students/').content})
+
+    def test_bench_json_command(self):
+        Physiotherapist.objects.create(
+            user=User.objects.create_user(username='physio', password='physiopass123'),
+            crefito='12345', phone='11999999999', specialization='General'
+        )
+        output = StringIO()
+        call_command('bench_json', iterations=2, stdout=output)
+        self.assertIn('FastJSONRenderer', output.getvalue())
+        self.assertIn('gzip', output.getvalue())
+
+
+class BenchApiTests(TestCase):
+    def setUp(self):
+        User.objects.create_superuser(username='admin', password='adminpass123')
+        call_command('seed_load', physiotherapists=2, students=20, years=1, stdout=StringIO())
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.baseline = Path(directory.name) / 'baseline.json'
+        # As tarefas periódicas (core.jobs) rodariam ao fim da primeira requisição medida
+        patcher = mock.patch.dict(jobs._next_run, {name: float('inf') for name in jobs.JOBS})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def bench(self, **options):
+        call_command('bench_api', iterations=2, warmup=0, baseline=str(self.baseline), stdout=StringIO(), **options)
+
+    def test_fails_when_query_budget_is_exceeded(self):
+        self.bench(update_baseline=True)
+        baseline = json.loads(self.baseline.read_text())
+        self.assertEqual(len(baseline['endpoints']), 14)
+        self.bench(latency_tolerance=100)
+
+        baseline['endpoints']['students[admin]']['queries'] -= 1
+        self.baseline.write_text(json.dumps(baseline))
+        with self.assertRaisesMessage(CommandError, 'students[admin]'):
+            self.bench(latency_tolerance=100)
+
+    def test_latency_is_only_checked_when_recorded(self):
+        self.bench(update_baseline=True)
+        baseline = json.loads(self.baseline.read_text())
+        self.assertEqual(set(baseline['endpoints']['students[admin]']), {'queries', 'bytes'})
+
+        self.bench(update_baseline=True, record_latency=True)
+        baseline = json.loads(self.baseline.read_text())
+        baseline['endpoints']['students[admin]']['p95_ms'] = 0
+        self.baseline.write_text(json.dumps(baseline))
+        with self.assertRaisesMessage(CommandError, 'students[admin]: p95'):
+            self.bench(latency_tolerance=100)
+
+    def test_missing_baseline_fails(self):
+        with self.assertRaisesMessage(CommandError, 'não encontrado'):
+            self.bench()
+        self.bench(allow_missing_baseline=True)
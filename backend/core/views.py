@@ -0,0 +1,45 @@
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from rest_framework.decorators import api_view
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from . import metrics as app_metrics
+from .batch import run as run_batch_item
+from .proxies import client_ip
+from .roles import get_role
+from .sync import parse_token, sync_payload
+
+
+def _is_internal(request):
+    address = client_ip(request)
+    return address is not None and any(address in network for network in settings.METRICS_ALLOWED_NETWORKS)
+
+
+def metrics(request):
+    """Métricas no formato de texto do Prometheus (staff ou redes internas)"""
+    if not settings.METRICS_ENABLED:
+        return HttpResponse(status=404)
+    if not (request.user.is_staff or _is_internal(request)):
+        return HttpResponseForbidden()
+    return HttpResponse(app_metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@api_view(['GET'])
+def sync(request):
+    """Alterações desde o token ``since`` (ver core.sync)"""
+    token = request.query_params.get('since')
+    if token and parse_token(token) is None:
+        raise ValidationError({'since': 'Token de sincronização inválido'})
+    return Response(sync_payload(get_role(request), token))
+
+
+@api_view(['POST'])
+def batch(request):
+    """Executa uma lista de GETs e devolve todas as respostas juntas (ver core.batch)"""
+    paths = request.data.get('requests') if isinstance(request.data, dict) else None
+    if not isinstance(paths, list) or not paths or not all(isinstance(path, str) for path in paths):
+        raise ValidationError({'requests': 'Informe uma lista de caminhos GET da API'})
+    if len(paths) > settings.BATCH_MAX_REQUESTS:
+        raise ValidationError({'requests': f'Máximo de {settings.BATCH_MAX_REQUESTS} requisições por batch'})
+    return Response({'responses': [run_batch_item(request, path) for path in paths]})
@@ -0,0 +1,96 @@
+"""
+Configuração do gunicorn para produção.
+
+Todos os valores podem ser ajustados por variáveis de ambiente (GUNICORN_*).
+Uso: gunicorn app.wsgi:application -c gunicorn.conf.py
+"""
+import multiprocessing
+import os
+
+
+def env_int(name, default):
+    return int(os.getenv(name, default))
+
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+
+# Processos: (2 x CPUs) + 1 é o ponto de partida recomendado pelo gunicorn
+workers = env_int('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1)
+
+# gthread: cada worker atende várias requisições enquanto outras esperam o banco.
+# O pool de conexões (DB_POOL_MAX_SIZE) comporta essas threads e as do dashboard
+# assíncrono (DASHBOARD_QUERY_THREADS) por padrão.
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+threads = env_int('GUNICORN_THREADS', 4)
+
+# Carrega o Django uma vez no processo principal antes do fork (menos memória e
+# inicialização mais rápida dos workers). As conexões com o banco são abertas
+# sob demanda em cada worker, então não são compartilhadas entre processos.
+preload_app = os.getenv('GUNICORN_PRELOAD', 'True').lower() in ('true', '1', 'yes', 'on')
+
+# Recicla os workers periodicamente para conter vazamentos de memória; o jitter
+# evita que todos reiniciem ao mesmo tempo
+max_requests = env_int('GUNICORN_MAX_REQUESTS', 1000)
+max_requests_jitter = env_int('GUNICORN_MAX_REQUESTS_JITTER', 100)
+
+timeout = env_int('GUNICORN_TIMEOUT', 30)
+graceful_timeout = env_int('GUNICORN_GRACEFUL_TIMEOUT', 30)
+
+# Precisa ser maior que o keepalive_timeout do upstream no nginx (60s), senão o
+# gunicorn fecha conexões que o nginx ainda considera reutilizáveis
+keepalive = env_int('GUNICORN_KEEPALIVE', 75)
+
+# Respeita X-Forwarded-* apenas vindos do nginx (mesmo endereço de TRUSTED_PROXIES;
+# no docker-compose.prod.yml, o IP fixo do container do frontend)
+forwarded_allow_ips = os.getenv('GUNICORN_FORWARDED_ALLOW_IPS', '127.0.0.1')
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-')
+errorlog = os.getenv('GUNICORN_ERROR_LOG', '-')
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
+
+
+def post_fork(server, worker):
+    # Com preload_app, garante que nenhuma conexão aberta durante o carregamento
+    # seja herdada pelos workers
+    from django.db import connections
+    connections.close_all()
+
+
+def on_starting(server):
+    # Com vários workers o cache precisa ser compartilhado: a invalidação dos
+    # relatórios, os ETags e os limites de login só valeriam no worker que os gravou
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
+    from django.conf import settings
+    if (server.cfg.workers > 1 and not settings.DEBUG
+            and settings.CACHES['default']['BACKEND'].endswith('LocMemCache')):
+        raise RuntimeError(
+            'CACHE_BACKEND=locmem não é compartilhado entre os workers do gunicorn: '
+            'use db, file ou redis (ou GUNICORN_WORKERS=1)'
+        )
+
+    # Métricas (/metrics) de uma execução anterior não devem somar com as novas
+    metrics_dir = os.getenv('METRICS_DIR')
+    if metrics_dir is None:
+        import tempfile
+        metrics_dir = os.path.join(tempfile.gettempdir(), 'fisiopilates-metrics')
+    if os.path.isdir(metrics_dir):
+        for name in os.listdir(metrics_dir):
+            if name.startswith('worker-') or name == 'archived.json':
+                os.remove(os.path.join(metrics_dir, name))
+
+
+def worker_exit(server, worker):
+    # Grava as métricas ainda não enviadas ao arquivo do worker (max_requests, reload)
+    from django.conf import settings
+    if settings.configured and getattr(settings, 'METRICS_ENABLED', False):
+        from core.metrics import registry
+        registry.flush()
+
+
+def child_exit(server, worker):
+    # No processo principal: soma as métricas do worker encerrado no consolidado e
+    # remove o arquivo dele, para o diretório não crescer a cada reciclagem
+    from django.conf import settings
+    if settings.configured and getattr(settings, 'METRICS_ENABLED', False):
+        from core.metrics import archive_worker
+        archive_worker(worker.pid)
@@ -1,9 +1,10 @@
 from rest_framework import viewsets
 from rest_framework.permissions import IsAuthenticated
+from core.conditional import ConditionalListMixin
 from .models import Modality
 from .serializers import ModalitySerializer
 
-class ModalityViewSet(viewsets.ModelViewSet):
+class ModalityViewSet(ConditionalListMixin, viewsets.ModelViewSet):
     queryset = Modality.objects.all()
     serializer_class = ModalitySerializer
     permission_classes = [IsAuthenticated]
@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Payment, ClinicCommissionPayment
+from .models import Payment, ClinicCommissionPayment, MonthlySnapshot
+from core.signals import invalidate_physiotherapists
 
 @admin.register(Payment)
 class PaymentAdmin(admin.ModelAdmin):
@@ -73,12 +74,28 @@ class ClinicCommissionPaymentAdmin(admin.ModelAdmin):
     
     def approve_payments(self, request, queryset):
         """Ação para aprovar pagamentos em lote"""
+        physiotherapist_ids = list(queryset.values_list('physiotherapist_id', flat=True).distinct())
         updated = queryset.update(status='approved')
+        invalidate_physiotherapists(physiotherapist_ids)  # update() não dispara os signals
         self.message_user(request, f'{updated} pagamentos foram aprovados.')
     approve_payments.short_description = "Aprovar pagamentos selecionados"
     
     def mark_as_awaiting_approval(self, request, queryset):
         """Ação para marcar como aguardando aprovação"""
+        physiotherapist_ids = list(queryset.values_list('physiotherapist_id', flat=True).distinct())
         updated = queryset.update(status='awaiting_approval')
+        invalidate_physiotherapists(physiotherapist_ids)
         self.message_user(request, f'{updated} pagamentos foram marcados como aguardando aprovação.')
     mark_as_awaiting_approval.short_description = "Marcar como aguardando aprovação"
+
+
+@admin.register(MonthlySnapshot)
+class MonthlySnapshotAdmin(admin.ModelAdmin):
+    list_display = ['month', 'physiotherapist', 'updated_at']
+    list_filter = ['month', 'physiotherapist']
+    readonly_fields = ['physiotherapist', 'month', 'data', 'updated_at']
+    date_hierarchy = 'month'
+
+    def has_add_permission(self, request):
+        """Snapshots são gravados pelo comando snapshot_months ou na primeira leitura"""
+        return False
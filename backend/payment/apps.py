@@ -4,3 +4,6 @@ class PaymentConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'payment'
     verbose_name = 'Pagamentos'
+
+    def ready(self):
+        from . import signals  # noqa: F401
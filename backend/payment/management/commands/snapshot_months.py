@@ -0,0 +1,54 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+
+from physiotherapist.models import Physiotherapist
+from payment.models import MonthlySnapshot, Payment
+from payment.periods import parse_month, shift_month
+from payment.reports import is_closed_month, store_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Grava os snapshots dos resumos dos meses fechados (por fisioterapeuta e consolidado).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='Primeiro mês (YYYY-MM). Padrão: mês do primeiro pagamento')
+        parser.add_argument('--end', help='Último mês (YYYY-MM). Padrão: último mês fechado')
+        parser.add_argument('--rebuild', action='store_true', help='Recalcula snapshots já existentes')
+
+    def handle(self, *args, **options):
+        today = date.today()
+        try:
+            if options['start']:
+                start = parse_month(options['start'])
+            else:
+                first_payment = Payment.objects.aggregate(first=Min('payment_date'))['first']
+                if first_payment is None:
+                    self.stdout.write('Nenhum pagamento cadastrado.')
+                    return
+                start = (first_payment.year, first_payment.month)
+            end = parse_month(options['end']) if options['end'] else shift_month(today.year, today.month, -2)
+        except ValueError:
+            raise CommandError('Formato inválido. Use YYYY-MM')
+
+        scopes = [None] + list(Physiotherapist.objects.values_list('id', flat=True))
+        created = skipped = 0
+        year, month = start
+        while (year, month) <= end:
+            if not is_closed_month(year, month, today):
+                self.stdout.write(self.style.WARNING(f'{month:02d}/{year} ainda não está fechado, ignorado.'))
+                break
+
+            existing = set(MonthlySnapshot.objects.filter(
+                month=date(year, month, 1)
+            ).values_list('physiotherapist_id', flat=True))
+            for physiotherapist_id in scopes:
+                if physiotherapist_id in existing and not options['rebuild']:
+                    skipped += 1
+                    continue
+                store_snapshot(year, month, physiotherapist_id)
+                created += 1
+            year, month = shift_month(year, month, 1)
+
+        self.stdout.write(self.style.SUCCESS(f'{created} snapshots gravados, {skipped} já existentes.'))
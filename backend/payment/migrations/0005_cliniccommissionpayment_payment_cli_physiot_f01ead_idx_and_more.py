@@ -0,0 +1,28 @@
+# Generated by Django 5.2 on 2026-10-19 11:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('modality', '0004_alter_modality_options_modality_payment_type'),
+        ('payment', '0004_cliniccommissionpayment_status'),
+        ('physiotherapist', '0001_initial'),
+        ('student', '0009_remove_student_payment_date_student_payment_day'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cliniccommissionpayment',
+            index=models.Index(fields=['physiotherapist', 'transfer_date', 'status'], name='payment_cli_physiot_f01ead_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['student', 'reference_month'], name='payment_pay_student_4c981e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['payment_date', 'student'], name='payment_pay_payment_553fa4_idx'),
+        ),
+    ]
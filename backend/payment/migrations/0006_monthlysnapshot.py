@@ -0,0 +1,32 @@
+# Generated by Django 5.2 on 2026-10-19 12:03
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment', '0005_cliniccommissionpayment_payment_cli_physiot_f01ead_idx_and_more'),
+        ('physiotherapist', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlySnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='Primeiro dia do mês do resumo', verbose_name='Mês')),
+                ('data', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name='Resumo')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('physiotherapist', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='monthly_snapshots', to='physiotherapist.physiotherapist', verbose_name='Fisioterapeuta')),
+            ],
+            options={
+                'verbose_name': 'Resumo Mensal',
+                'verbose_name_plural': 'Resumos Mensais',
+                'ordering': ['-month'],
+                'constraints': [models.UniqueConstraint(fields=('physiotherapist', 'month'), name='unique_snapshot_per_physiotherapist_month'), models.UniqueConstraint(condition=models.Q(('physiotherapist__isnull', True)), fields=('month',), name='unique_consolidated_snapshot_month')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-19 12:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment', '0007_payment_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cliniccommissionpayment',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
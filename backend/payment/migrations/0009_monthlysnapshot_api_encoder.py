@@ -0,0 +1,25 @@
+# Generated by Django 5.2 on 2026-10-19 13:16
+
+import rest_framework.utils.encoders
+from django.db import migrations, models
+
+
+def discard_snapshots(apps, schema_editor):
+    # Snapshots antigos guardam Decimal como texto; são recalculados na próxima leitura
+    apps.get_model('payment', 'MonthlySnapshot').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment', '0008_cliniccommissionpayment_updated_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='monthlysnapshot',
+            name='data',
+            field=models.JSONField(encoder=rest_framework.utils.encoders.JSONEncoder, verbose_name='Resumo'),
+        ),
+        migrations.RunPython(discard_snapshots, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,7 @@
+import json
+
 from django.db import models
+from rest_framework.utils.encoders import JSONEncoder
 from student.models import Student
 from modality.models import Modality
 from physiotherapist.models import Physiotherapist
@@ -31,6 +34,7 @@ class Payment(models.Model):
         help_text='Mês de referência para pagamentos mensais'
     )
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f'{self.student.name} - {self.payment_date}'
@@ -39,6 +43,12 @@ class Payment(models.Model):
         verbose_name = 'Pagamento'
         verbose_name_plural = 'Pagamentos'
         ordering = ['-payment_date']
+        indexes = [
+            # Status mensal do aluno e resumo de pré-pagos (mês de referência)
+            models.Index(fields=['student', 'reference_month']),
+            # Resumos por data de pagamento (pós-pagos, dashboard e comissões)
+            models.Index(fields=['payment_date', 'student']),
+        ]
 
 class ClinicCommissionPayment(models.Model):
     STATUS_CHOICES = [
@@ -81,6 +91,7 @@ class ClinicCommissionPayment(models.Model):
         verbose_name='Status'
     )
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f'Comissão - {self.physiotherapist.user.get_full_name()} - {self.transfer_date}'
@@ -89,3 +100,54 @@ class ClinicCommissionPayment(models.Model):
         verbose_name = 'Pagamento de Comissão'
         verbose_name_plural = 'Pagamentos de Comissões'
         ordering = ['-transfer_date']
+        indexes = [
+            models.Index(fields=['physiotherapist', 'transfer_date', 'status']),
+        ]
+
+
+class MonthlySnapshot(models.Model):
+    """
+    Resumo já calculado de um mês fechado. Sem fisioterapeuta, guarda a visão
+    consolidada do administrador.
+    """
+    physiotherapist = models.ForeignKey(
+        Physiotherapist,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='monthly_snapshots',
+        verbose_name='Fisioterapeuta'
+    )
+    month = models.DateField(
+        verbose_name='Mês',
+        help_text='Primeiro dia do mês do resumo'
+    )
+    # Mesmo encoder das respostas da API: Decimal vira número, como no mês corrente
+    data = models.JSONField(encoder=JSONEncoder, verbose_name='Resumo')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @staticmethod
+    def encode(data):
+        """Converte o resumo para a forma em que é lido do banco (Decimal como número, datas como texto)"""
+        return json.loads(json.dumps(data, cls=JSONEncoder))
+
+    def __str__(self):
+        scope = self.physiotherapist.user.get_full_name() if self.physiotherapist else 'Todos'
+        return f'Resumo {self.month:%m/%Y} - {scope}'
+
+    class Meta:
+        verbose_name = 'Resumo Mensal'
+        verbose_name_plural = 'Resumos Mensais'
+        ordering = ['-month']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['physiotherapist', 'month'],
+                name='unique_snapshot_per_physiotherapist_month'
+            ),
+            # NULL não conflita em índices únicos; a visão consolidada precisa da própria restrição
+            models.UniqueConstraint(
+                fields=['month'],
+                condition=models.Q(physiotherapist__isnull=True),
+                name='unique_consolidated_snapshot_month'
+            ),
+        ]
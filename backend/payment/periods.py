@@ -0,0 +1,68 @@
+"""
+Utilitários de período mensal.
+
+Os filtros ``campo__year`` / ``campo__month`` viram ``EXTRACT(...)`` no
+PostgreSQL e não aproveitam índices B-tree nas colunas de data. As funções
+abaixo convertem (ano, mês) no intervalo semiaberto
+``[primeiro_dia, primeiro_dia_do_mês_seguinte)``, que é indexável.
+"""
+from datetime import MAXYEAR, MINYEAR, date
+
+from django.db.models import Q
+
+
+def shift_month(year, month, delta):
+    """Retorna (ano, mês) deslocado ``delta`` meses"""
+    index = year * 12 + (month - 1) + delta
+    return index // 12, index % 12 + 1
+
+
+def month_range(year, month):
+    """Retorna o primeiro dia do mês e o primeiro dia do mês seguinte"""
+    next_year, next_month = shift_month(year, month, 1)
+    return date(year, month, 1), date(next_year, next_month, 1)
+
+
+def in_month(field, year, month):
+    """Predicado ``field`` dentro do mês (ano, mês)"""
+    start, end = month_range(year, month)
+    return Q(**{f'{field}__gte': start, f'{field}__lt': end})
+
+
+def parse_month(value):
+    """
+    Converte 'YYYY-MM' em (ano, mês). Lança ValueError para formatos
+    inválidos e anos fora do intervalo das datas (o mês seguinte também
+    precisa existir, para ``month_range``).
+    """
+    year, month = map(int, value.split('-'))
+    if not MINYEAR <= year < MAXYEAR:
+        raise ValueError(f'Ano fora do intervalo: {year}')
+    date(year, month, 1)
+    return year, month
+
+
+def paid_in_month(year, month, payment_prefix='', student_prefix='student__'):
+    """
+    Predicado de pagamento de mensalidade no mês: pré-pagos pelo mês de
+    referência e pós-pagos pela data do pagamento.
+
+    Os prefixos padrão servem para consultas sobre Payment; para consultas
+    sobre Student use ``payment_prefix='payments__', student_prefix=''``.
+    """
+    return (
+        (Q(**{f'{student_prefix}payment_type': 'PRE'}) &
+         in_month(f'{payment_prefix}reference_month', year, month)) |
+        (Q(**{f'{student_prefix}payment_type': 'POS'}) &
+         in_month(f'{payment_prefix}payment_date', year, month))
+    )
+
+
+def status_reference_month(payment_type, year, month):
+    """
+    Mês de referência que define se o aluno está em dia no mês (ano, mês):
+    o próprio mês para pré-pagos e o mês anterior para pós-pagos.
+    """
+    if payment_type == 'PRE':
+        return year, month
+    return shift_month(year, month, -1)
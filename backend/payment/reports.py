@@ -0,0 +1,524 @@
+"""
+Relatórios mensais de pagamentos, snapshots dos meses fechados e o resumo do
+dashboard (em versão sequencial e assíncrona).
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import Q
+
+from core.cache import get_or_set_report
+from physiotherapist.models import Physiotherapist
+from student.models import Student
+from .models import Payment, ClinicCommissionPayment, MonthlySnapshot
+from .periods import in_month, month_range, paid_in_month, shift_month
+
+
+def build_summary(year, month, physiotherapist_id=None):
+    """Resumo de mensalidades do mês (ano, mês) para um fisioterapeuta ou para todos"""
+    # Filtra estudantes ativos
+    students = Student.objects.filter(active=True)
+
+    # Filtra por data de cadastro (apenas alunos cadastrados antes ou durante o mês de referência)
+    target_date, next_month = month_range(year, month)
+
+    students = students.filter(registration_date__date__lt=next_month)
+
+    # Filtra por fisioterapeuta (None = todos, visão do administrador)
+    if physiotherapist_id:
+        students = students.filter(physiotherapist_id=physiotherapist_id)
+
+    # Total de alunos com pagamento mensal
+    total_students = students.filter(modality__payment_type='MONTHLY').count()        # Busca todos os alunos que pagaram no mês em uma única query
+    # Pré-pagos pelo mês de referência, pós-pagos pela data do pagamento
+    paid_students = students.filter(
+        Q(modality__payment_type='MONTHLY') &
+        paid_in_month(year, month, payment_prefix='payments__', student_prefix='')
+    ).distinct()        # Busca todos os pagamentos do mês
+    paid_payments = Payment.objects.filter(
+        Q(student__in=students) &
+        Q(student__modality__payment_type='MONTHLY') &
+        paid_in_month(year, month)
+    )
+
+    total_received = sum(payment.amount for payment in paid_payments)        # Lista de pendentes
+    pending_students = students.filter(
+        modality__payment_type='MONTHLY'
+    ).exclude(
+        id__in=paid_students.values_list('id', flat=True)
+    )
+
+    # Verificar pagamentos atrasados - apenas para o mês atual
+    current_date = datetime.now()
+    is_current_month = (current_date.year == year and current_date.month == month)
+
+    # Para pagamentos atrasados, só considera:
+    # 1. Mês atual
+    # 2. Alunos que não pagaram no mês
+    # 3. Alunos com dia de pagamento definido
+    # 4. Dia atual é maior que o dia de pagamento
+    overdue_students = []
+    total_overdue = 0
+    if is_current_month:
+        overdue_students = pending_students.filter(
+            payment_day__isnull=False,
+            payment_day__lt=current_date.day
+        )
+        total_overdue = sum(student.modality.price for student in overdue_students)
+
+    # Calcular valor total esperado e pendente
+    total_expected = sum(student.modality.price for student in students.filter(modality__payment_type='MONTHLY'))
+    total_pending = total_expected - total_received
+
+    return {            'totalStudents': total_students,
+        'paidStudents': paid_students.count(),
+        'pendingStudents': pending_students.count(),
+        'overdueStudents': len(overdue_students) if is_current_month else 0,
+        'totalExpectedValue': total_expected,
+        'totalReceivedValue': total_received,
+        'totalPendingValue': total_pending,
+        'totalOverdueValue': total_overdue if is_current_month else 0,
+        'paidList': [
+            {
+                'id': student.id,
+                'name': student.name,
+                'modality_name': student.modality.name,
+                'modality': student.modality.id,
+                'payment_type': student.payment_type,
+                'payment_date': (
+                    student.payments.filter(in_month('payment_date', year, month)).first().payment_date
+                    if student.payment_type == 'POS'
+                    else student.payments.filter(in_month('reference_month', year, month)).first().payment_date
+                ),
+                'reference_month': (
+                    student.payments.filter(in_month('payment_date', year, month)).first().reference_month
+                    if student.payment_type == 'POS'
+                    else student.payments.filter(in_month('reference_month', year, month)).first().reference_month
+                ),
+                'amount': (
+                    student.payments.filter(in_month('payment_date', year, month)).first().amount
+                    if student.payment_type == 'POS'
+                    else student.payments.filter(in_month('reference_month', year, month)).first().amount
+                ),
+                'schedules': [
+                    {
+                        'weekday': schedule.weekday,
+                        'hour': schedule.hour
+                    }
+                    for schedule in student.schedules.all()
+                ]
+            }
+            for student in paid_students
+        ],
+        'pendingList': [
+            {
+                'id': student.id,
+                'name': student.name,
+                'modality_name': student.modality.name,
+                'modality': student.modality.id,
+                'expected_amount': student.modality.price,                    'payment_type': student.payment_type,
+                'payment_day': student.payment_day,
+                'is_overdue': is_current_month and student.payment_day and current_date.day > student.payment_day,
+                'reference_month': (
+                    # Se for pós-pago, usa o mês de referência (abril/2025) passado na query
+                    target_date.strftime('%Y-%m')
+                    if student.payment_type == 'POS'
+                    # Se for pré-pago, usa o mês seguinte (maio/2025)
+                    else date(*shift_month(year, month, 1), 1).strftime('%Y-%m')
+                ),
+                'schedules': [
+                    {
+                        'weekday': schedule.weekday,
+                        'hour': schedule.hour
+                    }
+                    for schedule in student.schedules.all()
+                ]
+            }
+            for student in pending_students
+        ]
+    }
+
+
+def is_closed_month(year, month, today=None):
+    """Meses encerrados há mais de um mês não mudam mais, salvo pagamentos retroativos"""
+    today = today or date.today()
+    return (year, month) <= shift_month(today.year, today.month, -2)
+
+
+def get_summary(year, month, physiotherapist_id=None):
+    """
+    Resumo do mês: meses fechados vêm do snapshot (gravado na primeira
+    leitura), os demais do cache versionado.
+    """
+    if is_closed_month(year, month):
+        month_start = date(year, month, 1)
+        snapshot = MonthlySnapshot.objects.filter(
+            physiotherapist_id=physiotherapist_id, month=month_start
+        ).values_list('data', flat=True).first()
+        if snapshot is not None:
+            return snapshot
+        return store_snapshot(year, month, physiotherapist_id)
+
+    # O resumo do mês atual depende do dia (pagamentos atrasados)
+    today = date.today()
+    day = today.day if (today.year, today.month) == (year, month) else None
+    return get_or_set_report(
+        'summary', lambda: build_summary(year, month, physiotherapist_id),
+        physiotherapist_id, year, month, day=day
+    )
+
+
+def store_snapshot(year, month, physiotherapist_id=None):
+    """Calcula e grava (ou regrava) o snapshot do mês, retornando o resumo"""
+    data = MonthlySnapshot.encode(build_summary(year, month, physiotherapist_id))
+    try:
+        with transaction.atomic():
+            MonthlySnapshot.objects.update_or_create(
+                physiotherapist_id=physiotherapist_id,
+                month=date(year, month, 1),
+                defaults={'data': data}
+            )
+    except IntegrityError:
+        # Outra requisição gravou o mesmo snapshot ao mesmo tempo
+        pass
+    return data
+
+
+def dashboard_months(current_date):
+    """Três meses anteriores, o mês atual e o próximo mês (prévia)"""
+    months = []
+    for offset in range(-3, 2):
+        year, month = shift_month(current_date.year, current_date.month, offset)
+        months.append({
+            'year': year,
+            'month': month,
+            'is_current': offset == 0,
+            'is_future': offset == 1
+        })
+    return months
+
+
+def dashboard_students(is_staff, physiotherapist=None):
+    students = Student.objects.filter(active=True)
+    # Filter by physiotherapist if not admin
+    if not is_staff:
+        students = students.filter(physiotherapist=physiotherapist)
+    return students
+
+
+def dashboard_physiotherapist_summary(current_date):
+    """Resumo do mês atual por fisioterapeuta (apenas para administradores)"""
+    current_year = current_date.year
+    current_month = current_date.month
+    physiotherapist_summary = []
+
+    for physio in Physiotherapist.objects.select_related('user'):
+        # Get payments for current month baseado na data do pagamento
+        physio_students = Student.objects.filter(physiotherapist=physio, active=True)
+        paid_students = physio_students.filter(
+            in_month('payments__payment_date', current_year, current_month)
+        ).distinct()
+
+        # Calcula comissão do mês atual para esta fisioterapeuta
+        physio_payments_month = Payment.objects.filter(
+            in_month('payment_date', current_year, current_month),
+            student__physiotherapist=physio
+        )
+
+        # Calcula o total recebido e comissão por aluno
+        total_month_payments = 0
+        commission_to_pay = 0
+        for payment in physio_payments_month:
+            if payment.student.commission is not None:
+                total_month_payments += payment.amount
+                commission_to_pay += payment.amount * (payment.student.commission / 100)
+
+        # Busca comissões já pagas para este fisioterapeuta no mês atual
+        paid_commissions = ClinicCommissionPayment.objects.filter(
+            in_month('transfer_date', current_year, current_month),
+            physiotherapist=physio,
+            status='approved'  # Apenas comissões aprovadas
+        )
+        total_paid_commission = sum(payment.amount_paid for payment in paid_commissions)
+
+        # Subtrai o valor já pago do total a pagar
+        commission_to_pay = max(commission_to_pay - total_paid_commission, 0)
+
+        physiotherapist_summary.append({
+            'id': physio.id,
+            'name': physio.user.get_full_name() or physio.user.username,
+            'total_students': physio_students.count(),
+            'paid_students': paid_students.count(),
+            'pending_students': physio_students.count() - paid_students.count(),
+            'total_month_revenue': total_month_payments,
+            'commission_to_pay': commission_to_pay
+        })
+    return physiotherapist_summary
+
+
+def dashboard_month_summary(students, month_data, is_staff, current_date):
+    """
+    Resumo de um dos meses do dashboard. Retorna o resumo (ou None quando o
+    mês não tem valores) e o total atrasado, calculado apenas no mês atual.
+    """
+    year = month_data['year']
+    month = month_data['month']
+
+    # Primeiro pega todos os alunos ativos com modalidade
+    students_for_month = students.filter(Q(modality__isnull=False))
+
+    # Se não for mês futuro, filtra por data de cadastro
+    if not month_data['is_future']:
+        target_date, next_month = month_range(year, month)
+
+        students_for_month = students_for_month.filter(
+            registration_date__date__lt=next_month  # Alunos cadastrados antes do próximo mês
+        )
+        # Busca pagamentos do mês considerando tipo de pagamento
+        # Para alunos pré-pagos, usa o mês de referência
+        # Para alunos pós-pagos, usa a data do pagamento
+        paid_students = students_for_month.filter(
+            paid_in_month(year, month, payment_prefix='payments__', student_prefix='')
+        ).distinct()
+    else:
+        # Para mês futuro, não tem pagamentos
+        paid_students = students.none()
+
+    # Get payments for this month considerando tipo de pagamento
+    monthly_payments = Payment.objects.filter(
+        Q(student__in=students_for_month) & paid_in_month(year, month)
+    )
+
+    total_received = sum(payment.amount for payment in monthly_payments)
+
+    # Calculate expected value based on modalities (only for registered students)
+    total_expected = sum(student.modality.price for student in students_for_month.select_related('modality'))
+    total_pending = total_expected - total_received
+
+    # Per physiotherapist breakdown if admin
+    physiotherapist_breakdown = []
+    if is_staff:
+        for physio in Physiotherapist.objects.select_related('user'):
+            physio_students = students_for_month.filter(physiotherapist=physio)
+            physio_paid = paid_students.filter(physiotherapist=physio)
+            physio_payments = monthly_payments.filter(student__physiotherapist=physio)
+
+            physiotherapist_breakdown.append({
+                'id': physio.id,
+                'name': physio.user.get_full_name() or physio.user.username,
+                'total_students': physio_students.count(),
+                'paid_students': physio_paid.count(),
+                'pending_students': physio_students.count() - physio_paid.count(),
+                'total_received': sum(payment.amount for payment in physio_payments),
+            })
+
+    month_summary = {
+        'year': year,
+        'month': month,
+        'is_current': month_data['is_current'],
+        'is_future': month_data['is_future'],
+        'total_students': students_for_month.count(),
+        'paid_students': paid_students.count(),
+        'pending_students': students_for_month.count() - paid_students.count(),
+        'total_received': total_received,
+        'total_expected': total_expected,
+        'total_pending': total_pending,
+        'physiotherapist_breakdown': physiotherapist_breakdown
+    }
+
+    # Se é mês futuro, calcula apenas o valor esperado
+    if month_data['is_future']:
+        month_summary['total_received'] = 0
+        month_summary['total_pending'] = total_expected
+        month_summary['paid_students'] = 0
+        month_summary['pending_students'] = month_summary['total_students']
+
+    total_overdue = None
+    if month_data['is_current']:
+        # Filtra alunos sem pagamento no mês atual e com dia de pagamento menor que o dia atual
+        overdue_students = students_for_month.filter(
+            Q(modality__payment_type='MONTHLY') &
+            Q(payment_day__isnull=False) &
+            Q(payment_day__lt=current_date.day)
+        ).exclude(
+            # Exclui quem já pagou no mês atual
+            in_month('payments__reference_month', year, month) |
+            in_month('payments__payment_date', year, month)
+        ).select_related('modality')
+        # Soma o valor atrasado
+        total_overdue = sum(student.modality.price for student in overdue_students)
+        month_summary['total_overdue'] = total_overdue
+
+    # Verifica se tem valores ou se é mês atual/futuro antes de adicionar
+    has_values = (
+        month_summary['total_expected'] > 0 or
+        month_summary['total_received'] > 0 or
+        month_data['is_current'] or
+        month_data['is_future']
+    )
+    return (month_summary if has_values else None), total_overdue
+
+
+def dashboard_commissions(students, current_date):
+    """Comissões recebidas e esperadas no mês atual"""
+    active_students = students.filter(modality__isnull=False)
+
+    # Pega os pagamentos do mês atual - usando data do pagamento ao invés do mês de referência
+    current_month_payments = Payment.objects.filter(
+        in_month('payment_date', current_date.year, current_date.month),
+        student__in=active_students
+    ).select_related('student')
+
+    # Calcula comissões dos pagamentos já recebidos
+    total_commissions = Decimal('0')
+    for payment in current_month_payments:
+        if payment.student.commission is not None:
+            total_commissions += payment.amount * (payment.student.commission / Decimal('100'))
+
+    # Calcula comissões esperadas dos pagamentos pendentes
+    # Primeiro, vamos pegar os pagamentos já feitos este mês para qualquer mês de referência
+    paid_this_month = Payment.objects.filter(
+        in_month('payment_date', current_date.year, current_date.month)
+    ).values_list('student_id', flat=True)
+
+    # Agora vamos pegar os alunos que ainda não pagaram este mês
+    pending_students = active_students.exclude(id__in=paid_this_month).select_related('modality')
+
+    total_expected_commissions = Decimal('0')
+    for student in pending_students:
+        if student.commission is not None:
+            total_expected_commissions += student.modality.price * (student.commission / Decimal('100'))
+
+    return total_commissions, total_expected_commissions
+
+
+def dashboard_paid_commissions(physiotherapist, current_date):
+    """Comissões aprovadas no mês atual (todas, quando physiotherapist é None)"""
+    paid_commissions = ClinicCommissionPayment.objects.filter(
+        in_month('transfer_date', current_date.year, current_date.month),
+        status='approved'  # Apenas comissões aprovadas
+    )
+    if physiotherapist is not None:
+        paid_commissions = paid_commissions.filter(physiotherapist=physiotherapist)
+    return paid_commissions
+
+
+def assemble_dashboard(total_students, month_results, physiotherapist_summary,
+                       total_commissions, total_expected_commissions, total_paid_commissions):
+    monthly_summary = [summary for summary, _ in month_results if summary is not None]
+    total_overdue = next((overdue for _, overdue in month_results if overdue is not None), 0)
+
+    # Encontra o mês atual no array
+    current_month_data = next(
+        (month for month in monthly_summary if month['is_current']),
+        {
+            'total_received': 0,
+            'total_expected': 0,
+            'total_pending': 0
+        }
+    )
+
+    return {
+        'total_students': total_students,
+        'monthly_summary': monthly_summary,
+        'current_month_summary': {
+            'total_received': current_month_data['total_received'],
+            'total_expected': current_month_data['total_expected'],
+            'total_pending': current_month_data['total_pending'],
+            'total_overdue': total_overdue,
+            'total_commissions': float(total_commissions),
+            'total_expected_commissions': float(total_expected_commissions),
+            'total_paid_commissions': float(total_paid_commissions)
+        },
+        # O resumo por fisioterapeuta só é calculado para administradores
+        'physiotherapist_summary': physiotherapist_summary
+    }
+
+
+def build_dashboard_summary(is_staff, physiotherapist=None, current_date=None):
+    """Resumo do dashboard calculado sequencialmente"""
+    current_date = current_date or datetime.now().date()
+    students = dashboard_students(is_staff, physiotherapist)
+
+    return assemble_dashboard(
+        students.count(),
+        [dashboard_month_summary(students, month_data, is_staff, current_date)
+         for month_data in dashboard_months(current_date)],
+        dashboard_physiotherapist_summary(current_date) if is_staff else [],
+        *dashboard_commissions(students, current_date),
+        sum(payment.amount_paid for payment in dashboard_paid_commissions(
+            None if is_staff else physiotherapist, current_date
+        ))
+    )
+
+
+_executor = None
+
+
+def _dashboard_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.DASHBOARD_QUERY_THREADS, thread_name_prefix='dashboard'
+        )
+    return _executor
+
+
+def _in_own_thread(func):
+    """
+    Executa ``func`` no executor do dashboard, com a conexão da thread.
+
+    O ORM assíncrono do Django encaminha todas as consultas de uma requisição
+    para a mesma thread, então ``asyncio.gather`` sobre ``aaggregate``/``acount``
+    não as executa em paralelo. As partes pesadas rodam em até
+    DASHBOARD_QUERY_THREADS threads fixas, cada uma com sua conexão mantida
+    entre chamadas pelas mesmas regras de CONN_MAX_AGE das requisições.
+    """
+    def run(*args):
+        close_old_connections()
+        try:
+            return func(*args)
+        finally:
+            close_old_connections()
+    return sync_to_async(run, thread_sensitive=False, executor=_dashboard_executor())
+
+
+async def _aempty_list():
+    return []
+
+
+async def _asum_paid_commissions(physiotherapist, current_date):
+    queryset = dashboard_paid_commissions(physiotherapist, current_date)
+    return sum([payment.amount_paid async for payment in queryset])
+
+
+async def abuild_dashboard_summary(is_staff, physiotherapist=None, current_date=None):
+    """
+    Mesmo resumo de ``build_dashboard_summary``, com as partes independentes
+    executadas em paralelo: o tempo total se aproxima do da parte mais lenta.
+    """
+    current_date = current_date or datetime.now().date()
+    students = dashboard_students(is_staff, physiotherapist)
+    months = dashboard_months(current_date)
+
+    results = await asyncio.gather(
+        students.acount(),
+        _in_own_thread(dashboard_physiotherapist_summary)(current_date) if is_staff else _aempty_list(),
+        _in_own_thread(dashboard_commissions)(students, current_date),
+        _asum_paid_commissions(None if is_staff else physiotherapist, current_date),
+        *[
+            _in_own_thread(dashboard_month_summary)(students, month_data, is_staff, current_date)
+            for month_data in months
+        ]
+    )
+    total_students, physiotherapist_summary, commissions, total_paid_commissions = results[:4]
+
+    return assemble_dashboard(
+        total_students, results[4:], physiotherapist_summary,
+        *commissions, total_paid_commissions
+    )
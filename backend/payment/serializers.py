@@ -3,6 +3,8 @@ from .models import Payment, ClinicCommissionPayment
 from student.serializers import StudentSerializer
 from modality.serializers import ModalitySerializer
 from physiotherapist.models import Physiotherapist
+from student.models import Student
+from .periods import in_month
 
 class PaymentSerializer(serializers.ModelSerializer):
     student_details = StudentSerializer(source='student', read_only=True)
@@ -16,6 +18,26 @@ class PaymentSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['created_at']
 
+    def validate(self, data):
+        # Mensalidade: um pagamento por aluno e mês de referência
+        student = data.get('student', getattr(self.instance, 'student', None))
+        modality = data.get('modality', getattr(self.instance, 'modality', None))
+        reference_month = data.get('reference_month', getattr(self.instance, 'reference_month', None))
+        if student and modality and modality.payment_type == 'MONTHLY' and reference_month:
+            # Trava o aluno até o fim da transação aberta pela PaymentViewSet: uma
+            # gravação concorrente do mesmo aluno espera e então vê este pagamento
+            Student.objects.select_for_update().get(pk=student.pk)
+            duplicates = Payment.objects.filter(
+                in_month('reference_month', reference_month.year, reference_month.month), student=student
+            )
+            if self.instance is not None:
+                duplicates = duplicates.exclude(pk=self.instance.pk)
+            if duplicates.exists():
+                raise serializers.ValidationError(
+                    {'reference_month': 'Já existe um pagamento deste aluno para este mês de referência.'}
+                )
+        return data
+
 class PhysiotherapistDetailSerializer(serializers.ModelSerializer):
     class Meta:
         model = Physiotherapist
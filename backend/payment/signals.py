@@ -0,0 +1,51 @@
+"""
+Invalidação dos snapshots mensais: um pagamento retroativo (criado, alterado
+ou removido) descarta os snapshots dos meses fechados que ele afeta.
+"""
+from django.db import models
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import MonthlySnapshot, Payment
+from .reports import is_closed_month
+
+
+def _touched_months(payment_date, reference_month):
+    # create()/save() aceitam datas como texto ('2026-10-01'); normaliza como o DateField
+    days = [models.DateField().to_python(day) for day in (payment_date, reference_month)]
+    return {
+        day.replace(day=1)
+        for day in days
+        if day is not None and is_closed_month(day.year, day.month)
+    }
+
+
+def discard_snapshots(physiotherapist_id, months):
+    if not months:
+        return
+    MonthlySnapshot.objects.filter(
+        Q(physiotherapist_id=physiotherapist_id) | Q(physiotherapist__isnull=True),
+        month__in=months
+    ).delete()
+
+
+@receiver(pre_save, sender=Payment)
+def remember_previous_months(sender, instance, raw=False, **kwargs):
+    if raw or instance.pk is None:
+        return
+    instance._previous_snapshot_scope = Payment.objects.filter(pk=instance.pk).values_list(
+        'student__physiotherapist_id', 'payment_date', 'reference_month'
+    ).first()
+
+
+@receiver(post_save, sender=Payment)
+@receiver(post_delete, sender=Payment)
+def discard_payment_snapshots(sender, instance, **kwargs):
+    physiotherapist_id = instance.student.physiotherapist_id
+    discard_snapshots(physiotherapist_id, _touched_months(instance.payment_date, instance.reference_month))
+
+    previous = getattr(instance, '_previous_snapshot_scope', None)
+    if previous:
+        previous_physiotherapist_id, payment_date, reference_month = previous
+        discard_snapshots(previous_physiotherapist_id, _touched_months(payment_date, reference_month))
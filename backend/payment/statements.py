@@ -0,0 +1,171 @@
+"""
+Extrato de comissões em XLSX.
+
+As linhas são lidas do banco com ``iterator()`` (cursor do lado do servidor no
+PostgreSQL) e gravadas em um workbook ``write_only`` do openpyxl, de modo que o
+consumo de memória não depende do tamanho do período exportado.
+"""
+import tempfile
+from datetime import date
+from decimal import Decimal
+
+import openpyxl
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+
+from .models import Payment, ClinicCommissionPayment
+
+CHUNK_SIZE = 2000
+MONEY_FORMAT = '#,##0.00'
+DATE_FORMAT = 'DD/MM/YYYY'
+
+
+def _cell(ws, value, bold=False, number_format=None):
+    cell = WriteOnlyCell(ws, value=value)
+    if bold:
+        cell.font = Font(bold=True)
+    if number_format:
+        cell.number_format = number_format
+    return cell
+
+
+def _header(ws, titles):
+    ws.append([_cell(ws, title, bold=True) for title in titles])
+
+
+def _subtotal_row(ws, label, values, offset):
+    row = [None] * offset + [_cell(ws, label, bold=True)]
+    row += [_cell(ws, value, bold=True, number_format=MONEY_FORMAT) for value in values]
+    ws.append(row)
+
+
+def _month_label(day):
+    return day.strftime('%m/%Y')
+
+
+def _write_payments(ws, physiotherapist, start, end):
+    _header(ws, ['Data', 'Aluno', 'Modalidade', 'Mês de Referência',
+                 'Valor Pago', 'Comissão (%)', 'Valor da Comissão'])
+    ws.column_dimensions['B'].width = 30
+    ws.column_dimensions['C'].width = 20
+
+    rows = Payment.objects.filter(
+        student__physiotherapist=physiotherapist,
+        payment_date__gte=start,
+        payment_date__lt=end
+    ).order_by('payment_date', 'id').values_list(
+        'payment_date', 'student__name', 'modality__name', 'reference_month',
+        'amount', 'student__commission'
+    ).iterator(chunk_size=CHUNK_SIZE)
+
+    total_amount = total_commission = Decimal('0')
+    month_amount = month_commission = Decimal('0')
+    current_month = None
+
+    for payment_date, student_name, modality_name, reference_month, amount, rate in rows:
+        month = payment_date.replace(day=1)
+        if current_month is not None and month != current_month:
+            _subtotal_row(ws, f'Subtotal {_month_label(current_month)}',
+                          [month_amount, None, month_commission], offset=3)
+            month_amount = month_commission = Decimal('0')
+        current_month = month
+
+        commission_amount = amount * (rate / Decimal('100')) if rate is not None else Decimal('0')
+        month_amount += amount
+        month_commission += commission_amount
+        total_amount += amount
+        total_commission += commission_amount
+
+        ws.append([
+            _cell(ws, payment_date, number_format=DATE_FORMAT),
+            student_name,
+            modality_name,
+            _month_label(reference_month) if reference_month else None,
+            _cell(ws, amount, number_format=MONEY_FORMAT),
+            rate,
+            _cell(ws, commission_amount, number_format=MONEY_FORMAT),
+        ])
+
+    if current_month is not None:
+        _subtotal_row(ws, f'Subtotal {_month_label(current_month)}',
+                      [month_amount, None, month_commission], offset=3)
+    _subtotal_row(ws, 'Total', [total_amount, None, total_commission], offset=3)
+
+    return total_amount, total_commission
+
+
+def _write_transfers(ws, physiotherapist, start, end):
+    _header(ws, ['Data da Transferência', 'Status', 'Descrição',
+                 'Comissão Devida', 'Valor Transferido'])
+    ws.column_dimensions['C'].width = 40
+
+    status_labels = dict(ClinicCommissionPayment.STATUS_CHOICES)
+    rows = ClinicCommissionPayment.objects.filter(
+        physiotherapist=physiotherapist,
+        transfer_date__gte=start,
+        transfer_date__lt=end
+    ).order_by('transfer_date', 'id').values_list(
+        'transfer_date', 'status', 'description', 'total_commission_due', 'amount_paid'
+    ).iterator(chunk_size=CHUNK_SIZE)
+
+    # Apenas transferências aprovadas entram nos subtotais
+    total_approved = month_approved = Decimal('0')
+    current_month = None
+
+    for transfer_date, transfer_status, description, commission_due, amount_paid in rows:
+        month = transfer_date.replace(day=1)
+        if current_month is not None and month != current_month:
+            _subtotal_row(ws, f'Subtotal aprovado {_month_label(current_month)}',
+                          [None, month_approved], offset=2)
+            month_approved = Decimal('0')
+        current_month = month
+
+        if transfer_status == 'approved':
+            month_approved += amount_paid
+            total_approved += amount_paid
+
+        ws.append([
+            _cell(ws, transfer_date, number_format=DATE_FORMAT),
+            status_labels.get(transfer_status, transfer_status),
+            description,
+            _cell(ws, commission_due, number_format=MONEY_FORMAT),
+            _cell(ws, amount_paid, number_format=MONEY_FORMAT),
+        ])
+
+    if current_month is not None:
+        _subtotal_row(ws, f'Subtotal aprovado {_month_label(current_month)}',
+                      [None, month_approved], offset=2)
+    _subtotal_row(ws, 'Total aprovado', [None, total_approved], offset=2)
+
+    return total_approved
+
+
+def build_commission_statement(physiotherapist, start, end):
+    """
+    Gera o extrato de comissões do fisioterapeuta para o intervalo
+    ``[start, end)`` e retorna um arquivo temporário posicionado no início.
+    """
+    workbook = openpyxl.Workbook(write_only=True)
+
+    payments_sheet = workbook.create_sheet('Pagamentos')
+    total_amount, total_commission = _write_payments(payments_sheet, physiotherapist, start, end)
+
+    transfers_sheet = workbook.create_sheet('Transferências')
+    total_transferred = _write_transfers(transfers_sheet, physiotherapist, start, end)
+
+    summary_sheet = workbook.create_sheet('Resumo')
+    summary_sheet.column_dimensions['A'].width = 30
+    summary_sheet.append(['Fisioterapeuta', physiotherapist.user.get_full_name() or physiotherapist.user.username])
+    summary_sheet.append(['Período', f'{_month_label(start)} a {_month_label(date.fromordinal(end.toordinal() - 1))}'])
+    for label, value in [
+        ('Total recebido dos alunos', total_amount),
+        ('Total de comissões', total_commission),
+        ('Total transferido (aprovado)', total_transferred),
+        ('Saldo', total_commission - total_transferred),
+    ]:
+        summary_sheet.append([label, _cell(summary_sheet, value, number_format=MONEY_FORMAT)])
+
+    output = tempfile.TemporaryFile()
+    workbook.save(output)
+    output.seek(0)
+    return output
@@ -0,0 +1,452 @@
+import io
+import threading
+import unittest
+from datetime import date, timedelta
+from decimal import Decimal
+
+import openpyxl
+from django.conf import settings
+from django.db import connection
+from asgiref.sync import async_to_sync
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth.models import User
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework import status
+from physiotherapist.models import Physiotherapist
+from core.idempotency import purge_expired_keys
+from core.models import IdempotencyKey
+from modality.models import Modality
+from student.models import Student
+from .models import Payment, ClinicCommissionPayment, MonthlySnapshot
+from .reports import abuild_dashboard_summary, build_dashboard_summary
+from .periods import in_month, month_range, parse_month, shift_month, status_reference_month
+
+
+class PeriodTests(TestCase):
+    def test_shift_month_crosses_years(self):
+        self.assertEqual(shift_month(2024, 12, 1), (2025, 1))
+        self.assertEqual(shift_month(2024, 1, -1), (2023, 12))
+        self.assertEqual(shift_month(2024, 3, -15), (2022, 12))
+
+    def test_month_range_is_half_open(self):
+        self.assertEqual(month_range(2024, 12), (date(2024, 12, 1), date(2025, 1, 1)))
+
+    def test_parse_month_rejects_years_out_of_range(self):
+        self.assertEqual(parse_month('9998-12'), (9998, 12))
+        for value in ['9999-12', '0000-01', '2024-13']:
+            with self.assertRaises(ValueError):
+                parse_month(value)
+
+    def test_status_reference_month(self):
+        self.assertEqual(status_reference_month('PRE', 2024, 1), (2024, 1))
+        self.assertEqual(status_reference_month('POS', 2024, 1), (2023, 12))
+
+
+class CommissionStatementTests(TestCase):
+    def setUp(self):
+        self.physio_user = User.objects.create_user(
+            username='physiotherapist',
+            password='physiopass123',
+            first_name='Test',
+            last_name='Physio'
+        )
+        self.physiotherapist = Physiotherapist.objects.create(
+            user=self.physio_user,
+            crefito='12345',
+            phone='11999999999',
+            specialization='General'
+        )
+        self.modality = Modality.objects.create(name='Pilates', price=Decimal('200.00'))
+        self.student = Student.objects.create(
+            name='Aluno',
+            physiotherapist=self.physiotherapist,
+            modality=self.modality,
+            commission=Decimal('50.00')
+        )
+        for payment_date in (date(2024, 1, 10), date(2024, 1, 20), date(2024, 2, 5)):
+            Payment.objects.create(
+                student=self.student,
+                modality=self.modality,
+                amount=Decimal('200.00'),
+                payment_date=payment_date,
+                reference_month=payment_date.replace(day=1)
+            )
+        ClinicCommissionPayment.objects.create(
+            physiotherapist=self.physiotherapist,
+            transfer_date=date(2024, 2, 1),
+            total_commission_due=Decimal('200.00'),
+            amount_paid=Decimal('200.00'),
+            description='Janeiro',
+            status='approved'
+        )
+
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.physio_user)
+
+    def test_statement_has_monthly_subtotals(self):
+        response = self.client.get('/api/payments/commission/statement/', {'start': '2024-01', 'end': '2024-02'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        workbook = openpyxl.load_workbook(io.BytesIO(b''.join(response.streaming_content)))
+        rows = list(workbook['Pagamentos'].iter_rows(min_row=2, values_only=True))
+        subtotals = {row[3]: (row[4], row[6]) for row in rows if row[3] and str(row[3]).startswith(('Subtotal', 'Total'))}
+
+        self.assertEqual(subtotals['Subtotal 01/2024'], (400, 200))
+        self.assertEqual(subtotals['Subtotal 02/2024'], (200, 100))
+        self.assertEqual(subtotals['Total'], (600, 300))
+
+        summary = {row[0]: row[1] for row in workbook['Resumo'].iter_rows(values_only=True)}
+        self.assertEqual(summary['Total transferido (aprovado)'], 200)
+        self.assertEqual(summary['Saldo'], 100)
+
+    def test_statement_rejects_inverted_range(self):
+        response = self.client.get('/api/payments/commission/statement/', {'start': '2024-03', 'end': '2024-01'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_last_representable_month_is_rejected(self):
+        response = self.client.get('/api/payments/commission/statement/', {'start': '2024-01', 'end': '9999-12'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get('/api/payments/summary/', {'month_year': '9999-12'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class MonthlySnapshotTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='physiotherapist', password='physiopass123')
+        self.physiotherapist = Physiotherapist.objects.create(
+            user=self.user, crefito='12345', phone='11999999999', specialization='General'
+        )
+        self.modality = Modality.objects.create(name='Pilates', price=Decimal('200.00'))
+        self.student = Student.objects.create(
+            name='Aluno', physiotherapist=self.physiotherapist, modality=self.modality, payment_type='PRE'
+        )
+        Student.objects.filter(pk=self.student.pk).update(registration_date=date(2020, 1, 1))
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def get_summary(self):
+        return self.client.get('/api/payments/summary/', {'month_year': '2024-03'}).json()
+
+    def create_payment(self):
+        return Payment.objects.create(
+            student=self.student,
+            modality=self.modality,
+            amount=Decimal('200.00'),
+            payment_date=date(2024, 3, 5),
+            reference_month=date(2024, 3, 1)
+        )
+
+    def test_closed_month_is_read_from_snapshot(self):
+        first = self.get_summary()
+        self.assertTrue(MonthlySnapshot.objects.filter(
+            physiotherapist=self.physiotherapist, month=date(2024, 3, 1)
+        ).exists())
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.get_summary(), first)
+
+    def test_snapshot_has_same_types_as_live_summary(self):
+        self.create_payment()
+        self.get_summary()
+        snapshot = self.get_summary()
+        live = self.client.get('/api/payments/summary/', {'month_year': date.today().strftime('%Y-%m')}).json()
+
+        # Tipos do JSON: int e float são ambos number
+        def json_types(data):
+            return {key: 'number' if isinstance(value, (int, float)) else type(value) for key, value in data.items()}
+
+        self.assertEqual(json_types(snapshot), json_types(live))
+        self.assertIsInstance(snapshot['totalExpectedValue'], float)
+
+    def test_backdated_payment_discards_snapshot(self):
+        self.assertEqual(self.get_summary()['paidStudents'], 0)
+
+        payment = self.create_payment()
+        self.assertFalse(MonthlySnapshot.objects.exists())
+        self.assertEqual(self.get_summary()['paidStudents'], 1)
+
+        payment.delete()
+        self.assertEqual(self.get_summary()['paidStudents'], 0)
+
+    def test_payment_with_string_dates(self):
+        self.assertEqual(self.get_summary()['paidStudents'], 0)
+        Payment.objects.create(
+            student=self.student, modality=self.modality, amount=Decimal('200.00'),
+            payment_date='2024-03-05', reference_month='2024-03-01'
+        )
+        self.assertFalse(MonthlySnapshot.objects.exists())
+
+    def test_current_month_is_not_snapshotted(self):
+        self.client.get('/api/payments/summary/', {'month_year': date.today().strftime('%Y-%m')})
+        self.assertFalse(MonthlySnapshot.objects.exists())
+
+
+class AsyncDashboardTests(TransactionTestCase):
+    # As partes do resumo assíncrono rodam em outras threads/conexões, que só
+    # enxergam dados efetivamente gravados (sem a transação do TestCase)
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='adminpass123', is_staff=True)
+        self.user = User.objects.create_user(username='physiotherapist', password='physiopass123')
+        self.physiotherapist = Physiotherapist.objects.create(
+            user=self.user, crefito='12345', phone='11999999999', specialization='General'
+        )
+        modality = Modality.objects.create(name='Pilates', price=Decimal('200.00'))
+        today = date.today()
+        for index, payment_type in enumerate(['PRE', 'POS', 'PRE']):
+            student = Student.objects.create(
+                name=f'Aluno {index}', physiotherapist=self.physiotherapist, modality=modality,
+                payment_type=payment_type, payment_day=1, commission=Decimal('30.00')
+            )
+            Student.objects.filter(pk=student.pk).update(registration_date=date(2020, 1, 1))
+            if index < 2:
+                Payment.objects.create(
+                    student=student, modality=modality, amount=Decimal('200.00'),
+                    payment_date=today, reference_month=today.replace(day=1)
+                )
+        ClinicCommissionPayment.objects.create(
+            physiotherapist=self.physiotherapist, total_commission_due=Decimal('120.00'), amount_paid=Decimal('60.00'),
+            transfer_date=today, status='approved'
+        )
+
+    def assertSamePayload(self, is_staff, physiotherapist=None):
+        expected = build_dashboard_summary(is_staff, physiotherapist)
+        self.assertEqual(async_to_sync(abuild_dashboard_summary)(is_staff, physiotherapist), expected)
+
+    def test_admin_payload_matches_sync_version(self):
+        self.assertSamePayload(True)
+
+    def test_physiotherapist_payload_matches_sync_version(self):
+        self.assertSamePayload(False, self.physiotherapist)
+
+    def test_parallel_parts_share_a_bounded_pool(self):
+        self.assertSamePayload(True)
+        self.assertSamePayload(False, self.physiotherapist)
+        threads = [thread for thread in threading.enumerate() if thread.name.startswith('dashboard')]
+        self.assertTrue(1 <= len(threads) <= settings.DASHBOARD_QUERY_THREADS)
+
+    def test_async_endpoint(self):
+        client = APIClient()
+        self.assertEqual(client.get('/api/payments/dashboard_summary/async/').status_code, status.HTTP_403_FORBIDDEN)
+        client.force_login(self.user)
+        self.assertEqual(client.post('/api/payments/dashboard_summary/async/').status_code,
+                         status.HTTP_405_METHOD_NOT_ALLOWED)
+
+        response = client.get('/api/payments/dashboard_summary/async/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), client.get('/api/payments/dashboard_summary/').json())
+
+    def test_async_endpoint_in_batch(self):
+        client = APIClient()
+        client.force_login(self.user)
+        response = client.post('/api/batch/', {'requests': ['/api/payments/dashboard_summary/async/']}, format='json')
+
+        item = response.json()['responses'][0]
+        self.assertEqual(item['status'], status.HTTP_200_OK)
+        self.assertEqual(item['data'], client.get('/api/payments/dashboard_summary/').json())
+
+
+class ReportPermissionTests(TestCase):
+    def test_user_without_physiotherapist_is_forbidden(self):
+        client = APIClient()
+        client.force_authenticate(user=User.objects.create_user(username='semfisio', password='semfisio123'))
+
+        for url in ['/api/payments/dashboard_summary/', '/api/payments/summary/?month_year=2024-01']:
+            self.assertEqual(client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'Planos de execução verificados apenas no PostgreSQL')
+class QueryPlanTests(TestCase):
+    """
+    Garante que as consultas dos resumos, do dashboard e das comissões
+    continuam usando os índices compostos. O seq scan é desabilitado para
+    que o planejador só recorra a ele quando nenhum índice for aplicável.
+    """
+    PHYSIOTHERAPISTS = 5
+    STUDENTS_PER_PHYSIOTHERAPIST = 80
+    MONTHS = 24
+
+    @classmethod
+    def setUpTestData(cls):
+        monthly = Modality.objects.create(name='Pilates', price=Decimal('200.00'))
+        session = Modality.objects.create(name='Sessão', price=Decimal('90.00'), payment_type='SESSION')
+
+        cls.physiotherapists = []
+        students = []
+        for i in range(cls.PHYSIOTHERAPISTS):
+            user = User.objects.create_user(username=f'physio{i}', password='physiopass123')
+            physio = Physiotherapist.objects.create(user=user, crefito=f'{i:05d}', phone='', specialization='')
+            cls.physiotherapists.append(physio)
+            for j in range(cls.STUDENTS_PER_PHYSIOTHERAPIST):
+                students.append(Student(
+                    name=f'Aluno {i}-{j}',
+                    physiotherapist=physio,
+                    modality=monthly if j % 5 else session,
+                    payment_type='PRE' if j % 2 else 'POS',
+                    payment_day=(j % 28) + 1,
+                    active=j % 10 != 0
+                ))
+        students = Student.objects.bulk_create(students)
+
+        payments = []
+        transfers = []
+        for offset in range(cls.MONTHS):
+            year, month = 2023 + offset // 12, offset % 12 + 1
+            for student in students:
+                payments.append(Payment(
+                    student=student,
+                    modality=student.modality,
+                    amount=student.modality.price,
+                    payment_date=date(year, month, (student.id % 28) + 1),
+                    reference_month=date(year, month, 1)
+                ))
+            for physio in cls.physiotherapists:
+                transfers.append(ClinicCommissionPayment(
+                    physiotherapist=physio,
+                    transfer_date=date(year, month, 10),
+                    total_commission_due=Decimal('1000.00'),
+                    amount_paid=Decimal('1000.00'),
+                    description='Repasse',
+                    status='approved'
+                ))
+        Payment.objects.bulk_create(payments, batch_size=5000)
+        ClinicCommissionPayment.objects.bulk_create(transfers)
+        cls.student = students[1]
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def setUp(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SET enable_seqscan = off')
+
+    def tearDown(self):
+        with connection.cursor() as cursor:
+            cursor.execute('RESET enable_seqscan')
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan, msg=plan)
+
+    def test_student_reference_month_uses_index(self):
+        # student_payment_status / StudentSerializer.get_payment_status
+        queryset = Payment.objects.filter(in_month('reference_month', 2024, 3), student=self.student)
+        self.assertUsesIndex(queryset, 'payment_pay_student_4c981e_idx')
+
+    def test_payment_date_month_uses_index(self):
+        # dashboard_summary (pagamentos do mês de todos os alunos)
+        queryset = Payment.objects.filter(in_month('payment_date', 2024, 3))
+        self.assertUsesIndex(queryset, 'payment_pay_payment_553fa4_idx')
+
+    def test_active_students_of_physiotherapist_use_index(self):
+        # summary / dashboard_summary para fisioterapeutas
+        queryset = Student.objects.filter(physiotherapist=self.physiotherapists[0], active=True)
+        self.assertUsesIndex(queryset, 'student_stu_physiot_5ee2c1_idx')
+
+    def test_approved_transfers_use_index(self):
+        queryset = ClinicCommissionPayment.objects.filter(
+            in_month('transfer_date', 2024, 3),
+            physiotherapist=self.physiotherapists[0],
+            status='approved'
+        )
+        self.assertUsesIndex(queryset, 'payment_cli_physiot_f01ead_idx')
+
+
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='physiotherapist', password='physiopass123')
+        self.physiotherapist = Physiotherapist.objects.create(
+            user=self.user, crefito='12345', phone='11999999999', specialization='General'
+        )
+        self.modality = Modality.objects.create(name='Pilates', price=Decimal('200.00'), payment_type='MONTHLY')
+        self.student = Student.objects.create(
+            name='Aluno', physiotherapist=self.physiotherapist, modality=self.modality
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.payment = {
+            'student': self.student.id,
+            'modality': self.modality.id,
+            'amount': '200.00',
+            'payment_date': '2024-03-05',
+            'reference_month': '2024-03-01',
+        }
+
+    def post(self, url, data, key):
+        return self.client.post(url, data, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_response(self):
+        first = self.post('/api/payments/', self.payment, 'retry-1')
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+
+        with CaptureQueriesContext(connection) as queries:
+            retry = self.post('/api/payments/', self.payment, 'retry-1')
+        statements = [query['sql'].split()[0] for query in queries.captured_queries]
+        # Reserva recusada pela chave única e leitura da resposta guardada, além dos savepoints
+        self.assertEqual([sql for sql in statements if sql not in ('SAVEPOINT', 'RELEASE', 'ROLLBACK')],
+                         ['INSERT', 'SELECT'])
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Payment.objects.count(), 1)
+
+    def test_key_reused_with_other_request(self):
+        self.post('/api/payments/', self.payment, 'reused')
+        response = self.post('/api/payments/', dict(self.payment, amount='150.00'), 'reused')
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(Payment.objects.count(), 1)
+
+    def test_failed_request_does_not_store_key(self):
+        invalid = dict(self.payment, amount='')
+        self.assertEqual(self.post('/api/payments/', invalid, 'fix-and-retry').status_code, 400)
+        # Corrigido, o reenvio com a mesma chave cria o pagamento
+        response = self.post('/api/payments/', self.payment, 'fix-and-retry')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn('Idempotent-Replayed', response)
+
+    def test_duplicate_monthly_payment_is_rejected(self):
+        self.assertEqual(self.post('/api/payments/', self.payment, 'first').status_code, 201)
+        response = self.post('/api/payments/', dict(self.payment, payment_date='2024-03-06'), 'second')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('reference_month', response.data)
+
+    def test_duplicate_check_locks_the_student(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post('/api/payments/', self.payment, format='json')
+        statements = [query['sql'] for query in queries.captured_queries]
+        # Transação aberta antes da validação e aluno travado logo antes da busca por duplicatas
+        self.assertEqual(statements[0].split()[0], 'SAVEPOINT')
+        check = next(i for i, sql in enumerate(statements) if sql.startswith('SELECT') and 'FROM "payment_payment"' in sql)
+        lock = statements[check - 1]
+        self.assertIn('FROM "student_student"', lock)
+        if connection.features.has_select_for_update:
+            self.assertIn('FOR UPDATE', lock)
+
+    def test_commission_and_schedule_creation(self):
+        commission = {
+            'physiotherapist': self.physiotherapist.id, 'transfer_date': '2024-03-05',
+            'total_commission_due': '100.00', 'amount_paid': '100.00', 'description': 'Repasse',
+        }
+        schedule = {'student': self.student.id, 'weekday': 0, 'hour': 8}
+        for url, data in [('/api/payments/commission/', commission), ('/api/schedules/', schedule)]:
+            first = self.post(url, data, f'{url}-1')
+            self.assertEqual(first.status_code, status.HTTP_201_CREATED, first.data)
+            self.assertEqual(self.post(url, data, f'{url}-1').data, first.data)
+        self.assertEqual(ClinicCommissionPayment.objects.count(), 1)
+        self.assertEqual(self.student.schedules.count(), 1)
+
+    def test_keys_are_per_user(self):
+        self.post('/api/payments/', self.payment, 'shared')
+        other = User.objects.create_superuser(username='admin', password='adminpass123')
+        self.client.force_authenticate(user=other)
+        response = self.post('/api/payments/', dict(self.payment, reference_month='2024-04-01'), 'shared')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn('Idempotent-Replayed', response)
+
+    def test_expired_keys_are_purged(self):
+        self.post('/api/payments/', self.payment, 'old')
+        IdempotencyKey.objects.update(created_at=timezone.now() - timedelta(hours=48))
+        self.post('/api/payments/', dict(self.payment, reference_month='2024-04-01'), 'new')
+        purge_expired_keys()
+        self.assertEqual(list(IdempotencyKey.objects.values_list('key', flat=True)), ['new'])
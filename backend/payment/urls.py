@@ -1,11 +1,12 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import PaymentViewSet, ClinicCommissionPaymentViewSet
+from .views import PaymentViewSet, ClinicCommissionPaymentViewSet, dashboard_summary_async
 
 router = DefaultRouter()
 router.register(r'commission', ClinicCommissionPaymentViewSet, basename='commission-payments')
 router.register('', PaymentViewSet, basename='payments')
 
 urlpatterns = [
+    path('dashboard_summary/async/', dashboard_summary_async, name='payments-dashboard-summary-async'),
     path('', include(router.urls)),
 ]
@@ -6,6 +6,7 @@ from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from django.shortcuts import get_object_or_404
 from .models import Physiotherapist
 from .serializers import PhysiotherapistSerializer
+from core.conditional import conditional_response, make_etag, queryset_fingerprint
 
 from django.core.exceptions import ValidationError
 from django.contrib.auth.password_validation import validate_password
@@ -15,8 +16,12 @@ from django.contrib.auth.password_validation import validate_password
 def physiotherapist_list_create(request):
     if request.method == 'GET':
         physiotherapists = Physiotherapist.objects.all()
-        serializer = PhysiotherapistSerializer(physiotherapists, many=True)
-        return Response(serializer.data)
+        count, last_modified = queryset_fingerprint(physiotherapists)
+        return conditional_response(
+            request, make_etag(count, last_modified),
+            lambda: Response(PhysiotherapistSerializer(physiotherapists, many=True).data),
+            last_modified,
+        )
     
     elif request.method == 'POST':
         serializer = PhysiotherapistSerializer(data=request.data)
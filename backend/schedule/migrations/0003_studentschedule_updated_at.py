@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-19 12:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schedule', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studentschedule',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
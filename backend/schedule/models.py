@@ -27,7 +27,8 @@ class StudentSchedule(models.Model):
         choices=HOUR_CHOICES,
         verbose_name='Horário'
     )
-    
+    updated_at = models.DateTimeField(auto_now=True)
+
     class Meta:
         verbose_name = 'Horário do Aluno'
         verbose_name_plural = 'Horários dos Alunos'
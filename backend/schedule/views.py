@@ -4,27 +4,24 @@ from rest_framework.permissions import IsAuthenticated
 from .models import StudentSchedule
 from .serializers import StudentScheduleSerializer
 from student.models import Student
+from core.idempotency import idempotent
+from core.roles import PhysiotherapistScopedMixin
 
-class StudentScheduleViewSet(viewsets.ModelViewSet):
+class StudentScheduleViewSet(PhysiotherapistScopedMixin, viewsets.ModelViewSet):
     queryset = StudentSchedule.objects.all()
     serializer_class = StudentScheduleSerializer
     permission_classes = [IsAuthenticated]
-    
+    # Fisioterapeutas veem apenas os horários de seus alunos
+    physiotherapist_lookup = 'student__physiotherapist'
+
     def get_queryset(self):
-        queryset = StudentSchedule.objects.all()
-        if not self.request.user.is_staff:
-            # Se o usuário é um fisioterapeuta, mostrar apenas os horários de seus alunos
-            try:
-                physiotherapist = self.request.user.physiotherapist
-                queryset = queryset.filter(student__physiotherapist=physiotherapist)
-            except:
-                queryset = StudentSchedule.objects.none()
-                
+        queryset = super().get_queryset()
         student_id = self.request.query_params.get('student', None)
         if student_id is not None:
             queryset = queryset.filter(student_id=student_id)
         return queryset
         
+    @idempotent
     def create(self, request, *args, **kwargs):
         # Verificar se o aluno tem modalidade mensal
         try:
@@ -0,0 +1,171 @@
+"""
+Teste de carga simples para comparar configurações do gunicorn.
+
+Sem --config, mede um servidor já em execução em --base-url. Com uma ou mais
+opções --config, sobe o gunicorn (gunicorn.conf.py) para cada conjunto de
+variáveis de ambiente, mede e imprime a comparação:
+
+    python scripts/loadtest.py --username admin --password senha \\
+        --config "padrao:GUNICORN_WORKER_CLASS=sync,GUNICORN_WORKERS=1" \\
+        --config "gthread:GUNICORN_WORKERS=3,GUNICORN_THREADS=4"
+"""
+import argparse
+import http.client
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def login(base_url, username, password):
+    """Autentica via /api/auth/login/ e retorna o cabeçalho Cookie da sessão"""
+    url = urlsplit(base_url)
+    conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=10)
+    body = json.dumps({'username': username, 'password': password})
+    conn.request('POST', '/api/auth/login/', body=body, headers={'Content-Type': 'application/json'})
+    response = conn.getresponse()
+    response.read()
+    if response.status != 200:
+        raise SystemExit(f'Falha no login ({response.status})')
+    cookies = [header.split(';', 1)[0] for name, header in response.getheaders() if name.lower() == 'set-cookie']
+    conn.close()
+    return '; '.join(cookies)
+
+
+def worker(base_url, paths, cookie, deadline, results, errors):
+    url = urlsplit(base_url)
+    conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=60)
+    headers = {'Cookie': cookie, 'Accept': 'application/json'}
+    i = 0
+    while time.monotonic() < deadline:
+        path = paths[i % len(paths)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            conn.request('GET', path, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            if response.status >= 400:
+                errors.append(response.status)
+            else:
+                results.append((time.perf_counter() - start) * 1000)
+            if response.will_close:
+                # Workers sync não mantêm a conexão aberta
+                conn.close()
+                conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=60)
+        except (OSError, http.client.HTTPException) as exc:
+            errors.append(type(exc).__name__)
+            conn.close()
+            conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=60)
+    conn.close()
+
+
+def run_load(base_url, paths, cookie, concurrency, duration):
+    results, errors = [], []
+    deadline = time.monotonic() + duration
+    threads = [
+        threading.Thread(target=worker, args=(base_url, paths, cookie, deadline, results, errors))
+        for _ in range(concurrency)
+    ]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    if not results:
+        return {'requests': 0, 'errors': len(errors), 'rps': 0, 'p50': 0, 'p95': 0, 'p99': 0}
+    quantiles = statistics.quantiles(results, n=100) if len(results) > 1 else results * 99
+    return {
+        'requests': len(results),
+        'errors': len(errors),
+        'rps': len(results) / elapsed,
+        'p50': quantiles[49],
+        'p95': quantiles[94],
+        'p99': quantiles[98],
+    }
+
+
+def wait_until_ready(base_url, timeout=30):
+    url = urlsplit(base_url)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=2)
+            conn.request('GET', '/api/auth/login/')
+            conn.getresponse().read()
+            conn.close()
+            return
+        except OSError:
+            time.sleep(0.3)
+    raise SystemExit(f'Servidor não respondeu em {timeout}s')
+
+
+def start_gunicorn(env_overrides, port):
+    env = {**os.environ, **env_overrides}
+    return subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', 'app.wsgi:application',
+         '-c', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{port}',
+         '--access-logfile', '/dev/null'],
+        cwd=BACKEND_DIR,
+        env=env,
+    )
+
+
+def parse_config(value):
+    """'nome:CHAVE=valor,CHAVE=valor' -> (nome, {CHAVE: valor})"""
+    name, _, assignments = value.partition(':')
+    env = dict(item.split('=', 1) for item in assignments.split(',') if item)
+    return name, env
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+    parser.add_argument('--path', action='append', dest='paths',
+                        help='Endpoint a ser chamado (pode repetir). Padrão: modalidades, alunos e dashboard')
+    parser.add_argument('--username', required=True)
+    parser.add_argument('--password', required=True)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--duration', type=int, default=15, help='Segundos de carga por configuração')
+    parser.add_argument('--config', action='append', default=[], help='nome:VAR=valor,... para subir o gunicorn')
+    parser.add_argument('--port', type=int, default=8765, help='Porta usada com --config')
+    args = parser.parse_args()
+
+    paths = args.paths or ['/api/modalities/', '/api/students/', '/api/payments/dashboard_summary/']
+
+    rows = []
+    if not args.config:
+        cookie = login(args.base_url, args.username, args.password)
+        rows.append((args.base_url, run_load(args.base_url, paths, cookie, args.concurrency, args.duration)))
+    else:
+        base_url = f'http://127.0.0.1:{args.port}'
+        for value in args.config:
+            name, env = parse_config(value)
+            process = start_gunicorn(env, args.port)
+            try:
+                wait_until_ready(base_url)
+                cookie = login(base_url, args.username, args.password)
+                run_load(base_url, paths, cookie, args.concurrency, 2)  # Aquecimento
+                rows.append((name, run_load(base_url, paths, cookie, args.concurrency, args.duration)))
+            finally:
+                process.terminate()
+                process.wait()
+
+    print(f'{args.concurrency} clientes, {args.duration}s, endpoints: {", ".join(paths)}')
+    print(f'{"Configuração":<24} {"req/s":>8} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"total":>7} {"erros":>6}')
+    for name, result in rows:
+        print(f'{name:<24} {result["rps"]:>8.1f} {result["p50"]:>8.1f} {result["p95"]:>8.1f} '
+              f'{result["p99"]:>8.1f} {result["requests"]:>7} {result["errors"]:>6}')
+
+
+if __name__ == '__main__':
+    main()
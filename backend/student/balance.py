@@ -0,0 +1,102 @@
+"""
+Saldo dos alunos por sessão gravado no Student (``total_paid`` e
+``remaining_value``), em vez de somar todos os pagamentos do aluno a cada
+leitura do status.
+
+Cada pagamento criado, alterado ou removido aplica a diferença com um UPDATE
+atômico (``F('total_paid') + valor``), sem ler o saldo antes, então gravações
+concorrentes não se perdem. Mudanças no preço da modalidade recalculam o
+restante dos alunos dela. Alterações feitas sem sinais (``queryset.update``,
+``bulk_create``, SQL direto) são corrigidas pelo comando ``check_balances``.
+"""
+from decimal import Decimal
+
+from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from modality.models import Modality
+from payment.models import Payment
+
+from .models import Student, remaining_value_expression
+
+MONEY = DecimalField(max_digits=10, decimal_places=2)
+
+
+def session_total_expression(price):
+    """Quantidade de sessões do aluno vezes ``price`` (valor ou expressão), em SQL"""
+    return ExpressionWrapper(Coalesce(F('session_quantity'), 0) * price, output_field=MONEY)
+
+
+def adjust(student_id, amount):
+    """Soma ``amount`` (negativo para estornar) ao total pago do aluno"""
+    if student_id is None or not amount:
+        return
+    Student.objects.filter(pk=student_id).update(
+        total_paid=F('total_paid') + amount,
+        remaining_value=F('remaining_value') - amount,
+    )
+
+
+def balance_expressions():
+    """Saldo recalculado a partir dos pagamentos, para ``update`` ou ``annotate``"""
+    paid = Payment.objects.filter(student=OuterRef('pk')).values('student').annotate(total=Sum('amount')).values('total')
+    price = Modality.objects.filter(pk=OuterRef('modality_id')).values('price')
+    total_paid = Coalesce(Subquery(paid), Value(Decimal('0')), output_field=MONEY)
+    total_value = session_total_expression(Coalesce(Subquery(price), Value(Decimal('0')), output_field=MONEY))
+    return {
+        'total_paid': total_paid,
+        'remaining_value': ExpressionWrapper(total_value - total_paid, output_field=MONEY),
+    }
+
+
+def out_of_sync(queryset):
+    """Alunos cujo saldo gravado difere do recalculado"""
+    expected = {f'expected_{name}': expression for name, expression in balance_expressions().items()}
+    return queryset.annotate(**expected).exclude(
+        total_paid=F('expected_total_paid'), remaining_value=F('expected_remaining_value')
+    )
+
+
+def recompute(queryset):
+    """Recalcula o saldo dos alunos em um único UPDATE; retorna quantos foram gravados"""
+    return queryset.update(**balance_expressions())
+
+
+@receiver(pre_save, sender=Payment)
+def remember_previous_amount(sender, instance, raw=False, **kwargs):
+    if raw or instance.pk is None:
+        return
+    instance._previous_balance = Payment.objects.filter(pk=instance.pk).values_list('student_id', 'amount').first()
+
+
+@receiver(post_save, sender=Payment)
+def apply_payment(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    amount = Decimal(str(instance.amount))
+    previous = getattr(instance, '_previous_balance', None)
+    instance._previous_balance = None
+    if previous is None:
+        adjust(instance.student_id, amount)
+    elif previous[0] == instance.student_id:
+        adjust(instance.student_id, amount - previous[1])
+    else:
+        # Pagamento transferido para outro aluno
+        adjust(previous[0], -previous[1])
+        adjust(instance.student_id, amount)
+
+
+@receiver(post_delete, sender=Payment)
+def revert_payment(sender, instance, **kwargs):
+    adjust(instance.student_id, -Decimal(str(instance.amount)))
+
+
+@receiver(post_save, sender=Modality)
+def reprice_students(sender, instance, created, raw=False, **kwargs):
+    if raw or created:
+        return
+    Student.objects.filter(modality=instance).update(
+        remaining_value=remaining_value_expression(session_total_expression(Value(Decimal(str(instance.price)))))
+    )
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from student.balance import out_of_sync, recompute
+from student.models import Student
+
+
+class Command(BaseCommand):
+    help = (
+        'Confere o saldo gravado dos alunos (total pago e valor restante) com os '
+        'pagamentos e recalcula, em um único UPDATE, os que estiverem divergentes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Só lista as divergências, sem gravar')
+        parser.add_argument('--all', action='store_true', help='Recalcula todos os alunos, divergentes ou não')
+        parser.add_argument('--show', type=int, default=20, help='Quantidade de divergências listadas')
+
+    def handle(self, *args, **options):
+        stale = out_of_sync(Student.objects.all()).order_by('pk')
+        ids = list(stale.values_list('pk', flat=True))
+        for student in stale[:options['show']]:
+            self.stdout.write(
+                f'  {student.pk} {student.name}: total pago {student.total_paid} -> {student.expected_total_paid}, '
+                f'restante {student.remaining_value} -> {student.expected_remaining_value}'
+            )
+        self.stdout.write(f'{len(ids)} alunos com saldo divergente.')
+        if options['dry_run']:
+            return
+
+        queryset = Student.objects.all() if options['all'] else Student.objects.filter(pk__in=ids)
+        updated = recompute(queryset) if options['all'] or ids else 0
+        self.stdout.write(self.style.SUCCESS(f'{updated} saldos recalculados.'))
@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-19 11:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('modality', '0004_alter_modality_options_modality_payment_type'),
+        ('physiotherapist', '0001_initial'),
+        ('student', '0009_remove_student_payment_date_student_payment_day'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['physiotherapist', 'active'], name='student_stu_physiot_5ee2c1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['modality', 'active'], name='student_stu_modalit_7132d2_idx'),
+        ),
+    ]
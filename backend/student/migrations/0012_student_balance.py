@@ -0,0 +1,48 @@
+# Generated by Django 5.2 on 2026-10-19 13:01
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_balances(apps, schema_editor):
+    # Mesmo cálculo de student.balance.balance_expressions, com os modelos históricos
+    Student = apps.get_model('student', 'Student')
+    Payment = apps.get_model('payment', 'Payment')
+    Modality = apps.get_model('modality', 'Modality')
+    money = DecimalField(max_digits=10, decimal_places=2)
+    paid = Payment.objects.filter(student=OuterRef('pk')).values('student').annotate(total=Sum('amount')).values('total')
+    price = Modality.objects.filter(pk=OuterRef('modality_id')).values('price')
+    total_paid = Coalesce(Subquery(paid), Value(Decimal('0')), output_field=money)
+    total_value = ExpressionWrapper(
+        Coalesce(F('session_quantity'), 0) * Coalesce(Subquery(price), Value(Decimal('0')), output_field=money),
+        output_field=money
+    )
+    Student.objects.update(
+        total_paid=total_paid,
+        remaining_value=ExpressionWrapper(total_value - total_paid, output_field=money),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('student', '0011_student_updated_at'),
+        ('payment', '0008_cliniccommissionpayment_updated_at'),
+        ('modality', '0004_alter_modality_options_modality_payment_type'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='student',
+            name='remaining_value',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0'), editable=False, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='total_paid',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0'), editable=False, max_digits=10),
+        ),
+        migrations.RunPython(fill_balances, migrations.RunPython.noop),
+    ]
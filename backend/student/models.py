@@ -1,15 +1,26 @@
+from decimal import Decimal
+
 from django.db import models
+from django.db.models import ExpressionWrapper, F, Value
 from django.conf import settings
 from django.core.validators import MinValueValidator, MaxValueValidator
 from physiotherapist.models import Physiotherapist
 from modality.models import Modality
 
+def remaining_value_expression(total_value):
+    """Valor restante em SQL: ``total_value`` menos o total pago gravado no aluno"""
+    return ExpressionWrapper(
+        total_value - F('total_paid'), output_field=models.DecimalField(max_digits=10, decimal_places=2)
+    )
+
+
 class Student(models.Model):
     name = models.CharField(max_length=100)
     email = models.EmailField(blank=True, null=True)
     phone = models.CharField(max_length=20, blank=True, null=True)
     date_of_birth = models.DateField(blank=True, null=True)
     registration_date = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     active = models.BooleanField(default=True)
     notes = models.TextField(blank=True, null=True)
     
@@ -67,13 +78,49 @@ class Student(models.Model):
         ]
     )
 
+    # Saldo dos pagamentos por sessão, mantido com UPDATEs atômicos (F()) a
+    # cada pagamento criado, alterado ou removido (ver student.balance)
+    total_paid = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0'), editable=False)
+    remaining_value = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0'), editable=False)
+    BALANCE_FIELDS = ('total_paid', 'remaining_value')
+
     def __str__(self):
         return self.name
 
-    class Meta:
-        ordering = ['name']    
-        def __str__(self):
-            return self.name
+    def session_total_value(self):
+        """Valor das sessões contratadas (zero sem quantidade ou modalidade)"""
+        if not self.session_quantity or self.modality_id is None:
+            return Decimal('0')
+        return self.session_quantity * self.modality.price
+
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            self.remaining_value = self.session_total_value() - self.total_paid
+        self._balance_recomputed = False
+        super().save(*args, **kwargs)
+        if self._balance_recomputed:
+            self.refresh_from_db(fields=self.BALANCE_FIELDS)
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        recompute = update_fields is None and not self._state.adding
+        if recompute:
+            # O saldo em memória pode estar desatualizado: um save completo não grava
+            # o total pago e recalcula o restante no banco. Sem a linha (removida em
+            # paralelo), o Django segue para o INSERT como em qualquer save
+            total_value = Value(self.session_total_value())
+            values = [
+                (field, model, remaining_value_expression(total_value) if field.name == 'remaining_value' else value)
+                for field, model, value in values if field.name != 'total_paid'
+            ]
+        updated = super()._do_update(base_qs, using, pk_val, values, update_fields, forced_update)
+        self._balance_recomputed = updated and recompute
+        return updated
 
     class Meta:
         ordering = ['name']
+        indexes = [
+            # Alunos ativos de um fisioterapeuta
+            models.Index(fields=['physiotherapist', 'active']),
+            # Alunos ativos por modalidade (filtros por modality__payment_type)
+            models.Index(fields=['modality', 'active']),
+        ]
@@ -1,10 +1,29 @@
 from datetime import datetime
+from django.db.models import BooleanField, Case, Exists, OuterRef, When
 from rest_framework import serializers
 from .models import Student
 from physiotherapist.models import Physiotherapist
 from physiotherapist.serializers import PhysiotherapistSerializer
 from modality.serializers import ModalitySerializer
 from payment.models import Payment
+from payment.periods import in_month, status_reference_month
+
+def serializer_queryset(queryset, today=None):
+    """
+    ``queryset`` de alunos com o que o StudentSerializer lê de cada um:
+    relações, horários e se o mês de referência do status está pago
+    """
+    today = today or datetime.now()
+
+    def paid(payment_type):
+        year, month = status_reference_month(payment_type, today.year, today.month)
+        return Exists(Payment.objects.filter(in_month('reference_month', year, month), student=OuterRef('pk')))
+
+    return queryset.select_related('modality', 'physiotherapist__user').prefetch_related('schedules').annotate(
+        paid_reference_month=Case(When(payment_type='PRE', then=paid('PRE')), default=paid('POS'),
+                                  output_field=BooleanField())
+    )
+
 
 class StudentSerializer(serializers.ModelSerializer):
     physiotherapist_details = PhysiotherapistSerializer(source='physiotherapist', read_only=True)
@@ -28,28 +47,18 @@ class StudentSerializer(serializers.ModelSerializer):
         if obj.modality.payment_type == 'MONTHLY':
             # Get current month and year
             today = datetime.now()
-            current_year = today.year
-            current_month = today.month
             current_day = today.day
 
-            # Determine reference month based on payment type
-            if obj.payment_type == 'PRE':
-                ref_year = current_year
-                ref_month = current_month
-            else:  # POS
-                if current_month == 1:
-                    ref_year = current_year - 1
-                    ref_month = 12
-                else:
-                    ref_year = current_year
-                    ref_month = current_month - 1
+            # Determine reference month based on payment type (POS checks the previous month)
+            ref_year, ref_month = status_reference_month(obj.payment_type, today.year, today.month)
 
-            # Check if there's a payment for the reference month
-            paid_current_month = Payment.objects.filter(
-                student=obj,
-                reference_month__year=ref_year,
-                reference_month__month=ref_month
-            ).exists()
+            # Check if there's a payment for the reference month (anotado por serializer_queryset)
+            paid_current_month = getattr(obj, 'paid_reference_month', None)
+            if paid_current_month is None:
+                paid_current_month = Payment.objects.filter(
+                    in_month('reference_month', ref_year, ref_month),
+                    student=obj
+                ).exists()
             
             # Check if payment is overdue
             is_overdue = False
@@ -69,17 +78,16 @@ class StudentSerializer(serializers.ModelSerializer):
             total_sessions = obj.session_quantity or 0
             total_value = total_sessions * obj.modality.price if total_sessions else 0
             
-            total_paid = sum(
-                payment.amount for payment in Payment.objects.filter(student=obj)
-            )
-            
+            # Saldo mantido a cada pagamento (student.balance)
+            total_paid = obj.total_paid
+
             return {
                 'payment_type': 'SESSION',
                 'session_price': float(obj.modality.price),
                 'session_quantity': total_sessions,
                 'total_value': float(total_value),
                 'total_paid': float(total_paid),
-                'remaining_value': float(total_value - total_paid) if total_value else 0
+                'remaining_value': float(obj.remaining_value) if total_value else 0
             }
         
     def get_schedules(self, obj):
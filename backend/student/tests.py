@@ -1,3 +1,144 @@
+from datetime import date
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from modality.models import Modality
+from payment.models import Payment
+from physiotherapist.models import Physiotherapist
+from schedule.models import StudentSchedule
+
+from .balance import out_of_sync
+from .models import Student
+
+
+class StudentBalanceTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='physio', password='physiopass123')
+        self.physiotherapist = Physiotherapist.objects.create(
+            user=self.user, crefito='12345', phone='11999999999', specialization='General'
+        )
+        self.modality = Modality.objects.create(name='Fisioterapia', price=Decimal('100.00'), payment_type='SESSION')
+        self.student = Student.objects.create(
+            name='Aluno', physiotherapist=self.physiotherapist, modality=self.modality, session_quantity=5
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def pay(self, amount, student=None):
+        return Payment.objects.create(
+            student=student or self.student, modality=self.modality, amount=Decimal(amount), payment_date=date.today()
+        )
+
+    def assertBalance(self, student, total_paid, remaining_value):
+        student.refresh_from_db()
+        self.assertEqual((student.total_paid, student.remaining_value), (Decimal(total_paid), Decimal(remaining_value)))
+
+    def test_new_student_starts_with_session_total(self):
+        self.assertBalance(self.student, '0', '500')
+
+    def test_payments_update_balance(self):
+        first = self.pay('150.00')
+        second = self.pay('100.00')
+        self.assertBalance(self.student, '250', '250')
+
+        first.amount = Decimal('200.00')
+        first.save()
+        self.assertBalance(self.student, '300', '200')
+
+        second.delete()
+        self.assertBalance(self.student, '200', '300')
+
+    def test_payment_moved_to_another_student(self):
+        other = Student.objects.create(
+            name='Outro', physiotherapist=self.physiotherapist, modality=self.modality, session_quantity=2
+        )
+        payment = self.pay('100.00')
+        payment.student = other
+        payment.save()
+
+        self.assertBalance(self.student, '0', '500')
+        self.assertBalance(other, '100', '100')
+
+    def test_stale_instance_does_not_overwrite_balance(self):
+        stale = Student.objects.get(pk=self.student.pk)
+        self.pay('100.00')
+        stale.name = 'Aluno renomeado'
+        stale.save()
+        self.assertBalance(self.student, '100', '400')
+
+        stale.session_quantity = 8
+        stale.save()
+        self.assertEqual(stale.remaining_value, Decimal('700'))
+        self.assertBalance(self.student, '100', '700')
+
+    def test_save_recreates_concurrently_deleted_student(self):
+        stale = Student.objects.get(pk=self.student.pk)
+        Student.objects.filter(pk=stale.pk).delete()
+
+        stale.name = 'Aluno recriado'
+        stale.save()
+        # Sem a linha, o save segue para o INSERT com os valores em memória
+        self.assertEqual(Student.objects.get(pk=stale.pk).name, 'Aluno recriado')
+        self.assertBalance(stale, '0', '500')
+
+    def test_modality_price_change_updates_remaining(self):
+        self.pay('100.00')
+        self.modality.price = Decimal('120.00')
+        self.modality.save()
+        self.assertBalance(self.student, '100', '500')
+
+    def test_status_uses_stored_balance(self):
+        self.pay('150.00')
+        response = self.client.get('/api/payments/student_payment_status/', {'student': self.student.id})
+
+        self.assertEqual(response.data['total_paid'], 150.0)
+        self.assertEqual(response.data['remaining_value'], 350.0)
+        data = self.client.get(f'/api/students/{self.student.id}/').data['payment_status']
+        self.assertEqual((data['total_paid'], data['remaining_value']), (150.0, 350.0))
+
+    def test_list_queries_do_not_grow_with_rows(self):
+        def count_queries():
+            counts = []
+            for url in ('/api/students/', '/api/payments/'):
+                with CaptureQueriesContext(connection) as queries:
+                    self.assertEqual(self.client.get(url).status_code, 200)
+                counts.append(len(queries))
+            return counts
+
+        monthly = Modality.objects.create(name='Pilates', price=Decimal('200.00'), payment_type='MONTHLY')
+
+        def add_students(count):
+            for index in range(count):
+                student = Student.objects.create(
+                    name=f'Aluno {index}', physiotherapist=self.physiotherapist, modality=monthly, payment_day=1
+                )
+                StudentSchedule.objects.create(student=student, weekday=index % 5, hour=8)
+                self.pay('200.00', student)
+
+        add_students(1)
+        count_queries()  # Primeira requisição: tarefas periódicas e cache frio
+        expected = count_queries()
+        add_students(5)
+        self.assertEqual(count_queries(), expected)
+
+    def test_check_balances_command(self):
+        self.pay('100.00')
+        # Alterações sem sinais deixam o saldo divergente
+        Payment.objects.update(amount=Decimal('80.00'))
+        self.assertEqual(out_of_sync(Student.objects.all()).count(), 1)
+
+        out = StringIO()
+        call_command('check_balances', '--dry-run', stdout=out)
+        self.assertIn('1 alunos com saldo divergente', out.getvalue())
+        self.assertBalance(self.student, '100', '400')
 
-# Create your tests here.
+        call_command('check_balances', stdout=StringIO())
+        self.assertBalance(self.student, '80', '420')
+        self.assertFalse(out_of_sync(Student.objects.all()).exists())
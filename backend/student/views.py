@@ -3,8 +3,10 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from .models import Student
-from .serializers import StudentSerializer
+from .serializers import StudentSerializer, serializer_queryset
 from physiotherapist.models import Physiotherapist
+from core.conditional import ConditionalListMixin
+from core.roles import PhysiotherapistScopedMixin
 from django.http import HttpResponse
 import openpyxl
 from openpyxl.styles import Font
@@ -13,20 +15,14 @@ from django.utils.timezone import make_aware
 from datetime import datetime
 import io
 
-class StudentViewSet(viewsets.ModelViewSet):
+class StudentViewSet(ConditionalListMixin, PhysiotherapistScopedMixin, viewsets.ModelViewSet):
     queryset = Student.objects.all()
     serializer_class = StudentSerializer
     permission_classes = [IsAuthenticated]
     def get_queryset(self):
-        queryset = Student.objects.all()
-        if not self.request.user.is_staff:
-            # If user is a physiotherapist, only show their students
-            try:
-                physiotherapist = self.request.user.physiotherapist
-                queryset = queryset.filter(physiotherapist=physiotherapist)
-            except:
-                queryset = Student.objects.none()
-                
+        # Fisioterapeutas veem apenas os próprios alunos (PhysiotherapistScopedMixin)
+        queryset = serializer_queryset(super().get_queryset())
+
         # Filter by active status
         active = self.request.query_params.get('active', None)
         if active is not None:
@@ -46,26 +42,26 @@ class StudentViewSet(viewsets.ModelViewSet):
             
         return queryset
 
+    # Modalidade e fisioterapeuta entram no payload; horários e pagamentos
+    # atualizam o updated_at do aluno (core.sync.touch_student)
+    etag_related_fields = ('modality__updated_at', 'physiotherapist__updated_at')
+
+    def list_etag_parts(self, request):
+        # O status de pagamento depende da data atual
+        return (datetime.now().date(),)
+
     def perform_create(self, serializer):
-        if not self.request.user.is_staff:
+        if not self.role.is_staff and self.role.physiotherapist:
             # Se o usuário é um fisioterapeuta, atribuir automaticamente
-            try:
-                physiotherapist = self.request.user.physiotherapist
-                serializer.save(physiotherapist=physiotherapist)
-            except:
-                serializer.save()
+            serializer.save(physiotherapist=self.role.physiotherapist)
         else:
             # Se é admin, usa o fisioterapeuta selecionado no frontend ou None
             serializer.save()
 
     def perform_update(self, serializer):
-        if not self.request.user.is_staff:
+        if not self.role.is_staff and self.role.physiotherapist:
             # Se o usuário é um fisioterapeuta, manter ele como responsável
-            try:
-                physiotherapist = self.request.user.physiotherapist
-                serializer.save(physiotherapist=physiotherapist)
-            except:
-                serializer.save()
+            serializer.save(physiotherapist=self.role.physiotherapist)
         else:
             # Se é admin, usa o fisioterapeuta selecionado no frontend ou mantém o atual
             serializer.save()
@@ -155,8 +151,8 @@ class StudentViewSet(viewsets.ModelViewSet):
                         raise ValueError('Nome é obrigatório')
                         
                     # Create student
-                    if not self.request.user.is_staff:
-                        student_data['physiotherapist'] = self.request.user.physiotherapist.id
+                    if not self.role.is_staff:
+                        student_data['physiotherapist'] = self.role.physiotherapist.id
                         
                     serializer = self.get_serializer(data=student_data)
                     if serializer.is_valid():
@@ -362,8 +358,8 @@ class StudentViewSet(viewsets.ModelViewSet):
                             {'error': f'Formato de horário inválido para o aluno {row[0]}. Use o formato HH:MM'},
                             status=status.HTTP_400_BAD_REQUEST
                         )# Adiciona o fisioterapeuta atual se não for admin
-                if not self.request.user.is_staff:
-                    physiotherapist_id = self.request.user.physiotherapist.id
+                if not self.role.is_staff:
+                    physiotherapist_id = self.role.physiotherapist.id
                 else:
                     physiotherapist_id = None
 
@@ -42,6 +42,23 @@ const buildSW = () => {
           },
         }
       },
+      {
+        // Leituras frequentes: resposta do cache na hora, revalidada pela rede
+        // (com If-None-Match pelo cache HTTP). src/utils/apiCache.ts invalida
+        // este cache após alterações.
+        urlPattern: /^https?:\/\/[^/]+\/api\/(?:modalities|physiotherapists|students|schedules)\//,
+        handler: 'StaleWhileRevalidate',
+        options: {
+          cacheName: 'api-read-mostly',
+          expiration: {
+            maxEntries: 100,
+            maxAgeSeconds: 60 * 60 * 24 * 7, // 7 days
+          },
+          cacheableResponse: {
+            statuses: [200],
+          },
+        }
+      },
       {
         urlPattern: /\/api\//,
         handler: 'NetworkFirst',
@@ -1,8 +1,10 @@
 import { clientsClaim } from 'workbox-core';
+import { CacheableResponsePlugin } from 'workbox-cacheable-response';
 import { ExpirationPlugin } from 'workbox-expiration';
 import { precacheAndRoute, createHandlerBoundToURL } from 'workbox-precaching';
 import { registerRoute } from 'workbox-routing';
 import { StaleWhileRevalidate, CacheFirst, NetworkFirst } from 'workbox-strategies';
+import { API_CACHE_NAME, READ_MOSTLY_PATTERN } from './utils/apiCache';
 
 declare const self: ServiceWorkerGlobalScope;
 
@@ -39,6 +41,23 @@ registerRoute(
   createHandlerBoundToURL(process.env.PUBLIC_URL + '/index.html')
 );
 
+// Leituras frequentes da API: stale-while-revalidate. A revalidação usa o
+// cache HTTP do navegador, que manda If-None-Match e recebe 304 sem corpo
+// quando o ETag não mudou. O app invalida este cache após cada alteração.
+registerRoute(
+  ({ url }) => READ_MOSTLY_PATTERN.test(url.href),
+  new StaleWhileRevalidate({
+    cacheName: API_CACHE_NAME,
+    plugins: [
+      new CacheableResponsePlugin({ statuses: [200] }),
+      new ExpirationPlugin({
+        maxEntries: 100,
+        maxAgeSeconds: 7 * 24 * 60 * 60, // 7 Days
+      }),
+    ],
+  })
+);
+
 // Cache API responses
 registerRoute(
   ({ url }) => url.origin === process.env.REACT_APP_API_URL || url.pathname.startsWith('/api/'),
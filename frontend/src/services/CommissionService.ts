@@ -34,6 +34,16 @@ export const CommissionService = {
     return response.data;
   },
 
+  downloadStatement: async (start: string, end: string, physiotherapistId?: number) => {
+    const params = new URLSearchParams({ start, end });
+    if (physiotherapistId) params.append('physiotherapist', physiotherapistId.toString());
+
+    const response = await api.get(`/api/payments/commission/statement/?${params.toString()}`, {
+      responseType: 'blob'
+    });
+    return response.data as Blob;
+  },
+
   approveCommissionPayment: async (id: number) => {
     const response = await api.post(`/api/payments/commission/${id}/approve/`);
     return response.data;
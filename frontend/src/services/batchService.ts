@@ -0,0 +1,15 @@
+import api from '../utils/axios';
+
+export interface BatchItem<T = any> {
+  path: string;
+  status: number;
+  data: T;
+}
+
+// Executa vários GETs numa requisição só (/api/batch/). Os itens voltam na
+// ordem dos caminhos, cada um com o próprio status: confira `status` antes de
+// usar `data`, que traz o corpo de erro quando a leitura falha.
+export const batchGet = async (paths: string[]): Promise<BatchItem[]> => {
+  const response = await api.post('/api/batch/', { requests: paths });
+  return response.data.responses;
+};
@@ -0,0 +1,45 @@
+// Cache das rotas de leitura da API no service worker (stale-while-revalidate).
+// A resposta guardada aparece na hora e a rede atualiza o cache em seguida; a
+// revalidação passa pelo cache HTTP do navegador, que envia If-None-Match com
+// o ETag do backend e recebe 304 quando nada mudou.
+export const API_CACHE_NAME = 'api-read-mostly';
+
+// Mesmo padrão do workbox-config.js e do scripts/build-sw.js
+export const READ_MOSTLY_PATTERN = /^https?:\/\/[^/]+\/api\/(modalities|physiotherapists|students|schedules)\//;
+
+// Alterações numa coleção mudam o payload de outras: o aluno traz os horários e
+// o status de pagamento, o nome da modalidade e do fisioterapeuta
+const INVALIDATES: Record<string, string[]> = {
+  modalities: ['modalities', 'students'],
+  physiotherapists: ['physiotherapists', 'students'],
+  students: ['students', 'schedules'],
+  schedules: ['schedules', 'students'],
+  payments: ['students'],
+  // POST que só lê dados
+  batch: [],
+};
+
+const collectionOf = (url: string): string | undefined => url.match(/\/api\/([^/?]+)/)?.[1];
+
+// Remove do cache as coleções afetadas por uma alteração em `url`. Sem `url`,
+// ou para rotas fora do mapa (ex.: login e logout), apaga o cache inteiro.
+export const invalidateApiCache = async (url?: string) => {
+  if (typeof caches === 'undefined') {
+    return;
+  }
+  const affected = url ? INVALIDATES[collectionOf(url) ?? ''] : undefined;
+  if (!affected) {
+    await caches.delete(API_CACHE_NAME);
+    return;
+  }
+  if (affected.length === 0) {
+    return;
+  }
+  const cache = await caches.open(API_CACHE_NAME);
+  const requests = await cache.keys();
+  await Promise.all(
+    requests
+      .filter((request) => affected.includes(collectionOf(request.url) ?? ''))
+      .map((request) => cache.delete(request))
+  );
+};
@@ -1,4 +1,5 @@
 import axios, { AxiosResponse, AxiosError } from 'axios';
+import { invalidateApiCache } from './apiCache';
 
 interface ApiErrorResponse {
   error?: string;
@@ -63,6 +64,14 @@ instance.interceptors.request.use(
       }
     }
 
+    // Chave de idempotência: reenvios da mesma requisição (ex.: fila offline do
+    // service worker) devolvem a resposta original em vez de criar outro registro
+    if (config.method === 'post' && !config.headers['Idempotency-Key']) {
+      config.headers['Idempotency-Key'] = typeof crypto.randomUUID === 'function'
+        ? crypto.randomUUID()
+        : `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+    }
+
     return config;
   },
   (error) => {
@@ -73,7 +82,12 @@ instance.interceptors.request.use(
 
 // Add response interceptor
 instance.interceptors.response.use(
-  (response) => {
+  async (response) => {
+    // Alteração confirmada: as leituras em cache no service worker ficaram velhas
+    if (response.config.method !== 'get') {
+      await invalidateApiCache(response.config.url);
+    }
+
     // Log successful response
     console.log('Response received:', {
       url: response.config.url,
@@ -83,7 +97,12 @@ instance.interceptors.response.use(
     });
     return response;
   },
-  (error: AxiosError<ApiErrorResponse>) => {
+  async (error: AxiosError<ApiErrorResponse>) => {
+    // Sessão expirada ou sem permissão: não mostrar dados guardados de outro login
+    if (error.response?.status === 401 || error.response?.status === 403) {
+      await invalidateApiCache();
+    }
+
     // Log error response in detail
     console.error('Response Error:', {
       url: error.config?.url,
@@ -43,6 +43,21 @@ module.exports = {
         }
       }
     },
+    {
+      "urlPattern": /^https?:\/\/[^/]+\/api\/(?:modalities|physiotherapists|students|schedules)\//,
+      "handler": "StaleWhileRevalidate",
+      "options": {
+        // Mesmo cache de src/utils/apiCache.ts, que o invalida após alterações
+        "cacheName": "api-read-mostly",
+        "expiration": {
+          "maxEntries": 100,
+          "maxAgeSeconds": 60 * 60 * 24 * 7
+        },
+        "cacheableResponse": {
+          "statuses": [200]
+        }
+      }
+    },
     {
       "urlPattern": /\/api\//,
       "handler": "NetworkFirst",